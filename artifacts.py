@@ -0,0 +1,257 @@
+"""
+Model artifact management shared by the prediction CLI and the Flask backend.
+
+Resolves which model file to serve (an explicit path, else the MODEL_PATH
+environment variable, else my_model.keras in the project root), verifies it
+against a SHA-256 checksum when one is configured, and optionally keeps a
+converted TensorFlow Lite copy of a Keras model in a cache directory keyed by
+the model's checksum. The interpreter memory-maps that copy, so later starts
+skip Keras deserialization and never import TensorFlow.
+
+Checksums come from MODEL_SHA256 or from a ``<model file>.sha256`` file next
+to the model, in ``sha256sum`` format. MODEL_SHA256 only describes the model
+MODEL_PATH names (or the default model); any other model file, such as a
+--model given on the command line, is checked against its own checksum.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+from inference import load_predictor
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(PROJECT_ROOT, 'my_model.keras')
+# Cache directory used when a shared-weights server does not configure one
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, '.model_cache')
+
+
+class ModelArtifactError(RuntimeError):
+    """Raised when the model file is missing, fails verification or cannot be loaded."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve_model_path(model_path=None, default=DEFAULT_MODEL_PATH):
+    """Return the model to load: ``model_path``, else $MODEL_PATH, else ``default``."""
+    return model_path or os.environ.get('MODEL_PATH') or default
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def configured_sha256(model_path):
+    """
+    Return MODEL_SHA256 if it describes ``model_path``, else None.
+
+    It applies to the file MODEL_PATH names or, with MODEL_PATH unset, to
+    the default my_model.keras (in the project root, or in the working
+    directory as the command line tools resolve it).
+    """
+    checksum = os.environ.get('MODEL_SHA256')
+    if not checksum:
+        return None
+    if os.environ.get('MODEL_PATH'):
+        targets = [os.environ['MODEL_PATH']]
+    else:
+        targets = [DEFAULT_MODEL_PATH, os.path.basename(DEFAULT_MODEL_PATH)]
+    if os.path.abspath(model_path) not in {os.path.abspath(target) for target in targets}:
+        return None
+    return checksum.strip().lower()
+
+
+def expected_sha256(model_path, checksum=None):
+    """
+    Return the expected checksum of a model file, or None if there is none.
+
+    Args:
+        model_path (str): Model file
+        checksum (str): Checksum configured for this file; else MODEL_SHA256
+            when it applies (see configured_sha256()), else the file's
+            ``.sha256`` sidecar
+    """
+    checksum = checksum or configured_sha256(model_path)
+    if checksum:
+        return checksum.strip().lower()
+    checksum_path = model_path + '.sha256'
+    if os.path.exists(checksum_path):
+        with open(checksum_path, encoding='utf-8') as f:
+            # sha256sum format: "<digest>  <file name>"
+            return f.read().split()[0].lower()
+    return None
+
+
+def convert_to_tflite(model_path, output_path):
+    """
+    Convert a Keras model to an unquantized TensorFlow Lite model.
+
+    Float32 weights are kept as they are, so predictions match the Keras
+    model to float rounding. The file is written atomically, so concurrent
+    workers never read a partial model.
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    tflite_model = tf.lite.TFLiteConverter.from_keras_model(model).convert()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(tflite_model)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return output_path
+
+
+class ModelArtifact:
+    """A model file on disk: resolved, verified, optionally cached, then loaded."""
+
+    def __init__(self, model_path=None, cache_dir=None, sha256=None):
+        """
+        Args:
+            model_path (str): Model file (default: $MODEL_PATH, else my_model.keras
+                in the project root)
+            cache_dir (str): Directory for converted TensorFlow Lite copies of
+                Keras models (default: $MODEL_CACHE_DIR; unset disables the cache)
+            sha256 (str): Expected checksum of this file (default: see expected_sha256())
+        """
+        self.path = resolve_model_path(model_path)
+        self.expected_sha256 = sha256
+        self.cache_dir = cache_dir if cache_dir is not None else os.environ.get('MODEL_CACHE_DIR')
+        self.status = 'not_loaded'
+        self.error = None
+        self.sha256 = None
+        self.loaded_from = None
+        self.load_seconds = None
+
+    @property
+    def serves_tflite(self):
+        """Whether the model runs on the TensorFlow Lite interpreter rather than TensorFlow."""
+        return self.path.endswith('.tflite') or bool(self.cache_dir)
+
+    def verify(self):
+        """
+        Check that the model file exists and matches its configured checksum.
+
+        Returns:
+            str: SHA-256 of the file if it was hashed (a checksum is configured
+            or the cache is enabled), else None
+
+        Raises:
+            ModelArtifactError: With status 'missing' or 'checksum_mismatch'
+        """
+        if not os.path.exists(self.path):
+            raise ModelArtifactError('missing', f"Model file not found at {self.path}")
+        expected = expected_sha256(self.path, self.expected_sha256)
+        if expected is None and not self.cache_dir:
+            return None
+        digest = file_sha256(self.path)
+        if expected is not None and digest != expected:
+            raise ModelArtifactError(
+                'checksum_mismatch',
+                f"Checksum mismatch for {self.path}: expected {expected}, got {digest}"
+            )
+        return digest
+
+    def _cached_tflite(self, digest, isolated=False):
+        """Return the cached TensorFlow Lite copy of the model, converting it on first use."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached_path = os.path.join(self.cache_dir, f'model-{digest}.tflite')
+        if not os.path.exists(cached_path):
+            print(f"Caching {self.path} as {cached_path}")
+            if isolated:
+                # Convert in a fresh interpreter, so this process never
+                # initialises TensorFlow and can still fork safely
+                process = multiprocessing.get_context('spawn').Process(
+                    target=convert_to_tflite, args=(self.path, cached_path)
+                )
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    raise ModelArtifactError('error', f"Could not convert {self.path} to TensorFlow Lite")
+            else:
+                convert_to_tflite(self.path, cached_path)
+        return cached_path
+
+    def prepare(self):
+        """
+        Verify the model and create its cached TensorFlow Lite copy, without loading it.
+
+        Meant for a parent process that forks workers: TensorFlow is never
+        initialised here, and every worker then memory-maps the same file.
+        Loaded with ``default_delegates=False``, the weights sit in the page
+        cache once however many workers load them.
+
+        Returns:
+            str: The file workers will load
+
+        Raises:
+            ModelArtifactError: If the model is missing, corrupt or cannot be converted
+        """
+        try:
+            digest = self.verify()
+            if self.cache_dir and not self.path.endswith('.tflite'):
+                return self._cached_tflite(digest, isolated=True)
+            return self.path
+        except ModelArtifactError as e:
+            self.status, self.error = e.status, str(e)
+            raise
+
+    def load(self, warmup_batch_sizes=(1,), num_threads=None, default_delegates=True):
+        """
+        Verify and load the model as a warmed-up inference function.
+
+        Args:
+            warmup_batch_sizes (tuple): Batch sizes to run once before returning
+            num_threads (int): TensorFlow Lite interpreter threads
+            default_delegates (bool): Apply the TensorFlow Lite runtime's default
+                delegates; disable them to share the weights of a model loaded
+                by several processes (see inference.TFLiteModel)
+
+        Returns:
+            CompiledModel or TFLiteModel: Callable taking a (N, 128, 128, 3) batch
+
+        Raises:
+            ModelArtifactError: If the model is missing, corrupt or fails to load
+        """
+        start = time.perf_counter()
+        self.status = 'loading'
+        self.error = None
+        try:
+            self.sha256 = self.verify()
+            load_path = self.path
+            if self.cache_dir and not self.path.endswith('.tflite'):
+                load_path = self._cached_tflite(self.sha256)
+            predictor = load_predictor(load_path, warmup_batch_sizes, num_threads, default_delegates)
+        except ModelArtifactError as e:
+            self.status, self.error = e.status, str(e)
+            raise
+        except Exception as e:
+            self.status, self.error = 'error', f"Could not load model {self.path}: {e}"
+            raise ModelArtifactError('error', self.error) from e
+        self.status = 'loaded'
+        self.loaded_from = load_path
+        self.load_seconds = time.perf_counter() - start
+        return predictor
+
+    def state(self):
+        """Describe the artifact and its load state, e.g. for a health check."""
+        return {
+            'path': self.path,
+            'status': self.status,
+            'error': self.error,
+            'sha256': self.sha256,
+            'loaded_from': self.loaded_from,
+            'load_seconds': self.load_seconds,
+        }
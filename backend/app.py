@@ -1,44 +1,288 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import tensorflow as tf
 import numpy as np
-from PIL import Image
-import io
+from PIL import Image, UnidentifiedImageError
 import base64
 import os
+import struct
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from batching import BatchScheduler, QueueFull
+from cache import PredictionCache, content_key
+from procinfo import process_memory
+
+# Shared inference helpers live in the project root next to predict.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from artifacts import ModelArtifact, ModelArtifactError, file_sha256
+from cascade import CASCADE_STAGES, DEFAULT_BAND, CascadeModel, stage_name
+from inference import compile_model
+from metrics import BATCH_SIZE_BUCKETS, CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry
+from near_duplicates import NearDuplicate, NearDuplicateIndex, dhash, hamming_distance
+from preprocessing import load_image, to_model_input
+
+# Prometheus metrics served on /metrics: per-stage latency, batch sizes,
+# queue depth, requests by route and status, and errors
+metrics = Registry()
+REQUESTS = metrics.counter(
+    'classifier_http_requests_total', 'HTTP requests by route, method and status code',
+    ('route', 'method', 'status'))
+REQUEST_SECONDS = metrics.histogram(
+    'classifier_http_request_duration_seconds', 'End-to-end request latency by route',
+    ('route',))
+STAGE_SECONDS = metrics.histogram(
+    'classifier_stage_duration_seconds',
+    'Time per pipeline stage: decode, preprocess, dedup, queue_wait, inference, serialize',
+    ('stage',))
+BATCH_SIZE = metrics.histogram(
+    'classifier_batch_size', 'Images per forward pass', buckets=BATCH_SIZE_BUCKETS)
+ERRORS = metrics.counter(
+    'classifier_errors_total', 'Failures by kind: decode, inference, queue_full, overloaded',
+    ('kind',))
+CASCADE_IMAGES = metrics.counter(
+    'classifier_cascade_images_total', 'Images answered by each cascade stage: fast, full',
+    ('stage',))
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records serialization time as the 'serialize' stage"""
+    def dumps(self, obj, **kwargs):
+        with STAGE_SECONDS.time('serialize'):
+            return super().dumps(obj, **kwargs)
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)  # Enable CORS for all domains
 
-# Global variable to store the model
+# Micro-batching settings: larger batches raise throughput under concurrent
+# load, a longer wait trades single-request latency for fuller batches
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '16'))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', '5'))
+# Backpressure: once this many images are waiting for the model, new
+# requests get HTTP 503 instead of queueing without bound (0 = unbounded)
+BATCH_MAX_QUEUE = int(os.environ.get('BATCH_MAX_QUEUE', '256'))
+# Admission control: prediction requests a worker process handles at once.
+# Beyond it, new requests get HTTP 503 right away instead of waiting for a
+# thread (0 = unlimited). serve.py keeps it below the worker's thread count,
+# so spare threads are always free to answer with 503 and to serve /health
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', '64'))
+PREDICTION_ENDPOINTS = {'predict', 'predict_base64', 'predict_batch', 'predict_raw'}
+
+# Prediction cache keyed by a hash of the uploaded bytes. CACHE_SHARED_PATH
+# points several worker processes at one SQLite file so they share entries;
+# it keeps up to CACHE_SHARED_MAX_ENTRIES rows
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '0'))
+CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH')
+CACHE_SHARED_MAX_ENTRIES = int(os.environ.get('CACHE_SHARED_MAX_ENTRIES', '100000'))
+
+# Near-duplicate index: re-encoded, resized or metadata-stripped copies of an
+# earlier image reuse its prediction when their perceptual hashes differ in
+# at most NEAR_DUP_MAX_DISTANCE of 64 bits. Each worker process keeps its own
+# index of up to NEAR_DUP_MAX_MB megabytes (0 disables it)
+NEAR_DUP_MAX_MB = float(os.environ.get('NEAR_DUP_MAX_MB', '0'))
+NEAR_DUP_MAX_DISTANCE = int(os.environ.get('NEAR_DUP_MAX_DISTANCE', '4'))
+
+# Raw preprocessed-tensor uploads to /v2/predict: uint8 RGB at the model
+# input size (128x128x3), row-major
+TENSOR_CONTENT_TYPE = 'application/x-uint8-tensor'
+
+# Multi-image requests to /predict_batch: images per request and decoder threads
+PREDICT_BATCH_MAX_IMAGES = int(os.environ.get('PREDICT_BATCH_MAX_IMAGES', '64'))
+DECODE_WORKERS = int(os.environ.get('DECODE_WORKERS', str(os.cpu_count() or 1)))
+# Binary framed body: each image is prefixed with its length as a big-endian uint32
+BATCH_CONTENT_TYPE = 'application/x-image-batch'
+
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='decode')
+
+prediction_cache = None
+if CACHE_MAX_ENTRIES > 0:
+    prediction_cache = PredictionCache(
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl_seconds=CACHE_TTL_SECONDS,
+        shared_path=CACHE_SHARED_PATH,
+        max_shared_entries=CACHE_SHARED_MAX_ENTRIES
+    )
+# Identifies the served model(s) in cache keys, so a shared cache file never
+# answers with another model's predictions. Set once the model is loaded
+cache_tag = ''
+
+near_duplicates = None
+if NEAR_DUP_MAX_MB > 0:
+    near_duplicates = NearDuplicateIndex(
+        max_distance=NEAR_DUP_MAX_DISTANCE,
+        max_memory_mb=NEAR_DUP_MAX_MB
+    )
+
+# Model served by the API: a Keras model (.keras) or a TensorFlow Lite model
+# (.tflite, e.g. a quantized export from quantize_model.py). Resolved from
+# MODEL_PATH, else my_model.keras in the project root; verified against
+# MODEL_SHA256 or a <model>.sha256 file when present. MODEL_CACHE_DIR keeps a
+# converted TensorFlow Lite copy of a Keras model for fast worker starts
+model_artifact = ModelArtifact()
+# Set by serve.py --shared-weights: keep the weights of a TensorFlow Lite model
+# memory-mapped, and so shared between workers, instead of letting XNNPACK
+# repack them into each worker's private memory (at a cost in latency)
+SHARED_WEIGHTS = os.environ.get('SHARED_WEIGHTS', '0') == '1'
+# Cascade mode: a small first-stage model (see train_cascade.py) answers
+# images it scores at or below CASCADE_LOW or at or above CASCADE_HIGH; the
+# rest go on to the full model. Unset CASCADE_MODEL_PATH serves the full model
+# only. The fast model is verified against CASCADE_MODEL_SHA256 or its own
+# <model>.sha256 file, never against MODEL_SHA256
+CASCADE_MODEL_PATH = os.environ.get('CASCADE_MODEL_PATH')
+CASCADE_LOW = float(os.environ.get('CASCADE_LOW', str(DEFAULT_BAND[0])))
+CASCADE_HIGH = float(os.environ.get('CASCADE_HIGH', str(DEFAULT_BAND[1])))
+cascade_artifact = ModelArtifact(
+    CASCADE_MODEL_PATH, sha256=os.environ.get('CASCADE_MODEL_SHA256')
+) if CASCADE_MODEL_PATH else None
+# Why a configured cascade is not serving, reported on /health
+cascade_error = None
+# Development only: serve an untrained model with the notebook's architecture
+# when the trained one is unavailable, instead of reporting the failure
+ALLOW_DUMMY_MODEL = os.environ.get('ALLOW_DUMMY_MODEL', '0') == '1'
+
+# Global variables to store the model, its compiled inference function
+# and the batching scheduler
 model = None
+infer = None
+batcher = None
+
+# Prediction requests being handled by this worker process
+in_flight = 0
+in_flight_lock = threading.Lock()
+
+def _cache_stat(name):
+    return lambda: prediction_cache.stats()[name] if prediction_cache is not None else None
+
+def _near_duplicate_stat(name):
+    return lambda: near_duplicates.stats()[name] if near_duplicates is not None else None
+
+metrics.gauge('classifier_queue_depth', 'Images waiting for a batch slot',
+              lambda: batcher.queue_depth() if batcher is not None else 0)
+metrics.gauge('classifier_model_loaded', 'Whether a model is loaded and serving (1) or not (0)',
+              lambda: int(infer is not None))
+metrics.gauge('classifier_requests_in_flight', 'Prediction requests being handled',
+              lambda: in_flight)
+metrics.gauge('classifier_cache_entries', 'Predictions held in the cache', _cache_stat('entries'))
+metrics.gauge('classifier_cache_hits_total', 'Prediction cache hits', _cache_stat('hits'), 'counter')
+metrics.gauge('classifier_cache_misses_total', 'Prediction cache misses', _cache_stat('misses'), 'counter')
+metrics.gauge('classifier_near_duplicate_entries', 'Predictions held in the near-duplicate index',
+              _near_duplicate_stat('entries'))
+metrics.gauge('classifier_near_duplicate_hits_total', 'Images answered from a near-identical image',
+              _near_duplicate_stat('hits'), 'counter')
+metrics.gauge('process_resident_memory_bytes', 'Resident memory of this worker process',
+              lambda: process_memory().get('rss_mb', 0) * 1024 * 1024)
 
 def load_model():
     """Load the trained model"""
     global model
     try:
-        # Check if model file exists
-        model_path = '../my_model.keras'
-        if os.path.exists(model_path):
-            model = tf.keras.models.load_model(model_path)
-            print("Model loaded successfully!")
-        else:
-            print(f"Model file not found at {model_path}")
-            # For now, we'll create a dummy model with the same architecture
-            print("Creating dummy model with same architecture...")
-            create_dummy_model()
-    except Exception as e:
+        # Trace and warm up before publishing, so /health only reports the
+        # model as loaded once the first request no longer pays
+        # graph-tracing latency
+        compiled = model_artifact.load(
+            warmup_batch_sizes=(1, BATCH_MAX_SIZE),
+            # Set per worker by serve.py so workers do not oversubscribe cores
+            num_threads=int(os.environ.get('TF_NUM_THREADS', '0')) or None,
+            default_delegates=not SHARED_WEIGHTS
+        )
+    except ModelArtifactError as e:
         print(f"Error loading model: {e}")
+        if not ALLOW_DUMMY_MODEL:
+            # Fail fast: /health reports the problem and predictions get 503
+            return
+        print("Creating dummy model with same architecture...")
         create_dummy_model()
+        model_artifact.status = 'dummy'
+        start_inference()
+        return
+    # TensorFlow Lite models have no Keras model behind them
+    model = getattr(compiled, 'model', None)
+    print(f"Model loaded successfully from {model_artifact.loaded_from}!")
+    if cascade_artifact is not None:
+        compiled = load_cascade(compiled)
+    start_inference(compiled)
+
+def load_cascade(full):
+    """Put the first-stage model in front of the full one; without it, serve the full model alone"""
+    global cascade_error
+    cascade_error = None
+    try:
+        fast = cascade_artifact.load(
+            warmup_batch_sizes=(1, BATCH_MAX_SIZE),
+            num_threads=int(os.environ.get('TF_NUM_THREADS', '0')) or None,
+            default_delegates=not SHARED_WEIGHTS
+        )
+        cascade = CascadeModel(fast, full, CASCADE_LOW, CASCADE_HIGH)
+    except (ModelArtifactError, ValueError) as e:
+        # Every answer stays correct without the fast stage, only slower; /health
+        # reports the server as degraded until the cascade loads
+        cascade_error = str(e)
+        print(f"ERROR: CASCADE_MODEL_PATH is set but the cascade could not be loaded; "
+              f"serving the full model only: {e}", file=sys.stderr)
+        return full
+    print(f"Cascade enabled: {cascade_artifact.loaded_from} answers scores outside "
+          f"({CASCADE_LOW}, {CASCADE_HIGH})")
+    return cascade
+
+def model_cache_tag(compiled):
+    """Tag cache keys with the checksums of the served model(s) and the cascade band"""
+    if model_artifact.status == 'dummy':
+        # Random weights: nothing another process cached applies
+        return uuid.uuid4().hex[:16]
+    parts = [model_artifact.sha256 or file_sha256(model_artifact.path)]
+    if isinstance(compiled, CascadeModel):
+        parts += [cascade_artifact.sha256 or file_sha256(cascade_artifact.path),
+                  str(compiled.low), str(compiled.high)]
+    return content_key(' '.join(parts).encode())[:16]
+
+def start_inference(compiled=None):
+    """Compile and warm up the model, then start the micro-batching scheduler"""
+    global infer, batcher, cache_tag
+    if prediction_cache is not None:
+        cache_tag = model_cache_tag(compiled)
+    if compiled is None:
+        compiled = compile_model(model, warmup_batch_sizes=(1, BATCH_MAX_SIZE))
+    scheduler = BatchScheduler(
+        compiled,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_queue_size=BATCH_MAX_QUEUE,
+        on_batch=record_batch
+    )
+    scheduler.start()
+    if batcher is not None:
+        batcher.stop()
+    batcher = scheduler
+    infer = compiled
+    print("Inference function compiled and warmed up")
+    print(f"Batching enabled (max batch size {BATCH_MAX_SIZE}, max wait {BATCH_MAX_WAIT_MS}ms)")
+
+def record_batch(batch_size, queue_waits, inference_seconds, error):
+    """Record the timings of one forward pass of the batching scheduler"""
+    BATCH_SIZE.observe(batch_size)
+    for wait in queue_waits:
+        STAGE_SECONDS.observe(wait, 'queue_wait')
+    STAGE_SECONDS.observe(inference_seconds, 'inference')
+    if error is not None:
+        ERRORS.inc('inference', amount=batch_size)
 
 def create_dummy_model():
     """Create a dummy model with the same architecture as described in the notebook"""
     global model
-    # Create the same architecture as in the notebook
+    # TensorFlow is only needed here; exported models run without it
+    import tensorflow as tf
+
+    # Create the same architecture as in the notebook. Random weights: the
+    # predictions are meaningless either way, and downloading the ImageNet
+    # weights stalls startup (or fails on machines without internet access)
     pretrained_model = tf.keras.applications.xception.Xception(
         include_top=False,
         input_shape=(128, 128, 3),
-        weights="imagenet",
+        weights=None,
         pooling='max'
     )
     
@@ -59,31 +303,322 @@ def create_dummy_model():
 
 def preprocess_image(image):
     """Preprocess image for prediction"""
-    # Resize image to 128x128 as expected by the model
-    image = image.resize((128, 128))
-    # Convert to RGB if not already
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    # Convert to numpy array
-    image_array = np.array(image)
-    # Normalize pixel values to [0, 1]
-    image_array = image_array.astype('float32') / 255.0
-    # Add batch dimension
-    image_array = np.expand_dims(image_array, axis=0)
-    return image_array
+    # Shared with predict.py: draft-mode JPEG decoding, RGB conversion,
+    # resize to the model input size and float32 normalization to [0, 1]
+    # (skipped for exported models that take raw uint8 pixels)
+    try:
+        with STAGE_SECONDS.time('decode'):
+            pixels = load_image(image, infer.image_size)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        # Not an image, truncated or oversized: the client's fault, answered with 400
+        raise ValueError(f"Could not decode image: {e}") from e
+    except Exception:
+        ERRORS.inc('decode')
+        raise
+    with STAGE_SECONDS.time('preprocess'):
+        return to_model_input(pixels[np.newaxis], infer.input_dtype)
+
+def format_prediction(prediction, reused=False):
+    """Build the JSON response body for a raw sigmoid output or a cascade's (score, stage) row"""
+    stage = stage_name(prediction)
+    prediction_value = float(prediction[0]) if stage is not None else prediction
+    # Convert prediction to class (0 = cat, 1 = dog based on typical binary classification)
+    if prediction_value > 0.5:
+        predicted_class = "dog"
+        confidence = prediction_value
+    else:
+        predicted_class = "cat"
+        confidence = 1 - prediction_value
+
+    result = {
+        "predicted_class": predicted_class,
+        "confidence": float(confidence),
+        "raw_prediction": prediction_value,
+        # Which model answered: 'fast' or 'full' in cascade mode
+        "stage": stage or CASCADE_STAGES[-1]
+    }
+    # Count only images that ran through the cascade, not reused predictions
+    if stage is not None and not reused:
+        CASCADE_IMAGES.inc(stage)
+    return result
+
+def find_near_duplicate(processed_image):
+    """Hash a decoded image and look up the prediction of a near-identical one"""
+    if near_duplicates is None:
+        return None, None
+    with STAGE_SECONDS.time('dedup'):
+        # The hash only compares brightness, so normalized input hashes like raw pixels
+        image_hash = dhash(processed_image[0])
+        if image_hash is None:
+            return None, None
+        return image_hash, near_duplicates.find(image_hash)
+
+def near_duplicate_result(match):
+    """Build the response body for an image answered from a near-identical one"""
+    prediction = match.score if match.stage is None else (match.score, match.stage)
+    result = format_prediction(prediction, reused=True)
+    result["near_duplicate_distance"] = match.distance
+    return result
+
+def pending_near_duplicate(image_hash, submitted):
+    """Find the closest image among (index, hash, future) still being classified, as (index, distance)"""
+    best, best_distance = None, near_duplicates.max_distance + 1
+    for i, pending_hash, _ in submitted:
+        if pending_hash is not None:
+            distance = hamming_distance(pending_hash, image_hash)
+            if distance < best_distance:
+                best, best_distance = i, distance
+    return None if best is None else (best, best_distance)
+
+def remember_near_duplicate(image_hash, prediction):
+    """Store a fresh prediction for later near-identical images"""
+    if image_hash is None:
+        return
+    if stage_name(prediction) is not None:
+        near_duplicates.add(image_hash, float(prediction[0]), int(prediction[1]))
+    else:
+        near_duplicates.add(image_hash, float(prediction))
+
+def decode_image_bytes(image_bytes):
+    """Decode encoded image bytes (JPEG, PNG, ...) into a model input batch"""
+    return preprocess_image(image_bytes)
+
+def decode_tensor_bytes(tensor_bytes):
+    """Wrap a raw uint8 HxWx3 RGB tensor (already resized by the client) as a model input batch"""
+    width, height = infer.image_size
+    expected = width * height * 3
+    if len(tensor_bytes) != expected:
+        raise ValueError(f"Expected {expected} bytes for a uint8 {height}x{width}x3 tensor, "
+                         f"got {len(tensor_bytes)}")
+    # frombuffer is a zero-copy view of the request body; models exported
+    # with in-graph rescaling take it as is
+    image_array = np.frombuffer(tensor_bytes, dtype=np.uint8).reshape(1, height, width, 3)
+    with STAGE_SECONDS.time('preprocess'):
+        return to_model_input(image_array, infer.input_dtype)
+
+def classify_bytes(raw_bytes, decode):
+    """Classify raw request bytes, reusing cached results for repeat uploads"""
+    # Check the cache before decoding anything
+    key = None
+    if prediction_cache is not None:
+        key = content_key(raw_bytes, cache_tag)
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            cached["cached"] = True
+            return cached
+    
+    # Process the image
+    processed_image = decode(raw_bytes)
+    
+    # A copy of an earlier image that differs only in encoding reuses its prediction
+    image_hash, match = find_near_duplicate(processed_image)
+    if match is not None:
+        # Only exact repeats go in the prediction cache
+        result = near_duplicate_result(match)
+        result["cached"] = False
+        return result
+    
+    # Make prediction (batched together with concurrent requests)
+    prediction_value = batcher.predict(processed_image)
+    result = format_prediction(prediction_value)
+    remember_near_duplicate(image_hash, prediction_value)
+    
+    if prediction_cache is not None:
+        prediction_cache.put(key, result)
+    result["cached"] = False
+    return result
+
+def classify_image_bytes(image_bytes):
+    """Classify raw uploaded image bytes, reusing cached results for repeat uploads"""
+    return classify_bytes(image_bytes, decode_image_bytes)
+
+def parse_framed_images(body):
+    """Split a length-prefixed binary body into the individual image payloads"""
+    images = []
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        if offset + 4 > len(view):
+            raise ValueError("Truncated frame header in batch body")
+        (length,) = struct.unpack_from('>I', view, offset)
+        offset += 4
+        if offset + length > len(view):
+            raise ValueError("Truncated image data in batch body")
+        images.append(bytes(view[offset:offset + length]))
+        offset += length
+    return images
+
+def _decode_or_error(image_bytes):
+    try:
+        return decode_image_bytes(image_bytes), None
+    except Exception as e:
+        return None, str(e)
+
+def classify_many(images):
+    """
+    Classify several encoded images in one go.
+    
+    Cached images are answered straight away, the rest are decoded on the
+    decoder thread pool. Near-duplicates of earlier images, or of images
+    earlier in the same request, reuse their predictions without entering
+    the cache; the others are submitted to the batching scheduler together,
+    so they run through the model as full batches. Results are in input
+    order; an image that fails gets an "error" entry instead of failing the
+    request.
+    """
+    results = [None] * len(images)
+    keys = [None] * len(images)
+    to_decode = []
+    for i, image_bytes in enumerate(images):
+        if prediction_cache is not None:
+            keys[i] = content_key(image_bytes, cache_tag)
+            cached = prediction_cache.get(keys[i])
+            if cached is not None:
+                cached["cached"] = True
+                results[i] = cached
+                continue
+        to_decode.append(i)
+    
+    decoded = decode_pool.map(_decode_or_error, [images[i] for i in to_decode])
+    submitted = []
+    copies = []
+    for i, (processed_image, error) in zip(to_decode, decoded):
+        if error is not None:
+            results[i] = {"error": error}
+            continue
+        image_hash, match = find_near_duplicate(processed_image)
+        if match is None and image_hash is not None:
+            # A copy of an image submitted earlier in this request waits for its prediction
+            pending = pending_near_duplicate(image_hash, submitted)
+            if pending is not None:
+                near_duplicates.count_pending_hit()
+                copies.append((i, pending))
+                continue
+        if match is not None:
+            result = near_duplicate_result(match)
+            result["cached"] = False
+            results[i] = result
+        else:
+            submitted.append((i, image_hash, batcher.submit(processed_image)))
+    
+    predictions = {}
+    for i, image_hash, future in submitted:
+        try:
+            prediction = future.result()
+            result = format_prediction(prediction)
+        except Exception as e:
+            results[i] = {"error": str(e)}
+            continue
+        predictions[i] = prediction
+        remember_near_duplicate(image_hash, prediction)
+        if prediction_cache is not None:
+            prediction_cache.put(keys[i], result)
+        result["cached"] = False
+        results[i] = result
+    
+    for i, (original, distance) in copies:
+        if original not in predictions:
+            results[i] = dict(results[original])
+            continue
+        prediction = predictions[original]
+        if stage_name(prediction) is not None:
+            match = NearDuplicate(float(prediction[0]), int(prediction[1]), distance)
+        else:
+            match = NearDuplicate(float(prediction), None, distance)
+        result = near_duplicate_result(match)
+        result["cached"] = False
+        results[i] = result
+    
+    return results
+
+def server_busy(kind='queue_full'):
+    """Response for requests shed because the model queue or the worker is full"""
+    ERRORS.inc(kind)
+    response = jsonify({"error": "Server busy, retry shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def model_unavailable():
+    """Response for predictions requested while no model is loaded"""
+    return jsonify({"error": "Model not loaded", "model": model_artifact.state()}), 503
+
+@app.before_request
+def start_timer():
+    """Remember when the request started, for the request latency metrics"""
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def admit_request():
+    """Shed prediction requests beyond MAX_IN_FLIGHT before any work is done"""
+    global in_flight
+    if request.endpoint not in PREDICTION_ENDPOINTS:
+        return None
+    with in_flight_lock:
+        if MAX_IN_FLIGHT and in_flight >= MAX_IN_FLIGHT:
+            return server_busy('overloaded')
+        in_flight += 1
+    g.admitted = True
+    return None
+
+@app.teardown_request
+def release_request(error=None):
+    """Free the admission slot of a finished prediction request"""
+    global in_flight
+    if g.pop('admitted', False):
+        with in_flight_lock:
+            in_flight -= 1
+
+@app.after_request
+def record_request(response):
+    """Count the request by route and status and record its latency"""
+    # The URL rule, not the raw path, so unknown URLs do not add label values
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.inc(route, request.method, response.status_code)
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics in Prometheus text format"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "model_loaded": model is not None})
+    status = "healthy" if infer is not None else "unavailable"
+    if infer is not None and cascade_error is not None:
+        status = "degraded"
+    health = {
+        "status": status,
+        "model_loaded": infer is not None,
+        "model": model_artifact.state(),
+        # Per worker: behind serve.py each request reports the worker that served it
+        "memory": process_memory(),
+        "requests": {"in_flight": in_flight, "max_in_flight": MAX_IN_FLIGHT}
+    }
+    if cascade_artifact is not None:
+        health["cascade"] = {
+            "enabled": isinstance(infer, CascadeModel),
+            "error": cascade_error,
+            "band": [CASCADE_LOW, CASCADE_HIGH],
+            "model": cascade_artifact.state(),
+            "images": {stage: CASCADE_IMAGES.value(stage) for stage in CASCADE_STAGES}
+        }
+    if prediction_cache is not None:
+        health["cache"] = prediction_cache.stats()
+    if near_duplicates is not None:
+        health["near_duplicates"] = near_duplicates.stats()
+    return jsonify(health), 200 if infer is not None else 503
 
 @app.route('/predict', methods=['POST'])
 def predict():
     """Predict if uploaded image is a cat or dog"""
     try:
         # Check if model is loaded
-        if model is None:
-            return jsonify({"error": "Model not loaded"}), 500
+        if infer is None:
+            return model_unavailable()
         
         # Get image from request
         if 'image' not in request.files:
@@ -93,28 +628,15 @@ def predict():
         if file.filename == '':
             return jsonify({"error": "No image selected"}), 400
         
-        # Process the image
-        image = Image.open(file.stream)
-        processed_image = preprocess_image(image)
-        
-        # Make prediction
-        prediction = model.predict(processed_image)
-        prediction_value = float(prediction[0][0])
+        try:
+            result = classify_image_bytes(file.read())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Convert prediction to class (0 = cat, 1 = dog based on typical binary classification)
-        if prediction_value > 0.5:
-            predicted_class = "dog"
-            confidence = prediction_value
-        else:
-            predicted_class = "cat"
-            confidence = 1 - prediction_value
-        
-        return jsonify({
-            "predicted_class": predicted_class,
-            "confidence": float(confidence),
-            "raw_prediction": prediction_value
-        })
+        return jsonify(result)
         
+    except QueueFull:
+        return server_busy()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -123,45 +645,114 @@ def predict_base64():
     """Predict from base64 encoded image"""
     try:
         # Check if model is loaded
-        if model is None:
-            return jsonify({"error": "Model not loaded"}), 500
+        if infer is None:
+            return model_unavailable()
         
         data = request.get_json()
         if 'image' not in data:
             return jsonify({"error": "No image data provided"}), 400
         
-        # Decode base64 image
-        image_data = data['image'].split(',')[1]  # Remove data:image/...;base64, prefix
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
+        # Decode base64 image, with or without a data:image/...;base64, prefix
+        image_data = data['image'].partition(',')[2] or data['image']
+        try:
+            # Malformed base64 raises binascii.Error, a ValueError
+            image_bytes = base64.b64decode(image_data)
+            result = classify_image_bytes(image_bytes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Process the image
-        processed_image = preprocess_image(image)
+        return jsonify(result)
         
-        # Make prediction
-        prediction = model.predict(processed_image)
-        prediction_value = float(prediction[0][0])
+    except QueueFull:
+        return server_busy()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Predict many images in one request (multipart 'images' fields or a framed binary body)"""
+    try:
+        # Check if model is loaded
+        if infer is None:
+            return model_unavailable()
         
-        # Convert prediction to class
-        if prediction_value > 0.5:
-            predicted_class = "dog"
-            confidence = prediction_value
+        if request.mimetype == BATCH_CONTENT_TYPE:
+            try:
+                images = parse_framed_images(request.get_data(cache=False))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            names = [None] * len(images)
         else:
-            predicted_class = "cat"
-            confidence = 1 - prediction_value
+            files = request.files.getlist('images')
+            images = [file.read() for file in files]
+            names = [file.filename for file in files]
+        
+        if not images:
+            return jsonify({"error": "No images provided"}), 400
+        if len(images) > PREDICT_BATCH_MAX_IMAGES:
+            return jsonify({"error": f"Too many images: {len(images)} "
+                                     f"(limit {PREDICT_BATCH_MAX_IMAGES})"}), 413
+        
+        results = classify_many(images)
+        for index, (name, result) in enumerate(zip(names, results)):
+            result["index"] = index
+            if name is not None:
+                result["filename"] = name
         
         return jsonify({
-            "predicted_class": predicted_class,
-            "confidence": float(confidence),
-            "raw_prediction": prediction_value
+            "count": len(results),
+            "errors": sum(1 for result in results if "error" in result),
+            "results": results
         })
         
+    except QueueFull:
+        return server_busy()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/v2/predict', methods=['POST'])
+def predict_raw():
+    """Predict from a raw request body: an encoded image or a preprocessed uint8 tensor"""
+    try:
+        # Check if model is loaded
+        if infer is None:
+            return model_unavailable()
+        
+        if request.mimetype == TENSOR_CONTENT_TYPE:
+            decode = decode_tensor_bytes
+        elif request.mimetype.startswith('image/'):
+            decode = decode_image_bytes
+        else:
+            return jsonify({"error": f"Unsupported Content-Type '{request.mimetype}'; "
+                                     f"send image/* or {TENSOR_CONTENT_TYPE}"}), 415
+        
+        # Read the body straight off the stream: no multipart or base64 layer
+        raw_bytes = request.get_data(cache=False)
+        if not raw_bytes:
+            return jsonify({"error": "No image data provided"}), 400
+        
+        try:
+            result = classify_bytes(raw_bytes, decode)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(result)
+        
+    except QueueFull:
+        return server_busy()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def shutdown():
+    """Let queued predictions finish, then stop the batching scheduler"""
+    if batcher is not None:
+        batcher.stop()
+
 if __name__ == '__main__':
     # Load model on startup
     load_model()
     
-    # Run the Flask app
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Run the Flask development server; use serve.py in production
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+    app.run(debug=debug, use_reloader=False, threaded=True,
+            host='0.0.0.0', port=int(os.environ.get('PORT', '5000')))
\ No newline at end of file
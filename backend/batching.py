@@ -0,0 +1,159 @@
+"""
+Dynamic micro-batching for the prediction API.
+
+Concurrent requests each submit one preprocessed image. A single worker
+thread collects them into a batch (up to ``max_batch_size`` images, waiting
+at most ``max_wait_ms`` after the first one arrives) and runs one forward
+pass for the whole batch. Every caller gets back its own prediction.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class QueueFull(RuntimeError):
+    """Raised when the scheduler already has its maximum number of queued requests."""
+
+
+class BatchScheduler:
+    """Collect single-image requests into batches for one forward pass."""
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, max_queue_size=0,
+                 on_batch=None):
+        """
+        Args:
+            predict_fn: Callable taking a (N, H, W, C) array and returning
+                N predictions (shape (N,) or (N, 1)), or N rows of several
+                outputs such as a cascade's (score, stage)
+            max_batch_size (int): Largest batch sent to ``predict_fn``
+            max_wait_ms (float): How long to wait for more requests after
+                the first one of a batch arrives
+            max_queue_size (int): Most requests allowed to wait for the model;
+                further submissions raise QueueFull. 0 means unbounded.
+            on_batch: Optional callable(batch_size, queue_waits, inference_seconds,
+                error) called after every forward pass, with each request's
+                seconds spent queued and the exception raised, if any
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self.max_queue_size = max_queue_size
+        self.on_batch = on_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start the background batching thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="batch-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the batching thread after it finishes the queued requests."""
+        self._stopped.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, image_array):
+        """
+        Queue one preprocessed image for prediction.
+
+        Args:
+            image_array (numpy.ndarray): Image of shape (H, W, C) or (1, H, W, C)
+
+        Returns:
+            concurrent.futures.Future: Resolves to the prediction as a float,
+            or to its row of outputs when the model returns several
+        """
+        if self._stopped.is_set():
+            raise RuntimeError("Batch scheduler is stopped")
+        # Shed load instead of letting latency grow without bound
+        if self.max_queue_size and self._queue.qsize() >= self.max_queue_size:
+            raise QueueFull("Too many requests waiting for the model")
+        if image_array.ndim == 4:
+            if image_array.shape[0] != 1:
+                raise ValueError("submit() takes a single image")
+            image_array = image_array[0]
+        future = Future()
+        self._queue.put((image_array, future, time.perf_counter()))
+        return future
+
+    def queue_depth(self):
+        """Number of requests waiting for a batch slot."""
+        return self._queue.qsize()
+
+    def predict(self, image_array, timeout=None):
+        """Submit one image and block until its prediction is ready."""
+        return self.submit(image_array).result(timeout)
+
+    def _collect_batch(self, first):
+        """Gather requests after ``first`` until the batch is full or the wait expires."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop sentinel: run what we have, then exit
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                if self._stopped.is_set():
+                    return
+                continue
+
+            batch = self._collect_batch(first)
+            # Drop requests whose callers already gave up
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                inputs = np.stack([image for image, _, _ in batch])
+                predictions = np.asarray(self.predict_fn(inputs)).reshape(len(batch), -1)
+            except Exception as e:
+                self._report(batch, started, e)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self._report(batch, started, None)
+
+            for (_, future, _), prediction in zip(batch, predictions):
+                future.set_result(float(prediction[0]) if len(prediction) == 1 else prediction)
+
+    def _report(self, batch, started, error):
+        """Pass timings of a finished forward pass to the ``on_batch`` callback."""
+        if self.on_batch is None:
+            return
+        try:
+            self.on_batch(len(batch), [started - queued for _, _, queued in batch],
+                          time.perf_counter() - started, error)
+        except Exception:
+            # Instrumentation must never fail a batch
+            pass
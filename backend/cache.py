@@ -0,0 +1,151 @@
+"""
+Prediction cache keyed by a hash of the uploaded image bytes.
+
+Repeat uploads of the same file skip decoding and inference entirely. Entries
+live in a bounded in-memory LRU, with an optional TTL. An optional SQLite file
+can be shared by several worker processes so they reuse each other's entries;
+it outlives the processes, so keys carry a tag of the model that made the
+prediction, and expired and surplus rows are deleted as new ones are written.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Shared-store writes between two prunes of expired and surplus rows
+PRUNE_EVERY = 256
+
+
+def content_key(data, model_tag=''):
+    """Return the cache key for raw image bytes classified by the model identified by ``model_tag``."""
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f"{model_tag}:{digest}" if model_tag else digest
+
+
+class PredictionCache:
+    """Bounded LRU cache of prediction results with optional TTL and shared store."""
+
+    def __init__(self, max_entries=10000, ttl_seconds=None, shared_path=None,
+                 max_shared_entries=100000):
+        """
+        Args:
+            max_entries (int): Entries kept in memory before the least recently
+                used one is evicted
+            ttl_seconds (float): Entry lifetime, or None to keep entries until evicted
+            shared_path (str): Optional SQLite file shared between worker processes
+            max_shared_entries (int): Rows kept in the shared file; the oldest
+                are deleted beyond it (0 or None keeps them all)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds or None
+        self.max_shared_entries = max_shared_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_evictions = 0
+        self._writes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared = None
+        if shared_path:
+            self._shared = sqlite3.connect(shared_path, check_same_thread=False)
+            self._shared.execute("PRAGMA journal_mode=WAL")
+            self._shared.execute("PRAGMA synchronous=NORMAL")
+            self._shared.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._shared.execute(
+                "CREATE INDEX IF NOT EXISTS predictions_stored_at ON predictions (stored_at)"
+            )
+            self._shared.commit()
+            # Rows left behind by earlier runs, e.g. of another model
+            with self._lock:
+                self._prune_shared(time.time())
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def _remember(self, key, value, stored_at):
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_shared(self, key, now):
+        row = self._shared.execute(
+            "SELECT value, stored_at FROM predictions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._expired(row[1], now):
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _prune_shared(self, now):
+        """Delete expired rows, then the oldest rows beyond ``max_shared_entries``."""
+        with self._shared:
+            deleted = 0
+            if self.ttl is not None:
+                deleted += self._shared.execute(
+                    "DELETE FROM predictions WHERE stored_at < ?", (now - self.ttl,)
+                ).rowcount
+            if self.max_shared_entries:
+                deleted += self._shared.execute(
+                    "DELETE FROM predictions WHERE key IN ("
+                    " SELECT key FROM predictions ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_shared_entries,)
+                ).rowcount
+        self.shared_evictions += deleted
+
+    def get(self, key):
+        """Return the cached result for ``key``, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1], now):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._shared is not None:
+                entry = self._get_shared(key, now)
+                if entry is not None:
+                    self._remember(key, *entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key, value):
+        """Store a result dict under ``key``."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, dict(value), now)
+            if self._shared is not None:
+                with self._shared:
+                    self._shared.execute(
+                        "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now),
+                    )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune_shared(now)
+
+    def stats(self):
+        """Counters reported by the /health endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+                "shared": self._shared is not None,
+                "shared_evictions": self.shared_evictions,
+            }
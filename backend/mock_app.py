@@ -5,6 +5,10 @@ import base64
 import io
 from PIL import Image
 import json
+import os
+
+# Simulated processing time per prediction in seconds (MOCK_DELAY=0 for load testing)
+MOCK_DELAY = float(os.environ.get('MOCK_DELAY', '1'))
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all domains
@@ -28,7 +32,7 @@ def predict():
         
         # Simulate processing time
         import time
-        time.sleep(1)
+        time.sleep(MOCK_DELAY)
         
         # Mock prediction - randomly choose cat or dog
         is_dog = random.choice([True, False])
@@ -59,7 +63,7 @@ def predict_base64():
         
         # Simulate processing time
         import time
-        time.sleep(1)
+        time.sleep(MOCK_DELAY)
         
         # Mock prediction - randomly choose cat or dog
         is_dog = random.choice([True, False])
@@ -83,4 +87,4 @@ def predict_base64():
 if __name__ == '__main__':
     print("Starting Mock Cats & Dogs Classifier API...")
     print("Note: This is a mock version. Install TensorFlow to enable real predictions.")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', '5000')))
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""
+Memory usage of the current process, for the health check and worker logs.
+
+Reads /proc/self/status, so it is only available on Linux. Anonymous memory
+(``rss_anon_mb``) is private to the process. File-backed memory
+(``rss_file_mb``) includes memory-mapped model weights, which every worker
+mapping the same file shares. ``pss_mb`` splits shared pages evenly between
+the processes using them, so summing it over all workers gives their real
+total footprint.
+"""
+
+import os
+
+STATUS_FIELDS = {
+    'VmRSS': 'rss_mb',
+    'RssAnon': 'rss_anon_mb',
+    'RssFile': 'rss_file_mb',
+    'RssShmem': 'rss_shmem_mb',
+}
+
+
+def _read_kb_fields(path, fields):
+    """Read 'Name:   123 kB' lines from a /proc file into a dict of MB values."""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in fields:
+                values[fields[name]] = round(int(rest.split()[0]) / 1024, 1)
+    return values
+
+
+def process_memory():
+    """
+    Return the resident memory of this process in MB.
+
+    Returns:
+        dict: pid plus rss_mb, rss_anon_mb, rss_file_mb, rss_shmem_mb and
+        pss_mb where the kernel provides them; just the pid elsewhere
+    """
+    memory = {'pid': os.getpid()}
+    try:
+        memory.update(_read_kb_fields('/proc/self/status', STATUS_FIELDS))
+        memory.update(_read_kb_fields('/proc/self/smaps_rollup', {'Pss': 'pss_mb'}))
+    except OSError:
+        pass
+    return memory
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Production server for the Cats & Dogs Classifier API.
+
+Runs app.py under gunicorn with pre-forked worker processes. Each worker
+loads the model once and serves requests on a pool of threads. Concurrent
+requests within a worker share its micro-batching scheduler. A worker
+admits at most --max-in-flight prediction requests at once, fewer than its
+threads, so a saturated worker answers HTTP 503 straight away from a spare
+thread instead of letting connections queue. The scheduler's queue of
+images is bounded as well (BATCH_MAX_QUEUE). On SIGTERM, workers stop
+accepting connections, finish in-flight requests (up to --graceful-timeout),
+drain their batching queue and exit.
+
+With --shared-weights the model is verified and converted to a TensorFlow
+Lite file once, in the parent process, before any worker is forked. Every
+worker then memory-maps that one file and runs it without the XNNPACK
+delegate, which would copy the weights into private memory, so the weights
+are held in memory once instead of once per worker, at the cost of slower
+inference. Worker memory is logged at startup and reported by /health.
+
+Usage: python serve.py [--workers N] [--threads N] [--max-in-flight N] [--bind 0.0.0.0:5000] [--shared-weights]
+"""
+
+import argparse
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from procinfo import process_memory
+
+# The artifact manager lives in the project root next to predict.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from artifacts import DEFAULT_CACHE_DIR, ModelArtifact, ModelArtifactError
+
+
+def default_max_in_flight(threads):
+    """Admit predictions on three quarters of the threads; the rest answer 503s and /health."""
+    return max(1, threads - max(1, threads // 4))
+
+
+def default_workers():
+    """One worker per two cores: each worker's TensorFlow runtime is itself multi-threaded."""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+class ClassifierServer(BaseApplication):
+    """Gunicorn application serving app.py with the model loaded once per worker."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        import app
+        return app.app
+
+
+def post_fork(server, worker):
+    """Split the machine's cores between workers before TensorFlow starts its thread pools."""
+    import app
+    tf_threads = int(os.environ.get('TF_NUM_THREADS', '0'))
+    # TensorFlow Lite models take the thread count in load_model() instead,
+    # and their workers never import TensorFlow
+    artifacts = [app.model_artifact] + ([app.cascade_artifact] if app.cascade_artifact else [])
+    if tf_threads and not all(artifact.serves_tflite for artifact in artifacts):
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def post_worker_init(worker):
+    """Load, compile and warm up the model in each worker before it accepts requests."""
+    import app
+    app.load_model()
+    memory = process_memory()
+    worker.log.info("Worker %s ready (RSS %s MB: %s MB private, %s MB file-backed)",
+                    worker.pid, memory.get('rss_mb'), memory.get('rss_anon_mb'),
+                    memory.get('rss_file_mb'))
+
+
+def worker_exit(server, worker):
+    """Let queued predictions finish before the worker process exits."""
+    import app
+    app.shutdown()
+
+
+def main():
+    """Parse command line arguments and run the production server."""
+    parser = argparse.ArgumentParser(
+        description='Serve the Cats & Dogs Classifier API with pre-forked worker processes.'
+    )
+    parser.add_argument(
+        '--bind',
+        default=os.environ.get('BIND', '0.0.0.0:5000'),
+        help='Address to listen on (default: 0.0.0.0:5000)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=int(os.environ.get('WORKERS', default_workers())),
+        help='Worker processes, each with its own model instance (default: CPU count / 2)'
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=int(os.environ.get('THREADS', '32')),
+        help='Request threads per worker; concurrent requests share one batch queue (default: 32)'
+    )
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=int(os.environ['MAX_IN_FLIGHT']) if os.environ.get('MAX_IN_FLIGHT') else None,
+        help='Prediction requests a worker handles at once before answering 503; '
+             'must be below --threads (default: three quarters of --threads)'
+    )
+    parser.add_argument(
+        '--worker-connections',
+        type=int,
+        default=int(os.environ.get('WORKER_CONNECTIONS', '1000')),
+        help='Client connections a worker holds open, including idle keep-alive ones; '
+             'beyond it, connections wait in the listen backlog (default: 1000)'
+    )
+    parser.add_argument(
+        '--backlog',
+        type=int,
+        default=int(os.environ.get('BACKLOG', '512')),
+        help='Pending connections the kernel queues before refusing new ones (default: 512)'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=int,
+        default=int(os.environ.get('TIMEOUT', '120')),
+        help='Seconds before a silent worker is restarted (default: 120)'
+    )
+    parser.add_argument(
+        '--graceful-timeout',
+        type=int,
+        default=int(os.environ.get('GRACEFUL_TIMEOUT', '30')),
+        help='Seconds workers get to finish in-flight requests on shutdown (default: 30)'
+    )
+    parser.add_argument(
+        '--shared-weights',
+        action='store_true',
+        default=os.environ.get('SHARED_WEIGHTS', '0') == '1',
+        help='Prepare one memory-mapped TensorFlow Lite model in the parent process '
+             'and share its weights between all workers (slower: disables XNNPACK)'
+    )
+    args = parser.parse_args()
+
+    if args.max_in_flight is None:
+        args.max_in_flight = default_max_in_flight(args.threads)
+    if not 0 < args.max_in_flight < args.threads:
+        parser.error("--max-in-flight must be at least 1 and below --threads, "
+                     "so a thread is always free to turn requests away")
+    if args.worker_connections < 2 * args.threads:
+        parser.error("--worker-connections must be at least twice --threads")
+    # Workers read the limit from the environment when they import app.py
+    os.environ['MAX_IN_FLIGHT'] = str(args.max_in_flight)
+
+    if args.shared_weights:
+        # Workers resolve the same settings, so they load the file prepared
+        # here, and they load it without XNNPACK so its weights stay shared
+        os.environ.setdefault('MODEL_CACHE_DIR', DEFAULT_CACHE_DIR)
+        os.environ['SHARED_WEIGHTS'] = '1'
+        artifacts = [ModelArtifact()]
+        if os.environ.get('CASCADE_MODEL_PATH'):
+            artifacts.append(ModelArtifact(os.environ['CASCADE_MODEL_PATH'],
+                                           sha256=os.environ.get('CASCADE_MODEL_SHA256')))
+        for artifact in artifacts:
+            try:
+                shared_path = artifact.prepare()
+            except ModelArtifactError as e:
+                # Workers still start and report the problem on /health
+                print(f"Could not prepare shared weights: {e}")
+            else:
+                print(f"Workers share the memory-mapped weights in {shared_path}")
+
+    # Spread the cores over the workers instead of every TensorFlow runtime
+    # claiming all of them
+    os.environ.setdefault('TF_NUM_THREADS', str(max(1, (os.cpu_count() or 1) // args.workers)))
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        # Every client connection is accepted, so no request waits unanswered in
+        # the listen backlog; the spare threads turn away what is not admitted
+        'worker_connections': args.worker_connections,
+        'backlog': args.backlog,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+        'accesslog': '-',
+    }
+
+    print(f"Starting Cats & Dogs Classifier API on {args.bind} "
+          f"({args.workers} workers x {args.threads} threads, "
+          f"{args.max_in_flight} predictions in flight per worker)...")
+    ClassifierServer(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 import http.server
-import socketserver
 import json
+import os
 import urllib.parse
 import random
 import time
 from http import HTTPStatus
 
+# Simulated processing time per prediction in seconds (MOCK_DELAY=0 for load testing)
+MOCK_DELAY = float(os.environ.get('MOCK_DELAY', '1'))
+
 class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -33,8 +36,11 @@ class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
 
     def do_POST(self):
         if self.path == '/predict' or self.path == '/predict_base64':
+            # Consume the upload so the client is not cut off mid-request
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            
             # Simulate processing time
-            time.sleep(1)
+            time.sleep(MOCK_DELAY)
             
             # Mock prediction
             is_dog = random.choice([True, False])
@@ -61,12 +67,16 @@ class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
 
 if __name__ == "__main__":
-    PORT = 5000
+    PORT = int(os.environ.get('PORT', '5000'))
     
     print(f"Starting Mock Cats & Dogs Classifier API on port {PORT}...")
     print("Note: This is a mock version for testing the frontend.")
     
-    with socketserver.TCPServer(("", PORT), CORSHTTPRequestHandler) as httpd:
+    # One thread per request, so a slow request does not block the others
+    with http.server.ThreadingHTTPServer(("", PORT), CORSHTTPRequestHandler) as httpd:
         print(f"Server running at http://localhost:{PORT}")
-        print("Health check: http://localhost:5000/health")
-        httpd.serve_forever()
\ No newline at end of file
+        print(f"Health check: http://localhost:{PORT}/health")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("Shutting down...")
\ No newline at end of file
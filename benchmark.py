@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Inference Benchmark
+
+Measures throughput (images/sec) and p50/p95/p99 latency of:
+    cli_single   predict.py's one-image-at-a-time path (predict_image)
+    cli_batch    predict.py's batched path (iter_result_batches)
+    http_*       the backend endpoints (/predict, /v2/predict, /predict_batch)
+                 at each requested concurrency level
+
+Runs offline and reproducibly. The image corpus is generated from a fixed
+seed, in configurable sizes and formats. Unless --model is given, a stand-in
+model with the classifier's architecture and random weights is built, so no
+trained model or weight download is needed. Both are cached in --workdir, so
+later runs compare like with like. The backend is started on a free local
+port unless --url points at a running server.
+
+Results are written as JSON. --compare checks them against an earlier run
+and exits with status 1 when throughput or p95 latency got worse by more
+than --tolerance.
+
+Usage: python benchmark.py [--images 200] [--sizes 640x480,1920x1080] [--concurrency 1,8,32] [--output results.json]
+"""
+
+import sys
+import os
+import argparse
+import http.client
+import json
+import platform
+import socket
+import subprocess
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from metrics import Histogram
+from predict import PROFILE_STAGES, iter_result_batches, load_model, predict_image
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Pillow format names and file extensions of the supported corpus formats
+IMAGE_FORMATS = {'jpeg': ('JPEG', '.jpg'), 'png': ('PNG', '.png'), 'webp': ('WEBP', '.webp')}
+
+# Content type of framed multi-image bodies for /predict_batch (see backend/app.py)
+BATCH_CONTENT_TYPE = 'application/x-image-batch'
+
+HTTP_ENDPOINTS = ('predict', 'v2', 'predict_batch')
+
+
+def parse_sizes(value):
+    """Parse a comma-separated list of WIDTHxHEIGHT sizes such as 640x480,1920x1080."""
+    sizes = []
+    for item in value.split(','):
+        try:
+            width, height = (int(part) for part in item.lower().split('x'))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, got '{item}'")
+        sizes.append((width, height))
+    return sizes
+
+
+def parse_list(value, convert=str):
+    """Parse a comma-separated command line list."""
+    return [convert(item) for item in value.split(',') if item]
+
+
+def synthetic_image(rng, size):
+    """
+    Generate a photo-like RGB image: smooth colour fields plus sensor-like noise.
+
+    Pure noise compresses (and decodes) very differently from real photos,
+    so a coarse random grid is upsampled into smooth gradients first.
+    """
+    width, height = size
+    coarse = rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+    pixels = np.asarray(image, dtype=np.int16) + rng.normal(0, 6, size=(height, width, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def generate_corpus(directory, count, sizes, formats, seed=0):
+    """
+    Create (or reuse) a reproducible corpus of synthetic images.
+
+    Images cycle through ``sizes`` and ``formats``. A manifest records the
+    parameters, so an existing corpus is reused only when they match.
+
+    Args:
+        directory (str): Where to write the images
+        count (int): Number of images
+        sizes (list): (width, height) tuples
+        formats (list): Keys of IMAGE_FORMATS
+        seed (int): Random seed
+
+    Returns:
+        dict: Corpus description with 'paths', 'bytes' and the parameters
+    """
+    manifest_path = os.path.join(directory, 'manifest.json')
+    params = {'count': count, 'sizes': [list(size) for size in sizes],
+              'formats': list(formats), 'seed': seed}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['params'] == params and all(os.path.exists(p) for p in manifest['paths']):
+            return manifest
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for index in range(count):
+        size = sizes[index % len(sizes)]
+        pil_format, extension = IMAGE_FORMATS[formats[(index // len(sizes)) % len(formats)]]
+        path = os.path.join(directory, f'img_{index:05d}_{size[0]}x{size[1]}{extension}')
+        synthetic_image(rng, size).save(path, format=pil_format, quality=90)
+        paths.append(path)
+
+    manifest = {'params': params, 'paths': paths,
+                'bytes': sum(os.path.getsize(path) for path in paths)}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def build_stand_in_model(path, architecture='xception', seed=0):
+    """
+    Build (or reuse) a model with the classifier's input and output but random weights.
+
+    'xception' matches the real classifier's compute; 'tiny' is a small CNN
+    for measuring everything except the model.
+    """
+    if os.path.exists(path):
+        return path
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    if architecture == 'xception':
+        backbone = tf.keras.applications.xception.Xception(
+            include_top=False, input_shape=(128, 128, 3), weights=None, pooling='max'
+        )
+        layers = [backbone, tf.keras.layers.Flatten(),
+                  tf.keras.layers.Dense(128, activation='relu'),
+                  tf.keras.layers.Dense(128, activation='relu'),
+                  tf.keras.layers.Dense(32, activation='relu')]
+    else:
+        layers = [tf.keras.Input(shape=(128, 128, 3)),
+                  tf.keras.layers.Conv2D(16, 3, strides=2, activation='relu'),
+                  tf.keras.layers.Conv2D(32, 3, strides=2, activation='relu'),
+                  tf.keras.layers.GlobalMaxPooling2D()]
+    model = tf.keras.Sequential(layers + [tf.keras.layers.Dense(1, activation='sigmoid')])
+    model.build((None, 128, 128, 3))
+    model.save(path)
+    return path
+
+
+def latency_stats(latencies, items, elapsed):
+    """Summarize per-call latencies (seconds) of a run that processed ``items`` images."""
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000
+    stats = {
+        'images': items,
+        'seconds': round(elapsed, 4),
+        'images_per_sec': round(items / elapsed, 2) if elapsed > 0 else 0.0,
+        'calls': int(latencies.size),
+    }
+    if latencies.size:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        stats['latency_ms'] = {
+            'mean': round(float(latencies.mean()), 3), 'p50': round(float(p50), 3),
+            'p95': round(float(p95), 3), 'p99': round(float(p99), 3),
+            'max': round(float(latencies.max()), 3),
+        }
+    return stats
+
+
+def bench_cli_single(model, paths, warmup=5):
+    """Time predict_image() one image at a time."""
+    for path in paths[:warmup]:
+        predict_image(model, path)
+    latencies = []
+    start = time.perf_counter()
+    for path in paths:
+        call_start = time.perf_counter()
+        predict_image(model, path)
+        latencies.append(time.perf_counter() - call_start)
+    return latency_stats(latencies, len(paths), time.perf_counter() - start)
+
+
+def bench_cli_batch(model, paths, batch_size, workers, warmup=1):
+    """Time iter_result_batches(); latency is per batch, plus the per-stage breakdown."""
+    for _ in iter_result_batches(model, paths[:batch_size * warmup], batch_size, workers):
+        pass
+    stages = Histogram('benchmark_stage_seconds', 'Time per pipeline stage', ('stage',))
+    latencies = []
+    start = time.perf_counter()
+    batch_start = start
+    for _ in iter_result_batches(model, paths, batch_size, workers, stages=stages):
+        now = time.perf_counter()
+        latencies.append(now - batch_start)
+        batch_start = now
+    stats = latency_stats(latencies, len(paths), time.perf_counter() - start)
+    stats['batch_size'] = batch_size
+    summary = stages.summary()
+    stats['stages_ms'] = {
+        stage: {key: round(value * 1000, 3) for key, value in summary[(stage,)].items()
+                if key in ('mean', 'p50', 'p95', 'p99')}
+        for stage in PROFILE_STAGES if (stage,) in summary
+    }
+    return stats
+
+
+def free_port():
+    """Return a TCP port that is currently free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(base_url, timeout=300):
+    """Block until the server's /health answers 200."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = http_request(base_url, 'GET', '/health')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout}s")
+
+
+def start_backend(model_path, port):
+    """Start backend/app.py on ``port``, serving ``model_path`` with the cache disabled."""
+    env = dict(os.environ, MODEL_PATH=os.path.abspath(model_path), PORT=str(port),
+               CACHE_MAX_ENTRIES='0', FLASK_DEBUG='0')
+    return subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=os.path.join(PROJECT_ROOT, 'backend'), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def http_request(base_url, method, path, body=None, headers=None, connection=None):
+    """Send one request; returns (status, response body). Reuses ``connection`` if given."""
+    if connection is None:
+        parsed = urllib.parse.urlsplit(base_url)
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def encode_multipart(field, filename, data):
+    """Build a multipart/form-data body with one file field."""
+    boundary = 'benchmark-boundary-7d1f'
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+            f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n').encode()
+    body += data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def build_requests(endpoint, images, http_batch_size):
+    """Pre-encode the request bodies for an endpoint, so the client adds no encoding work."""
+    built = []
+    if endpoint == 'predict':
+        for name, data in images:
+            body, content_type = encode_multipart('image', name, data)
+            built.append(('/predict', body, {'Content-Type': content_type}, 1))
+    elif endpoint == 'v2':
+        for name, data in images:
+            content_type = 'image/png' if name.endswith('.png') else 'image/jpeg'
+            built.append(('/v2/predict', data, {'Content-Type': content_type}, 1))
+    else:
+        for offset in range(0, len(images), http_batch_size):
+            chunk = images[offset:offset + http_batch_size]
+            body = b''.join(len(data).to_bytes(4, 'big') + data for _, data in chunk)
+            built.append(('/predict_batch', body, {'Content-Type': BATCH_CONTENT_TYPE}, len(chunk)))
+    return built
+
+
+def bench_http(base_url, requests, concurrency, total_requests):
+    """
+    Send ``total_requests`` requests from ``concurrency`` client threads (closed loop).
+
+    Each thread keeps one keep-alive connection and sends its next request
+    as soon as the previous one is answered.
+    """
+    parsed = urllib.parse.urlsplit(base_url)
+    latencies, statuses = [], {}
+    images = [0]
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def client():
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+        try:
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                path, body, headers, count = requests[index % len(requests)]
+                call_start = time.perf_counter()
+                try:
+                    status, _ = http_request(base_url, 'POST', path, body, headers, connection)
+                except (OSError, http.client.HTTPException):
+                    status = 'connection_error'
+                    connection.close()
+                    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+                elapsed = time.perf_counter() - call_start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+                    if status == 200:
+                        images[0] += count
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    stats = latency_stats(latencies, images[0], time.perf_counter() - start)
+    stats['concurrency'] = concurrency
+    stats['status_counts'] = statuses
+    return stats
+
+
+def environment_info(model_path):
+    """Describe the machine and code a run was measured on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'model': model_path,
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Compare a run against a baseline run.
+
+    Returns:
+        list: (name, metric, baseline value, new value, change, regressed) rows
+    """
+    previous = {result['name']: result for result in baseline['results']}
+    rows = []
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+        throughput_change = (result['images_per_sec'] - old['images_per_sec']) / max(old['images_per_sec'], 1e-9)
+        rows.append((result['name'], 'images_per_sec', old['images_per_sec'],
+                     result['images_per_sec'], throughput_change, throughput_change < -tolerance))
+        if 'latency_ms' in result and 'latency_ms' in old:
+            old_p95, new_p95 = old['latency_ms']['p95'], result['latency_ms']['p95']
+            latency_change = (new_p95 - old_p95) / max(old_p95, 1e-9)
+            rows.append((result['name'], 'p95_ms', old_p95, new_p95, latency_change,
+                         latency_change > tolerance))
+    return rows
+
+
+def print_summary(results, stream=sys.stderr):
+    """Print a human-readable table of the results."""
+    print(f"\n{'benchmark':<28} {'images/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}", file=stream)
+    for result in results:
+        latency = result.get('latency_ms', {})
+        print(f"{result['name']:<28} {result['images_per_sec']:>9.1f} {latency.get('p50', 0):>9.2f} "
+              f"{latency.get('p95', 0):>9.2f} {latency.get('p99', 0):>9.2f}", file=stream)
+
+
+def main():
+    """Main function to handle command line arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the prediction CLI and the HTTP API on a synthetic corpus.'
+    )
+    parser.add_argument('--workdir', default='.benchmark',
+                        help='Directory for the generated corpus and stand-in model (default: .benchmark)')
+    parser.add_argument('--images', type=int, default=200,
+                        help='Number of synthetic images (default: 200)')
+    parser.add_argument('--sizes', type=parse_sizes, default=[(640, 480), (1920, 1080)],
+                        help='Comma-separated image sizes, WIDTHxHEIGHT (default: 640x480,1920x1080)')
+    parser.add_argument('--formats', type=parse_list, default=['jpeg'],
+                        help=f"Comma-separated image formats from {', '.join(IMAGE_FORMATS)} (default: jpeg)")
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--model', default=None,
+                        help='Model to benchmark instead of the stand-in (.keras or .tflite)')
+    parser.add_argument('--stand-in', choices=('xception', 'tiny'), default='xception',
+                        help='Stand-in architecture when --model is not given (default: xception)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Images per forward pass for cli_batch (default: 32)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Decoder threads for cli_batch (default: number of CPUs)')
+    parser.add_argument('--endpoints', type=parse_list, default=list(HTTP_ENDPOINTS),
+                        help=f"Comma-separated endpoints from {', '.join(HTTP_ENDPOINTS)} (default: all)")
+    parser.add_argument('--concurrency', type=lambda v: parse_list(v, int), default=[1, 8, 32],
+                        help='Comma-separated client concurrency levels (default: 1,8,32)')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Requests per endpoint and concurrency level (default: 200)')
+    parser.add_argument('--http-batch-size', type=int, default=16,
+                        help='Images per /predict_batch request (default: 16)')
+    parser.add_argument('--url', default=None,
+                        help='Benchmark this running server instead of starting the backend')
+    parser.add_argument('--skip-cli', action='store_true', help='Skip the CLI benchmarks')
+    parser.add_argument('--skip-http', action='store_true', help='Skip the HTTP benchmarks')
+    parser.add_argument('--output', default='-',
+                        help='File to write the JSON results to (default: standard output)')
+    parser.add_argument('--compare', default=None,
+                        help='Earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Relative slowdown reported as a regression (default: 0.10)')
+
+    args = parser.parse_args()
+
+    unknown = set(args.formats) - set(IMAGE_FORMATS)
+    if unknown:
+        parser.error(f"Unknown formats: {', '.join(sorted(unknown))}")
+    unknown = set(args.endpoints) - set(HTTP_ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    print(f"Generating {args.images} synthetic images in {args.workdir}...", file=sys.stderr)
+    corpus = generate_corpus(os.path.join(args.workdir, 'corpus'), args.images, args.sizes,
+                             args.formats, args.seed)
+    paths = corpus['paths']
+
+    model_path = args.model
+    if model_path is None:
+        model_path = os.path.join(args.workdir, f'stand_in_{args.stand_in}.keras')
+        print(f"Using stand-in model {model_path} (random weights)", file=sys.stderr)
+        build_stand_in_model(model_path, args.stand_in, args.seed)
+
+    report = {
+        'environment': environment_info(model_path),
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'compare')},
+        'corpus': {'images': len(paths), 'bytes': corpus['bytes'], **corpus['params']},
+        'results': [],
+    }
+    results = report['results']
+
+    if not args.skip_cli:
+        # load_model() prints its status; keep stdout for the JSON report
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            model = load_model(model_path)
+        finally:
+            sys.stdout = stdout
+        print("Benchmarking the CLI paths...", file=sys.stderr)
+        results.append({'name': 'cli_single', **bench_cli_single(model, paths)})
+        results.append({'name': f'cli_batch_{args.batch_size}',
+                        **bench_cli_batch(model, paths, args.batch_size, args.workers)})
+
+    if not args.skip_http:
+        server = None
+        base_url = args.url
+        if base_url is None:
+            port = free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            print(f"Starting the backend on {base_url}...", file=sys.stderr)
+            server = start_backend(model_path, port)
+        try:
+            wait_for_server(base_url)
+            images = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    images.append((os.path.basename(path), f.read()))
+            for endpoint in args.endpoints:
+                requests = build_requests(endpoint, images, args.http_batch_size)
+                # Warm up the connection handling and the model's batch sizes
+                bench_http(base_url, requests, max(args.concurrency), min(len(requests), 16))
+                for concurrency in args.concurrency:
+                    print(f"Benchmarking {endpoint} at concurrency {concurrency}...", file=sys.stderr)
+                    stats = bench_http(base_url, requests, concurrency, args.requests)
+                    results.append({'name': f'http_{endpoint}_c{concurrency}', **stats})
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    print_summary(results)
+
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"\nResults written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_results(results, baseline, args.tolerance)
+        print(f"\nCompared with {args.compare} (tolerance {args.tolerance:.0%}):", file=sys.stderr)
+        for name, metric, old, new, change, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{name:<28} {metric:<15} {old:>10.2f} -> {new:>10.2f} ({change:+.1%}){flag}",
+                  file=sys.stderr)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
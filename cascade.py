@@ -0,0 +1,142 @@
+"""
+Confidence cascade: a small, fast first-stage model answers the images it is
+sure about, and only the uncertain ones run through the full Xception model.
+
+Most images are easy: the fast model's sigmoid output is already near 0 or 1.
+Images whose fast-stage score falls inside the uncertainty band
+(``low`` < score < ``high``) are re-scored by the full model. Average compute
+per image then drops towards the cost of the fast model, while the hard
+images still get the full model's answer. train_cascade.py trains the fast
+model, and ``evaluate.py --cascade`` reports the accuracy vs. compute
+trade-off per threshold, for choosing the band.
+
+CascadeModel has the interface of the other predictors (image_size,
+input_dtype, warmup, called on a batch). It returns one (score, stage) row
+per image, where stage indexes CASCADE_STAGES.
+"""
+
+import numpy as np
+
+from preprocessing import to_model_input
+
+# Stage names reported with each prediction, by index
+CASCADE_STAGES = ('fast', 'full')
+
+# Default uncertainty band: the fast model answers at or below LOW and at or above HIGH
+DEFAULT_BAND = (0.1, 0.9)
+
+
+def stage_name(prediction):
+    """Return the stage that answered a prediction row, or None for single-model output."""
+    if np.size(prediction) < 2:
+        return None
+    return CASCADE_STAGES[int(prediction[1])]
+
+
+class CascadeModel:
+    """Two-stage predictor: fast model first, full model for uncertain images."""
+
+    def __init__(self, fast, full, low=DEFAULT_BAND[0], high=DEFAULT_BAND[1]):
+        """
+        Args:
+            fast: First-stage predictor (CompiledModel or TFLiteModel)
+            full: Full predictor, used for images the fast model is unsure about
+            low (float): Fast-stage scores at or below this are answered as cat
+            high (float): Fast-stage scores at or above this are answered as dog
+        """
+        if tuple(fast.image_size) != tuple(full.image_size):
+            raise ValueError(f"Cascade stages take different image sizes: "
+                             f"{fast.image_size} and {full.image_size}")
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError(f"Invalid uncertainty band ({low}, {high})")
+        self.fast = fast
+        self.full = full
+        self.low = low
+        self.high = high
+        # Both stages see the same batch; when one rescales in-graph and the
+        # other does not, batches arrive as uint8 and are converted per stage
+        if fast.input_dtype == full.input_dtype:
+            self.input_dtype = np.dtype(fast.input_dtype)
+        else:
+            self.input_dtype = np.dtype(np.uint8)
+
+    @property
+    def image_size(self):
+        """Input image size as (width, height)."""
+        return self.fast.image_size
+
+    def _stage_input(self, images, model):
+        if model.input_dtype == self.input_dtype:
+            return images
+        return to_model_input(images, model.input_dtype)
+
+    def __call__(self, images):
+        """
+        Run the cascade on a batch of preprocessed images.
+
+        Args:
+            images (numpy.ndarray): Batch of shape (N, 128, 128, 3) in ``input_dtype``
+
+        Returns:
+            numpy.ndarray: float32 array of shape (N, 2); column 0 is the
+            sigmoid output, column 1 the index in CASCADE_STAGES of the
+            stage that produced it
+        """
+        images = np.asarray(images)
+        scores = np.array(self.fast(self._stage_input(images, self.fast)),
+                          dtype=np.float32).reshape(-1)
+        uncertain = np.flatnonzero((scores > self.low) & (scores < self.high))
+        stages = np.zeros(len(scores), dtype=np.float32)
+        if uncertain.size:
+            full_scores = self.full(self._stage_input(images[uncertain], self.full))
+            scores[uncertain] = np.asarray(full_scores, dtype=np.float32).reshape(-1)
+            stages[uncertain] = 1
+        return np.stack([scores, stages], axis=1)
+
+    def warmup(self, batch_sizes=(1,)):
+        """Warm up both stages."""
+        self.fast.warmup(batch_sizes)
+        self.full.warmup(batch_sizes)
+        return self
+
+
+def cascade_tradeoff(labels, fast_scores, full_scores, fast_seconds, full_seconds, thresholds):
+    """
+    Simulate the cascade at several confidence thresholds from scores of both models.
+
+    The fast model answers an image when its confidence (max(p, 1 - p)) is
+    at least the threshold, i.e. the band is (1 - threshold, threshold).
+    Compute counts model inference only; decoding is the same for every setting.
+
+    Args:
+        labels (numpy.ndarray): 0/1 labels
+        fast_scores (numpy.ndarray): Fast model output for every image
+        full_scores (numpy.ndarray): Full model output for every image
+        fast_seconds (float): Fast model inference time per image
+        full_seconds (float): Full model inference time per image
+        thresholds (iterable): Confidence thresholds in [0.5, 1]
+
+    Returns:
+        list: One dict per threshold with the band, the share of images
+        answered by the fast model, cascade accuracy, and compute per image
+        relative to running the full model alone
+    """
+    labels = np.asarray(labels) == 1
+    fast_scores = np.asarray(fast_scores)
+    full_scores = np.asarray(full_scores)
+    rows = []
+    for threshold in thresholds:
+        low, high = 1.0 - threshold, threshold
+        answered = (fast_scores <= low) | (fast_scores >= high)
+        scores = np.where(answered, fast_scores, full_scores)
+        fast_share = float(answered.mean())
+        seconds = fast_seconds + (1.0 - fast_share) * full_seconds
+        rows.append({
+            'threshold': float(threshold),
+            'band': [low, high],
+            'fast_share': fast_share,
+            'accuracy': float(np.mean((scores > 0.5) == labels)),
+            'ms_per_image': 1000 * seconds,
+            'relative_compute': seconds / full_seconds if full_seconds > 0 else float('nan'),
+        })
+    return rows
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Evaluation Script
+
+Scores a trained model on a labelled set (one sub-directory per class, or a
+split of a dataset packed by pack_dataset.py) and reports accuracy,
+precision, recall, F1, ROC-AUC, the confusion matrix and images/sec.
+
+Images are decoded on a thread pool ahead of the model, so decoding and
+inference overlap. Every score is kept, and the metrics are computed once
+over the full score array. The threshold sweep therefore costs one sort,
+however many thresholds it covers. The dog class (label 1) is the positive
+class, matching the model's sigmoid output.
+
+With --cascade, a first-stage model from train_cascade.py is scored too, and
+a table shows accuracy and inference compute per image for the cascade at a
+range of confidence thresholds. Use it to choose CASCADE_LOW/CASCADE_HIGH.
+
+Usage: python evaluate.py <test_dir|packed_dir> [--model my_model.keras] [--threshold 0.5]
+"""
+
+import sys
+import os
+import argparse
+import contextlib
+import json
+import time
+
+import numpy as np
+
+from artifacts import resolve_model_path
+from cascade import cascade_tradeoff
+from metrics import Histogram
+from pack_dataset import PackedDataset
+from predict import iter_result_batches, list_labeled_images, load_model, model_input_spec
+
+# Thresholds listed in the printed sweep; the JSON report covers SWEEP_STEPS
+PRINTED_THRESHOLDS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+SWEEP_STEPS = 101
+
+# Confidence thresholds at which --cascade simulates the cascade
+CASCADE_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.97, 0.99, 0.995, 0.999)
+
+
+def score_images(model, image_paths, batch_size=32, workers=None):
+    """
+    Score image files with the model, decoding ahead of inference.
+
+    Returns:
+        tuple: (scores, failed, inference_seconds) - float32 sigmoid output
+        per image (NaN where it failed), a dict mapping failed image paths
+        to errors, and the time spent in the model
+    """
+    scores = np.full(len(image_paths), np.nan, dtype=np.float32)
+    failed = {}
+    index = 0
+    stages = Histogram('evaluate_stage_seconds', 'Time per pipeline stage', ('stage',))
+    for results in iter_result_batches(model, image_paths, batch_size, workers, stages=stages):
+        for result in results:
+            if 'error' in result:
+                failed[result['image_path']] = result['error']
+            else:
+                scores[index] = result['raw_prediction']
+            index += 1
+        print(f"\rScored {index}/{len(image_paths)} images", end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    inference = stages.summary().get(('inference',), {'sum': 0.0})
+    return scores, failed, inference['sum']
+
+
+def score_packed(model, split, batch_size=32):
+    """
+    Score a packed split with the model; shards are read ahead on a background thread.
+
+    Returns:
+        tuple: (scores, inference_seconds) - float32 sigmoid output per
+        row and the time spent in the model
+    """
+    image_size, input_dtype = model_input_spec(model)
+    if tuple(image_size) != tuple(split.image_size):
+        raise ValueError(f"Packed images are {split.image_size[0]}x{split.image_size[1]}, "
+                         f"the model takes {image_size[0]}x{image_size[1]}")
+    scores = np.empty(len(split), dtype=np.float32)
+    index = 0
+    inference_seconds = 0.0
+    for images, _ in split.iter_batches(batch_size, dtype=input_dtype):
+        start = time.perf_counter()
+        scores[index:index + len(images)] = np.asarray(model(images)).reshape(-1)
+        inference_seconds += time.perf_counter() - start
+        index += len(images)
+        print(f"\rScored {index}/{len(split)} images", end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return scores, inference_seconds
+
+
+def counts_at(labels, scores, thresholds):
+    """
+    Count true/false positives and negatives at many thresholds at once.
+
+    An image is predicted positive when its score is above the threshold,
+    as in predict.py.
+
+    Args:
+        labels (numpy.ndarray): 0/1 labels
+        scores (numpy.ndarray): Model scores
+        thresholds (numpy.ndarray): Thresholds to evaluate
+
+    Returns:
+        tuple: (tp, fp, fn, tn) arrays, one entry per threshold
+    """
+    positive = np.sort(scores[labels == 1])
+    negative = np.sort(scores[labels == 0])
+    thresholds = np.asarray(thresholds)
+    tp = len(positive) - np.searchsorted(positive, thresholds, side='right')
+    fp = len(negative) - np.searchsorted(negative, thresholds, side='right')
+    return tp, fp, len(positive) - tp, len(negative) - fp
+
+
+def _ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def rates(tp, fp, fn, tn):
+    """Return accuracy, precision, recall and F1 for count arrays (0 where undefined)."""
+    precision = _ratio(tp, tp + fp)
+    recall = _ratio(tp, tp + fn)
+    return {
+        'accuracy': _ratio(tp + tn, tp + fp + fn + tn),
+        'precision': precision,
+        'recall': recall,
+        'f1': _ratio(2 * precision * recall, precision + recall),
+    }
+
+
+def roc_auc(labels, scores):
+    """
+    Area under the ROC curve: the probability that a random positive
+    scores above a random negative (ties count half).
+
+    Returns:
+        float: ROC-AUC, or NaN if only one class is present
+    """
+    n_pos = int(np.sum(labels == 1))
+    n_neg = len(labels) - n_pos
+    if not n_pos or not n_neg:
+        return float('nan')
+    # Mann-Whitney U from average ranks, so tied scores share their rank
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    average_rank = np.cumsum(counts) - (counts - 1) / 2
+    rank_sum = average_rank[inverse][labels == 1].sum()
+    return float((rank_sum - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+def evaluate_scores(labels, scores, threshold=0.5, sweep_steps=SWEEP_STEPS):
+    """
+    Compute the evaluation metrics from the full score array.
+
+    Args:
+        labels (numpy.ndarray): 0/1 labels
+        scores (numpy.ndarray): Model scores for the same images
+        threshold (float): Decision threshold for the headline metrics
+        sweep_steps (int): Evenly spaced thresholds in [0, 1] for the sweep
+
+    Returns:
+        dict: Headline metrics and confusion matrix at ``threshold``,
+        ROC-AUC, the threshold sweep and the best thresholds by accuracy and F1
+    """
+    labels = np.asarray(labels).astype(np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    tp, fp, fn, tn = (int(count[0]) for count in counts_at(labels, scores, [threshold]))
+    report = {
+        'images': len(labels),
+        'threshold': threshold,
+        **{name: float(value) for name, value in rates(tp, fp, fn, tn).items()},
+        'roc_auc': roc_auc(labels, scores),
+        # Rows are true classes, columns predicted classes: [[tn, fp], [fn, tp]]
+        'confusion_matrix': [[tn, fp], [fn, tp]],
+    }
+
+    thresholds = np.linspace(0.0, 1.0, sweep_steps)
+    sweep = rates(*counts_at(labels, scores, thresholds))
+    report['sweep'] = [{'threshold': round(float(t), 6),
+                        **{name: float(values[i]) for name, values in sweep.items()}}
+                       for i, t in enumerate(thresholds)]
+    for name in ('accuracy', 'f1'):
+        best = int(np.argmax(sweep[name]))
+        report[f'best_{name}'] = {'threshold': round(float(thresholds[best]), 6),
+                                  'value': float(sweep[name][best])}
+    return report
+
+
+def print_report(report, class_names, stream=sys.stdout):
+    """Print the evaluation report as text."""
+    print(f"\nThreshold {report['threshold']:.2f}: accuracy {report['accuracy']:.4f}  "
+          f"precision {report['precision']:.4f}  recall {report['recall']:.4f}  "
+          f"F1 {report['f1']:.4f}", file=stream)
+    print(f"ROC-AUC: {report['roc_auc']:.4f}", file=stream)
+
+    width = max(len(name) for name in class_names) + 2
+    print("\nConfusion matrix (rows: true class, columns: predicted class):", file=stream)
+    print(' ' * width + ''.join(f'{name:>{width}}' for name in class_names), file=stream)
+    for name, row in zip(class_names, report['confusion_matrix']):
+        print(f'{name:<{width}}' + ''.join(f'{count:>{width}}' for count in row), file=stream)
+
+    print(f"\n{'threshold':>9} {'accuracy':>9} {'precision':>9} {'recall':>9} {'F1':>9}", file=stream)
+    by_threshold = {round(row['threshold'], 6): row for row in report['sweep']}
+    for threshold in PRINTED_THRESHOLDS:
+        row = by_threshold.get(round(threshold, 6))
+        if row is not None:
+            print(f"{threshold:>9.2f} {row['accuracy']:>9.4f} {row['precision']:>9.4f} "
+                  f"{row['recall']:>9.4f} {row['f1']:>9.4f}", file=stream)
+    print(f"\nBest accuracy {report['best_accuracy']['value']:.4f} at threshold "
+          f"{report['best_accuracy']['threshold']:.2f}; best F1 {report['best_f1']['value']:.4f} "
+          f"at threshold {report['best_f1']['threshold']:.2f}", file=stream)
+
+
+def print_cascade_report(cascade, stream=sys.stdout):
+    """Print the cascade accuracy vs. compute table and the suggested band."""
+    print(f"\nCascade with {cascade['model']} "
+          f"(inference per image: fast {cascade['fast_ms_per_image']:.2f} ms, "
+          f"full {cascade['full_ms_per_image']:.2f} ms)", file=stream)
+    print(f"Full model alone: accuracy {cascade['full_accuracy']:.4f}; "
+          f"fast model alone: accuracy {cascade['fast_accuracy']:.4f}", file=stream)
+    print(f"\n{'threshold':>9} {'band':>13} {'fast share':>10} {'accuracy':>9} "
+          f"{'ms/image':>9} {'compute':>8}", file=stream)
+    for row in cascade['tradeoff']:
+        band = f"{row['band'][0]:.3f}-{row['band'][1]:.3f}"
+        print(f"{row['threshold']:>9.3f} {band:>13} {row['fast_share']:>10.1%} "
+              f"{row['accuracy']:>9.4f} {row['ms_per_image']:>9.2f} "
+              f"{row['relative_compute']:>7.2f}x", file=stream)
+    suggested = cascade['suggested']
+    if suggested is None:
+        print(f"\nNo threshold keeps accuracy within {cascade['max_accuracy_drop']} of the full model",
+              file=stream)
+    else:
+        print(f"\nSuggested: CASCADE_LOW={suggested['band'][0]:g} CASCADE_HIGH={suggested['band'][1]:g} "
+              f"({suggested['fast_share']:.0%} answered by the fast model, "
+              f"{1 / suggested['relative_compute']:.1f}x less compute, "
+              f"accuracy {suggested['accuracy']:.4f})", file=stream)
+
+
+def main():
+    """Main function to handle command line arguments and evaluate the model."""
+    parser = argparse.ArgumentParser(
+        description='Evaluate the trained model on a labelled image set.'
+    )
+    parser.add_argument(
+        'data',
+        help='Test images, one sub-directory per class (e.g. test/cats, test/dogs), '
+             'or a dataset packed by pack_dataset.py'
+    )
+    parser.add_argument(
+        '--model',
+        default=None,
+        help='Path to the trained model file (default: $MODEL_PATH, else my_model.keras)'
+    )
+    parser.add_argument('--split', default='test',
+                        help="Split of a packed dataset to evaluate (default: test)")
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Number of images per forward pass (default: 32)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of image decoding threads (default: number of CPUs)')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Decision threshold for the headline metrics (default: 0.5)')
+    parser.add_argument('--cascade', default=None, metavar='FAST_MODEL',
+                        help='First-stage model from train_cascade.py; also report the '
+                             'cascade accuracy vs. compute trade-off')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.005,
+                        help='Accuracy the cascade may lose against the full model when '
+                             'suggesting a band (default: 0.005)')
+    parser.add_argument('--output', default=None,
+                        help='Write the full report (including the threshold sweep and '
+                             'misclassified images) as JSON to this file')
+
+    args = parser.parse_args()
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    args.model = resolve_model_path(args.model, default='my_model.keras')
+    if not os.path.exists(args.model):
+        print(f"Error: Model file '{args.model}' not found.")
+        sys.exit(1)
+    if not os.path.isdir(args.data):
+        print(f"Error: Data directory '{args.data}' not found.")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        model = load_model(args.model)
+    load_seconds = time.perf_counter() - started
+
+    split = None
+    if PackedDataset.is_packed(args.data):
+        try:
+            split = PackedDataset(args.data).split(args.split)
+        except (KeyError, ValueError) as e:
+            print(f"Error: {e.args[0]}")
+            sys.exit(1)
+        labels, class_names, sources = split.labels, split.class_names, split.sources()
+        print(f"Evaluating {len(split)} packed images ({args.data}, split '{args.split}')",
+              file=sys.stderr)
+    else:
+        sources, labels, class_names = list_labeled_images(args.data)
+        print(f"Evaluating {len(sources)} images in classes {class_names}", file=sys.stderr)
+    if len(class_names) != 2:
+        print(f"Error: Expected 2 classes, found {len(class_names)}: {class_names}")
+        sys.exit(1)
+
+    def score(model):
+        if split is None:
+            return score_images(model, sources, args.batch_size, args.workers)
+        try:
+            packed_scores, seconds = score_packed(model, split, args.batch_size)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        return packed_scores, {}, seconds
+
+    start = time.perf_counter()
+    scores, failed, inference_seconds = score(model)
+    elapsed = time.perf_counter() - start
+
+    ok = ~np.isnan(scores)
+    if not ok.any():
+        print("Error: No images could be scored.")
+        sys.exit(1)
+
+    report = evaluate_scores(labels[ok], scores[ok], args.threshold)
+    report.update({
+        'model': args.model,
+        'data': args.data,
+        'class_names': class_names,
+        'failed': len(failed),
+        'seconds': elapsed,
+        'images_per_second': len(scores) / elapsed if elapsed > 0 else 0.0,
+        'model_load_seconds': load_seconds,
+    })
+
+    print(f"\nEvaluated {report['images']} images in {elapsed:.2f}s "
+          f"({report['images_per_second']:.1f} images/s, model load {load_seconds:.2f}s)")
+    if failed:
+        print(f"{len(failed)} image(s) could not be processed and were left out")
+    print_report(report, class_names)
+
+    if args.cascade:
+        with contextlib.redirect_stdout(sys.stderr):
+            fast = load_model(args.cascade)
+        if tuple(model_input_spec(fast)[0]) != tuple(model_input_spec(model)[0]):
+            print(f"Error: {args.cascade} and {args.model} take different image sizes")
+            sys.exit(1)
+        print(f"\nScoring the first-stage model {args.cascade}", file=sys.stderr)
+        fast_scores, _, fast_seconds = score(fast)
+        both = ok & ~np.isnan(fast_scores)
+        fast_per_image = fast_seconds / max(np.count_nonzero(~np.isnan(fast_scores)), 1)
+        full_per_image = inference_seconds / max(np.count_nonzero(ok), 1)
+        y = labels[both] == 1
+        tradeoff = cascade_tradeoff(labels[both], fast_scores[both], scores[both],
+                                    fast_per_image, full_per_image, CASCADE_THRESHOLDS)
+        full_accuracy = float(np.mean((scores[both] > 0.5) == y))
+        # Thresholds rise, so the first one within the accuracy budget sends the most to the fast model
+        suggested = next((row for row in tradeoff
+                          if row['accuracy'] >= full_accuracy - args.max_accuracy_drop), None)
+        report['cascade'] = {
+            'model': args.cascade,
+            'images': int(both.sum()),
+            'fast_ms_per_image': 1000 * fast_per_image,
+            'full_ms_per_image': 1000 * full_per_image,
+            'fast_accuracy': float(np.mean((fast_scores[both] > 0.5) == y)),
+            'full_accuracy': full_accuracy,
+            'max_accuracy_drop': args.max_accuracy_drop,
+            'tradeoff': tradeoff,
+            'suggested': suggested,
+        }
+        print_cascade_report(report['cascade'])
+
+    if args.output:
+        predicted = scores > args.threshold
+        wrong = np.flatnonzero(ok & (predicted != (labels == 1)))
+        report['misclassified'] = [{'image_path': sources[i], 'label': class_names[int(labels[i])],
+                                    'raw_prediction': float(scores[i])} for i in wrong]
+        report['errors'] = failed
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,33 +6,40 @@ This script demonstrates how to use the prediction functions programmatically.
 """
 
 import os
-from predict import load_model, predict_image
+from predict import load_model, predict_batches
 
 
-def predict_batch(image_paths, model_path='my_model.keras'):
+def predict_batch(image_paths, model_path='my_model.keras', batch_size=32):
     """
     Predict multiple images at once.
     
+    Results are yielded as each batch finishes instead of being collected
+    in a list, so memory stays flat for very large inputs.
+    
     Args:
-        image_paths (list): List of paths to image files
+        image_paths (iterable): Paths to image files
         model_path (str): Path to the trained model file
+        batch_size (int): Number of images per forward pass
     
-    Returns:
-        list: List of prediction results
+    Yields:
+        dict: Prediction result per image
     """
     # Load model once
     model = load_model(model_path)
     
-    results = []
-    for image_path in image_paths:
-        if os.path.exists(image_path):
-            result = predict_image(model, image_path)
-            if result:
-                results.append(result)
-        else:
-            print(f"Warning: Image not found: {image_path}")
+    def existing_paths():
+        for image_path in image_paths:
+            if os.path.exists(image_path):
+                yield image_path
+            else:
+                print(f"Warning: Image not found: {image_path}")
     
-    return results
+    # Decode on a thread pool and run one forward pass per batch
+    for result in predict_batches(model, existing_paths(), batch_size=batch_size):
+        if 'error' in result:
+            print(f"Warning: Failed to process {result['image_path']}: {result['error']}")
+            continue
+        yield result
 
 
 def example_usage():
@@ -63,11 +70,8 @@ def example_usage():
         print("2. Use the command line: python predict.py your_image.jpg")
         return
     
-    # Make predictions
-    results = predict_batch(existing_images)
-    
-    # Display results
-    for result in results:
+    # Make predictions, displaying results as they arrive
+    for result in predict_batch(existing_images):
         print(f"Image: {result['image_path']}")
         print(f"Prediction: {result['predicted_class']}")
         print(f"Confidence: {result['confidence']:.2%}")
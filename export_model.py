@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Model Export
+
+Folds the /255 input scaling (and optionally the resize) into the model
+graph, so the exported model takes raw uint8 pixels. predict.py, the backend
+and the feature tools detect the uint8 input and skip host-side float
+conversion. Batches are 4x smaller in memory, and the training and serving
+paths can no longer disagree about normalization.
+
+Usage: python export_model.py [--model my_model.keras] [--output my_model_uint8.keras]
+"""
+
+import sys
+import os
+import argparse
+
+import numpy as np
+import tensorflow as tf
+
+from preprocessing import IMAGE_SIZE, normalize
+
+
+def parse_size(value):
+    """Parse a WIDTHxHEIGHT string such as 256x256."""
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, got '{value}'")
+    return width, height
+
+
+def add_input_preprocessing(model, input_size=None):
+    """
+    Wrap a trained classifier so it takes raw uint8 pixels.
+
+    Args:
+        model: Sequential Keras classifier taking float32 images in [0, 1]
+        input_size (tuple): Optional (width, height) of the images the
+            exported model accepts; they are resized in-graph to the
+            classifier's input size
+
+    Returns:
+        Keras model: Sequential model with uint8 input, Rescaling (and
+        Resizing) layers followed by the original layers
+    """
+    if not isinstance(model, tf.keras.Sequential):
+        raise ValueError("Only Sequential models (as built in the notebook) can be exported")
+
+    height, width = model.input_shape[1:3]
+    in_width, in_height = input_size or (width, height)
+
+    layers = [tf.keras.Input(shape=(in_height, in_width, 3), dtype='uint8', name='image')]
+    if (in_width, in_height) != (width, height):
+        layers.append(tf.keras.layers.Resizing(height, width, name='resize'))
+    layers.append(tf.keras.layers.Rescaling(1.0 / 255, name='rescale'))
+
+    return tf.keras.Sequential(layers + model.layers, name=f'{model.name}_uint8')
+
+
+def check_equivalence(model, exported, samples=8, seed=0):
+    """Return the largest prediction difference between the two models on random images."""
+    height, width = model.input_shape[1:3]
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(samples, height, width, 3), dtype=np.uint8)
+    reference = model(normalize(pixels), training=False).numpy()
+    if exported.input_shape[1:3] != (height, width):
+        # Resizing is not a no-op here; only compare same-size exports
+        return None
+    return float(np.max(np.abs(exported(pixels, training=False).numpy() - reference)))
+
+
+def main():
+    """Main function to handle command line arguments and export the model."""
+    parser = argparse.ArgumentParser(
+        description='Export the trained model with input scaling folded into its graph.'
+    )
+    parser.add_argument(
+        '--model',
+        default='my_model.keras',
+        help='Trained model to export (default: my_model.keras)'
+    )
+    parser.add_argument(
+        '--output',
+        default='my_model_uint8.keras',
+        help='Where to save the exported model (default: my_model_uint8.keras)'
+    )
+    parser.add_argument(
+        '--input-size',
+        type=parse_size,
+        default=None,
+        help='Accept uint8 images of this WIDTHxHEIGHT and resize them in-graph '
+             f'(default: the model input size, {IMAGE_SIZE[0]}x{IMAGE_SIZE[1]})'
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Error: Model file '{args.model}' not found.")
+        sys.exit(1)
+
+    model = tf.keras.models.load_model(args.model)
+    exported = add_input_preprocessing(model, args.input_size)
+
+    difference = check_equivalence(model, exported)
+    if difference is not None:
+        print(f"Max prediction difference vs. host-side normalization: {difference:.2e}")
+
+    exported.save(args.output)
+    print(f"Exported model taking uint8 input of shape {exported.input_shape} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Backbone embedding cache for the cats and dogs classifier.
+
+The classifier is a frozen Xception backbone (pooling='max', 2048-d output)
+followed by a small Dense head. The backbone is nearly all of the compute and
+its output for an image never changes while only the head is retrained, so
+embeddings are stored once in a memory-mapped float32 array indexed by a hash
+of the image file. Re-scoring with a new head then only runs the Dense layers.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+
+import numpy as np
+import tensorflow as tf
+
+from inference import CompiledModel
+from preprocessing import to_model_input
+
+# Size of the pooled Xception embedding
+FEATURE_DIM = 2048
+
+
+def file_key(image_path):
+    """Return the feature-store key for an image file (hash of its bytes)."""
+    with open(image_path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _attempt(fn, *args):
+    """Call ``fn``, returning (value, None) or (None, error message)."""
+    try:
+        return fn(*args), None
+    except Exception as e:
+        return None, str(e)
+
+
+def split_model(model):
+    """
+    Split the classifier into its frozen backbone and its Dense head.
+
+    Args:
+        model: Sequential Keras model built like the notebook: the backbone
+            network (optionally preceded by in-graph preprocessing layers,
+            see export_model.py), then Flatten and Dense layers
+
+    Returns:
+        tuple: (backbone, head) Keras models sharing weights with ``model``
+    """
+    layers = model.layers
+    index = next((i for i, layer in enumerate(layers) if isinstance(layer, tf.keras.Model)), None)
+    if index is None:
+        raise ValueError("Expected the model to contain a backbone network")
+    if index == 0:
+        backbone = layers[0]
+    else:
+        # Keep in-graph preprocessing (e.g. Rescaling) in front of the backbone
+        model_input = model.inputs[0]
+        backbone = tf.keras.Sequential(
+            [tf.keras.Input(shape=model_input.shape[1:], dtype=model_input.dtype)]
+            + layers[:index + 1],
+            name='backbone'
+        )
+    feature_dim = layers[index].output.shape[-1]
+    head = tf.keras.Sequential(
+        [tf.keras.Input(shape=(feature_dim,))] + layers[index + 1:],
+        name='head'
+    )
+    return backbone, head
+
+
+def backbone_fingerprint(backbone):
+    """Hash the backbone weights, so stored features are never mixed across backbones."""
+    digest = hashlib.blake2b(digest_size=16)
+    for weight in backbone.weights:
+        digest.update(np.ascontiguousarray(weight.numpy()).tobytes())
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    """Memory-mapped store of backbone embeddings, indexed by image hash."""
+
+    def __init__(self, directory, feature_dim=FEATURE_DIM, fingerprint=None,
+                 initial_capacity=1024):
+        """
+        Args:
+            directory (str): Directory holding the store (created if missing)
+            feature_dim (int): Length of each embedding
+            fingerprint (str): Backbone fingerprint; a store built with a
+                different backbone is rejected
+            initial_capacity (int): Rows allocated when the store is created
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.features_path = os.path.join(directory, 'features.f32')
+        meta_path = os.path.join(directory, 'meta.json')
+
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['feature_dim'] != feature_dim:
+                raise ValueError(f"Feature store {directory} holds {meta['feature_dim']}-d features, "
+                                 f"expected {feature_dim}")
+            if fingerprint and meta.get('fingerprint') not in (None, fingerprint):
+                raise ValueError(f"Feature store {directory} was built with a different backbone")
+        else:
+            meta = {'feature_dim': feature_dim, 'fingerprint': fingerprint}
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+        self.feature_dim = feature_dim
+
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS features (key TEXT PRIMARY KEY, row INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+
+        if not os.path.exists(self.features_path):
+            self._resize(max(initial_capacity, 1))
+        else:
+            capacity = os.path.getsize(self.features_path) // (4 * feature_dim)
+            self._open(capacity)
+
+    def _open(self, capacity):
+        self.capacity = capacity
+        self.features = np.memmap(self.features_path, dtype=np.float32, mode='r+',
+                                  shape=(capacity, self.feature_dim))
+
+    def _resize(self, capacity):
+        if getattr(self, 'features', None) is not None:
+            self.features.flush()
+            del self.features
+        with open(self.features_path, 'ab') as f:
+            f.truncate(capacity * self.feature_dim * 4)
+        self._open(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.features.flush()
+        self.conn.close()
+
+    def lookup(self, keys):
+        """
+        Find the stored rows for ``keys``.
+
+        Returns:
+            list: Row index per key, or None where the key is not stored
+        """
+        rows = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows.update(self.conn.execute(
+                f"SELECT key, row FROM features WHERE key IN ({placeholders})", chunk
+            ))
+        return [rows.get(key) for key in keys]
+
+    def get(self, keys):
+        """
+        Read the embeddings for ``keys``.
+
+        Returns:
+            tuple: (features, missing) where ``features`` is a (N, D) array
+            with zero rows for missing keys and ``missing`` lists their indices
+        """
+        rows = self.lookup(keys)
+        features = np.zeros((len(rows), self.feature_dim), dtype=np.float32)
+        missing = [i for i, row in enumerate(rows) if row is None]
+        present = [i for i, row in enumerate(rows) if row is not None]
+        if present:
+            features[present] = self.features[[rows[i] for i in present]]
+        return features, missing
+
+    def put(self, keys, features):
+        """Append embeddings for new keys; keys already stored are left as they are."""
+        existing = self.lookup(keys)
+        new = [(key, feature) for key, feature, row in zip(keys, features, existing)
+               if row is None]
+        # The same image may appear twice in one batch
+        new = list({key: feature for key, feature in new}.items())
+        if not new:
+            return
+        needed = self.count + len(new)
+        if needed > self.capacity:
+            self._resize(max(needed, 2 * self.capacity))
+        start = self.count
+        self.features[start:start + len(new)] = np.stack([feature for _, feature in new])
+        self.features.flush()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO features VALUES (?, ?)",
+                [(key, start + i) for i, (key, _) in enumerate(new)]
+            )
+        self.count = needed
+
+    def all_features(self):
+        """Return a read-only view of every stored embedding, in insertion order."""
+        return self.features[:self.count]
+
+
+class EmbeddingClassifier:
+    """Classifier split into a compiled backbone and head, with cached embeddings."""
+
+    def __init__(self, model, store_directory):
+        """
+        Args:
+            model: Loaded Keras classifier
+            store_directory (str): Directory of the FeatureStore to use
+        """
+        backbone, head = split_model(model)
+        feature_dim = head.input_shape[-1]
+        self.backbone = CompiledModel(backbone)
+        self.head = CompiledModel(head, input_shape=(None, feature_dim))
+        self.store = FeatureStore(store_directory, feature_dim,
+                                  fingerprint=backbone_fingerprint(backbone))
+
+    @property
+    def image_size(self):
+        """Input image size of the backbone as (width, height)."""
+        return self.backbone.image_size
+
+    def embed(self, images):
+        """Run the backbone on a (N, 128, 128, 3) batch, returning (N, D) embeddings."""
+        return self.backbone(images)
+
+    def extract(self, image_paths, decode, pool):
+        """
+        Return embeddings for a batch of images, computing only the missing ones.
+        
+        Args:
+            image_paths (list): Paths to the image files
+            decode: Callable turning a path into a uint8 (H, W, 3) array
+            pool: Executor used to hash and decode images in parallel
+        
+        Returns:
+            tuple: (features, errors, keys) where ``features`` is a (N, D)
+            float32 array, ``errors`` maps the index of each failed image to
+            its error message and ``keys`` holds each image's store key
+        """
+        errors = {}
+        all_keys, keys, valid = [], [], []
+        for i, (key, error) in enumerate(pool.map(_attempt, itertools.repeat(file_key),
+                                                  image_paths)):
+            all_keys.append(key)
+            if error is not None:
+                errors[i] = error
+            else:
+                keys.append(key)
+                valid.append(i)
+        
+        stored, missing = self.store.get(keys)
+        features = np.zeros((len(image_paths), self.store.feature_dim), dtype=np.float32)
+        features[valid] = stored
+        
+        # Only images without a stored embedding are decoded and run through the backbone
+        if missing:
+            decoded = list(pool.map(_attempt, itertools.repeat(decode),
+                                    [image_paths[valid[j]] for j in missing]))
+            embedded = []
+            for j, (image, error) in zip(missing, decoded):
+                if error is not None:
+                    errors[valid[j]] = error
+                else:
+                    embedded.append(j)
+            if embedded:
+                images = np.stack([image for image, error in decoded if error is None])
+                images = to_model_input(images, self.backbone.input_dtype)
+                rows = [valid[j] for j in embedded]
+                try:
+                    features[rows] = self.embed(images)
+                    self.store.put([keys[j] for j in embedded], features[rows])
+                except Exception as e:
+                    errors.update((row, str(e)) for row in rows)
+        
+        return features, errors, all_keys
+
+    def score(self, features):
+        """Run only the Dense head on (N, D) embeddings, returning (N, 1) predictions."""
+        return self.head(features)
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,198 @@
+"""
+Compiled inference wrapper shared by the prediction CLI and the Flask backend.
+
+``model.predict`` builds a data adapter and runs the callback machinery on
+every call, which costs milliseconds per single image. ``compile_model``
+traces the model once into a ``tf.function`` with a fixed input signature
+and warms it up, so the first real request does not pay tracing latency.
+
+``TFLiteModel`` offers the same interface for TensorFlow Lite artifacts such
+as the quantized models written by quantize_model.py, and ``load_predictor``
+picks the right one from the file extension.
+
+TensorFlow is only imported when a Keras model is loaded. TensorFlow Lite
+models run on the standalone LiteRT interpreter (``ai-edge-litert``, or the
+older ``tflite-runtime``) when one is installed, which starts in a fraction
+of the time and memory of a full TensorFlow import.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from preprocessing import IMAGE_SIZE
+
+# Input expected by the classifier (batch, height, width, channels)
+INPUT_SHAPE = (None, IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+
+
+class CompiledModel:
+    """Traced, warmed-up inference function around a Keras model."""
+
+    def __init__(self, model, input_shape=None, input_dtype=None):
+        """
+        Args:
+            model: Loaded Keras model
+            input_shape (tuple): Input signature, batch dimension first
+                (default: the model's own input shape, else 128x128x3)
+            input_dtype: Dtype of the input batch (default: the model's own
+                input dtype, e.g. uint8 for models exported with in-graph
+                rescaling, else float32)
+        """
+        import tensorflow as tf
+
+        self.model = model
+        model_input = model.inputs[0] if getattr(model, 'inputs', None) else None
+        if input_shape is None:
+            input_shape = tuple(model_input.shape) if model_input is not None else INPUT_SHAPE
+        if input_dtype is None:
+            input_dtype = model_input.dtype if model_input is not None else 'float32'
+        self.input_shape = (None,) + tuple(input_shape)[1:]
+        self.input_dtype = np.dtype(tf.as_dtype(input_dtype).as_numpy_dtype)
+        self._fn = tf.function(
+            self._forward,
+            input_signature=[tf.TensorSpec(self.input_shape, self.input_dtype)],
+        )
+
+    @property
+    def image_size(self):
+        """Input image size as (width, height)."""
+        return (self.input_shape[2], self.input_shape[1])
+
+    def _forward(self, images):
+        return self.model(images, training=False)
+
+    def __call__(self, images):
+        """
+        Run the model on a batch of preprocessed images.
+
+        Args:
+            images (numpy.ndarray): Batch of shape (N, 128, 128, 3), float32
+                in [0, 1] or raw uint8 depending on ``input_dtype``
+
+        Returns:
+            numpy.ndarray: Predictions of shape (N, 1)
+        """
+        return self._fn(np.asarray(images, dtype=self.input_dtype)).numpy()
+
+    def warmup(self, batch_sizes=(1,)):
+        """Trace the graph and run dummy batches so kernels are initialised."""
+        for batch_size in batch_sizes:
+            dummy = np.zeros((batch_size,) + self.input_shape[1:], dtype=self.input_dtype)
+            self(dummy)
+        return self
+
+
+def compile_model(model, warmup_batch_sizes=(1,)):
+    """
+    Build a compiled, warmed-up inference function for a Keras model.
+
+    Args:
+        model: Loaded Keras model
+        warmup_batch_sizes (tuple): Batch sizes to run once before returning
+
+    Returns:
+        CompiledModel: Callable taking a (N, 128, 128, 3) batch
+    """
+    return CompiledModel(model).warmup(warmup_batch_sizes)
+
+
+def _interpreter_api():
+    """Return the lightest TensorFlow Lite interpreter available and its op resolver types."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter, OpResolverType
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter, OpResolverType
+        except ImportError:
+            import tensorflow as tf
+            Interpreter, OpResolverType = tf.lite.Interpreter, tf.lite.experimental.OpResolverType
+    return Interpreter, OpResolverType
+
+
+class TFLiteModel:
+    """Inference function around a TensorFlow Lite model (e.g. a quantized export)."""
+
+    def __init__(self, model_path, num_threads=None, default_delegates=True):
+        """
+        Args:
+            model_path (str): Path to the .tflite file
+            num_threads (int): Interpreter threads (default: number of CPUs)
+            default_delegates (bool): Apply the runtime's default delegates
+                (XNNPACK). XNNPACK is faster, but repacks float weights into
+                private memory, so processes loading the same file no longer
+                share them; disable it to keep the weights memory-mapped
+        """
+        self.model_path = model_path
+        Interpreter, OpResolverType = _interpreter_api()
+        options = {}
+        if not default_delegates:
+            options['experimental_op_resolver_type'] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        # Loading from a path (not from bytes) memory-maps the file, so without
+        # XNNPACK the weights are shared through the page cache by every
+        # process that loads the same model
+        self.interpreter = Interpreter(
+            model_path=model_path, num_threads=num_threads or os.cpu_count(), **options
+        )
+        input_details = self.interpreter.get_input_details()[0]
+        self._input_index = input_details['index']
+        self._output_index = self.interpreter.get_output_details()[0]['index']
+        self.input_shape = (None,) + tuple(int(d) for d in input_details['shape_signature'][1:])
+        self.input_dtype = np.dtype(input_details['dtype'])
+        self._batch_size = None
+        # The interpreter holds its tensors in place, so calls must not overlap
+        self._lock = threading.Lock()
+
+    @property
+    def image_size(self):
+        """Input image size as (width, height)."""
+        return (self.input_shape[2], self.input_shape[1])
+
+    def __call__(self, images):
+        """
+        Run the model on a batch of preprocessed images.
+
+        Args:
+            images (numpy.ndarray): Batch of shape (N, 128, 128, 3)
+
+        Returns:
+            numpy.ndarray: Predictions of shape (N, 1)
+        """
+        images = np.asarray(images, dtype=self.input_dtype)
+        with self._lock:
+            # Reallocate only when the batch size changes
+            if images.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input_index, images.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = images.shape[0]
+            self.interpreter.set_tensor(self._input_index, images)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output_index).copy()
+
+    def warmup(self, batch_sizes=(1,)):
+        """Allocate tensors and run dummy batches so kernels are initialised."""
+        for batch_size in batch_sizes:
+            dummy = np.zeros((batch_size,) + self.input_shape[1:], dtype=self.input_dtype)
+            self(dummy)
+        return self
+
+
+def load_predictor(model_path, warmup_batch_sizes=(1,), num_threads=None, default_delegates=True):
+    """
+    Load a saved model as a warmed-up inference function.
+
+    Args:
+        model_path (str): A Keras model (.keras) or a TensorFlow Lite model (.tflite)
+        warmup_batch_sizes (tuple): Batch sizes to run once before returning
+        num_threads (int): TensorFlow Lite interpreter threads (default: number of CPUs)
+        default_delegates (bool): Apply the TensorFlow Lite runtime's default
+            delegates (see TFLiteModel)
+
+    Returns:
+        CompiledModel or TFLiteModel: Callable taking a (N, 128, 128, 3) batch
+    """
+    if model_path.endswith('.tflite'):
+        return TFLiteModel(model_path, num_threads, default_delegates).warmup(warmup_batch_sizes)
+    import tensorflow as tf
+    return compile_model(tf.keras.models.load_model(model_path), warmup_batch_sizes)
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Load Generator
+
+Drives /predict, /predict_base64 and /health with asyncio to see how the
+API behaves at and past saturation.
+
+Modes:
+    closed  --concurrency N: N clients, each sending its next request as
+            soon as the previous one is answered
+    open    --rps R: requests start at a target rate (Poisson arrivals)
+            whether or not earlier ones finished. Latency is measured from
+            the scheduled start, so a backed-up server is not hidden by a
+            client that slows down with it
+
+Each comma-separated level (e.g. --rps 10,20,40) runs for --duration
+seconds, so the output shows where latency bends. Every --interval seconds a
+line reports throughput, latency percentiles, error rate, requests in flight
+and, when /health provides it, the server's resident memory.
+
+Uploads are synthetic JPEGs whose sizes follow a phone/web photo mix, or
+real files from --images. The client is stdlib only. Validate the tool
+against backend/simple_server.py or backend/mock_app.py (with MOCK_DELAY=0.05)
+before pointing it at the real backend.
+
+Usage: python loadgen.py --url http://127.0.0.1:5000 [--concurrency 1,8,32 | --rps 10,50,100] [--duration 30]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import base64
+import io
+import json
+import time
+import urllib.parse
+
+import numpy as np
+
+from benchmark import synthetic_image
+from predict import iter_image_paths
+
+# Upload sizes seen from phones, cameras and web pages: (width, height), share
+SIZE_DISTRIBUTION = (
+    ((4032, 3024), 0.15),
+    ((3024, 4032), 0.05),
+    ((1920, 1080), 0.25),
+    ((1280, 960), 0.25),
+    ((800, 600), 0.20),
+    ((640, 480), 0.10),
+)
+
+DEFAULT_MIX = 'predict=8,predict_base64=1,health=1'
+ENDPOINTS = ('predict', 'predict_base64', 'health')
+
+
+def parse_mix(value):
+    """Parse endpoint weights such as predict=8,predict_base64=1,health=1."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad weight in '{item}'")
+    return mix
+
+
+def parse_levels(convert):
+    """Build an argparse type for a comma-separated list of load levels."""
+    def parse(value):
+        try:
+            return [convert(item) for item in value.split(',') if item]
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Expected a comma-separated list of numbers, got '{value}'")
+    return parse
+
+
+def synthetic_uploads(count, seed=0):
+    """Generate JPEG uploads whose sizes follow SIZE_DISTRIBUTION."""
+    rng = np.random.default_rng(seed)
+    sizes = [size for size, _ in SIZE_DISTRIBUTION]
+    weights = np.array([share for _, share in SIZE_DISTRIBUTION])
+    uploads = []
+    for index in range(count):
+        size = sizes[rng.choice(len(sizes), p=weights / weights.sum())]
+        buffer = io.BytesIO()
+        synthetic_image(rng, size).save(buffer, format='JPEG', quality=85)
+        uploads.append((f'upload_{index}.jpg', buffer.getvalue()))
+    return uploads
+
+
+def file_uploads(inputs, limit):
+    """Read up to ``limit`` real image files to upload."""
+    uploads = []
+    for path in iter_image_paths(inputs):
+        with open(path, 'rb') as f:
+            uploads.append((os.path.basename(path), f.read()))
+        if len(uploads) >= limit:
+            break
+    return uploads
+
+
+def build_request(endpoint, upload):
+    """Encode one request as (method, path, headers, body)."""
+    if endpoint == 'health':
+        return 'GET', '/health', {}, b''
+    name, data = upload
+    if endpoint == 'predict':
+        boundary = 'loadgen-boundary-3c9a'
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="image"; '
+                f'filename="{name}"\r\nContent-Type: image/jpeg\r\n\r\n').encode()
+        body += data + f'\r\n--{boundary}--\r\n'.encode()
+        return 'POST', '/predict', {'Content-Type': f'multipart/form-data; boundary={boundary}'}, body
+    encoded = base64.b64encode(data).decode('ascii')
+    body = json.dumps({'image': f'data:image/jpeg;base64,{encoded}'}).encode()
+    return 'POST', '/predict_base64', {'Content-Type': 'application/json'}, body
+
+
+class Connection:
+    """Minimal HTTP/1.1 client connection on asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def request(self, method, path, headers, body):
+        """
+        Send a request and read the whole response.
+
+        Returns:
+            tuple: (status code, response body, whether the connection can be reused)
+        """
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                f'Content-Length: {len(body)}']
+        head += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        version, status = status_line.split()[:2]
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        reusable = (version == b'HTTP/1.1'
+                    and response_headers.get('connection', '').lower() != 'close')
+        if 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        else:
+            # No length: the body ends when the server closes the connection
+            data = await self.reader.read()
+            reusable = False
+        return int(status), data, reusable
+
+
+class LoadGenerator:
+    """Sends the request mix against one server and records every outcome."""
+
+    def __init__(self, url, uploads, mix, timeout=30.0, seed=0):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.uploads = uploads
+        self.endpoints = list(mix)
+        weights = np.array([mix[name] for name in self.endpoints], dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.timeout = timeout
+        self.rng = np.random.default_rng(seed)
+        self._idle = []
+        self.in_flight = 0
+        # (finish time, endpoint, latency in seconds, outcome)
+        self.records = []
+
+    def _next_request(self):
+        endpoint = self.endpoints[self.rng.choice(len(self.endpoints), p=self.weights)]
+        upload = self.uploads[self.rng.integers(len(self.uploads))] if self.uploads else None
+        return endpoint, build_request(endpoint, upload)
+
+    async def _acquire(self):
+        if self._idle:
+            return self._idle.pop()
+        return await Connection(self.host, self.port).open()
+
+    async def send_one(self, scheduled=None):
+        """
+        Send one request from the mix and record its outcome.
+
+        Args:
+            scheduled (float): Loop time the request was due to start (open
+                loop); latency is counted from then. Defaults to now.
+        """
+        loop = asyncio.get_running_loop()
+        start = scheduled if scheduled is not None else loop.time()
+        endpoint, (method, path, headers, body) = self._next_request()
+        self.in_flight += 1
+        connection = None
+        try:
+            connection = await asyncio.wait_for(self._acquire(), self.timeout)
+            status, _, reusable = await asyncio.wait_for(
+                connection.request(method, path, headers, body), self.timeout
+            )
+            outcome = 'ok' if 200 <= status < 300 else f'http_{status}'
+            if reusable:
+                self._idle.append(connection)
+            else:
+                connection.close()
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            if connection is not None:
+                connection.close()
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            outcome = 'connection_error'
+            if connection is not None:
+                connection.close()
+        finally:
+            self.in_flight -= 1
+        finish = loop.time()
+        self.records.append((finish, endpoint, finish - start, outcome))
+
+    def record_dropped(self):
+        """Record an open-loop request that was not sent because too many were in flight."""
+        self.records.append((asyncio.get_running_loop().time(), 'dropped', 0.0, 'dropped'))
+
+    def close(self):
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+
+async def run_closed_loop(generator, concurrency, duration):
+    """Keep ``concurrency`` requests outstanding for ``duration`` seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def client():
+        while loop.time() < deadline:
+            await generator.send_one()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+async def run_open_loop(generator, rps, duration, max_in_flight, poisson=True):
+    """Start requests at ``rps`` per second for ``duration`` seconds, regardless of responses."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    scheduled = start
+    tasks = set()
+    while True:
+        scheduled += generator.rng.exponential(1.0 / rps) if poisson else 1.0 / rps
+        if scheduled >= start + duration:
+            break
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if generator.in_flight >= max_in_flight:
+            generator.record_dropped()
+            continue
+        task = loop.create_task(generator.send_one(scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def server_memory(host, port, timeout=5.0):
+    """Return the server's resident memory in MB from /health, or None if it does not report it."""
+    connection = None
+    try:
+        connection = await asyncio.wait_for(Connection(host, port).open(), timeout)
+        _, body, _ = await asyncio.wait_for(connection.request('GET', '/health', {}, b''), timeout)
+        return json.loads(body).get('memory', {}).get('rss_mb')
+    except (OSError, ConnectionError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return None
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+def summarize(records, elapsed):
+    """
+    Summarize a list of (finish, endpoint, latency, outcome) records.
+
+    Returns:
+        dict: Request count, throughput, error rate, outcome counts and
+        latency percentiles in milliseconds (of all answered requests)
+    """
+    sent = [record for record in records if record[3] != 'dropped']
+    outcomes = {}
+    for record in records:
+        outcomes[record[3]] = outcomes.get(record[3], 0) + 1
+    ok = outcomes.get('ok', 0)
+    summary = {
+        'requests': len(sent),
+        'throughput_rps': round(ok / elapsed, 2) if elapsed > 0 else 0.0,
+        'error_rate': round(1 - ok / len(records), 4) if records else 0.0,
+        'outcomes': outcomes,
+    }
+    answered = np.array([record[2] for record in sent if record[3] not in ('timeout', 'connection_error')])
+    if answered.size:
+        p50, p95, p99 = np.percentile(answered * 1000, [50, 95, 99])
+        summary['latency_ms'] = {'p50': round(float(p50), 2), 'p95': round(float(p95), 2),
+                                 'p99': round(float(p99), 2),
+                                 'max': round(float(answered.max() * 1000), 2)}
+    return summary
+
+
+def format_line(label, summary, in_flight=None, rss_mb=None):
+    latency = summary.get('latency_ms', {})
+    line = (f"{label:>10} {summary['throughput_rps']:>8.1f} {latency.get('p50', 0):>9.1f} "
+            f"{latency.get('p95', 0):>9.1f} {latency.get('p99', 0):>9.1f} {summary['error_rate']:>7.1%}")
+    if in_flight is not None:
+        line += f" {in_flight:>9}"
+    if rss_mb is not None:
+        line += f" {rss_mb:>8.0f}"
+    return line
+
+
+async def run_level(generator, mode, level, args):
+    """Run one load level, printing and returning its per-interval timeline and summary."""
+    loop = asyncio.get_running_loop()
+    first_record = len(generator.records)
+    start = loop.time()
+    timeline = []
+
+    if mode == 'closed':
+        driver = run_closed_loop(generator, level, args.duration)
+    else:
+        driver = run_open_loop(generator, level, args.duration, args.max_in_flight,
+                               poisson=args.arrivals == 'poisson')
+    task = loop.create_task(driver)
+
+    window_start = previous_start = start
+    while not task.done():
+        await asyncio.wait([task], timeout=args.interval)
+        now = loop.time()
+        if task.done() and timeline and now - window_start < args.interval / 2:
+            # Fold the short tail left while requests drain into the last interval
+            timeline.pop()
+            window_start = previous_start
+        window = [record for record in generator.records[first_record:]
+                  if window_start <= record[0] < now]
+        rss_mb = await server_memory(generator.host, generator.port)
+        summary = summarize(window, now - window_start)
+        timeline.append({'t': round(now - start, 2), 'in_flight': generator.in_flight,
+                         'server_rss_mb': rss_mb, **summary})
+        print(format_line(f"{now - start:.0f}s", summary, generator.in_flight, rss_mb), file=sys.stderr)
+        previous_start, window_start = window_start, now
+    task.result()
+
+    summary = summarize(generator.records[first_record:], loop.time() - start)
+    by_endpoint = {}
+    for endpoint in generator.endpoints:
+        records = [record for record in generator.records[first_record:] if record[1] == endpoint]
+        if records:
+            by_endpoint[endpoint] = summarize(records, loop.time() - start)
+    return {'mode': mode, 'level': level, **summary, 'endpoints': by_endpoint, 'timeline': timeline}
+
+
+async def run(args, uploads):
+    mode = 'open' if args.rps else 'closed'
+    levels = args.rps or args.concurrency
+    unit = 'rps' if mode == 'open' else 'clients'
+    generator = LoadGenerator(args.url, uploads, args.mix, args.timeout, args.seed)
+    results = []
+    try:
+        for level in levels:
+            print(f"\n{mode}-loop, {level} {unit}, {args.duration:.0f}s", file=sys.stderr)
+            print(f"{'time':>10} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} "
+                  f"{'in flight':>9} {'RSS MB':>8}", file=sys.stderr)
+            results.append(await run_level(generator, mode, level, args))
+    finally:
+        generator.close()
+    return results
+
+
+def main():
+    """Main function to handle command line arguments and run the load test."""
+    parser = argparse.ArgumentParser(
+        description='Generate closed- or open-loop load against the classifier HTTP API.'
+    )
+    parser.add_argument('--url', default='http://127.0.0.1:5000',
+                        help='Base URL of the server (default: http://127.0.0.1:5000)')
+    parser.add_argument('--concurrency', type=parse_levels(int), default=[8],
+                        help='Closed loop: comma-separated numbers of concurrent clients (default: 8)')
+    parser.add_argument('--rps', type=parse_levels(float), default=None,
+                        help='Open loop: comma-separated target request rates; overrides --concurrency')
+    parser.add_argument('--duration', type=float, default=30.0,
+                        help='Seconds per load level (default: 30)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Endpoint weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--images', nargs='+', default=None,
+                        help='Upload these image files, directories or globs instead of synthetic images')
+    parser.add_argument('--image-pool', type=int, default=32,
+                        help='Number of distinct uploads to cycle through (default: 32)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Seconds before a request counts as timed out (default: 30)')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help='Seconds between progress lines (default: 5)')
+    parser.add_argument('--max-in-flight', type=int, default=1000,
+                        help='Open loop: requests allowed outstanding before new ones are dropped (default: 1000)')
+    parser.add_argument('--arrivals', choices=('poisson', 'uniform'), default='poisson',
+                        help='Open loop: arrival process (default: poisson)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--output', default=None, help='Write the full results as JSON to this file')
+
+    args = parser.parse_args()
+
+    if args.images:
+        uploads = file_uploads(args.images, args.image_pool)
+        if not uploads:
+            print("Error: No images found.")
+            sys.exit(1)
+    else:
+        print(f"Generating {args.image_pool} synthetic uploads...", file=sys.stderr)
+        uploads = synthetic_uploads(args.image_pool, args.seed)
+    sizes = [len(data) for _, data in uploads]
+    print(f"Upload sizes: median {np.median(sizes) / 1024:.0f} KB, max {max(sizes) / 1024:.0f} KB",
+          file=sys.stderr)
+
+    started = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    results = asyncio.run(run(args, uploads))
+
+    print(f"\n{'level':>10} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}", file=sys.stderr)
+    for result in results:
+        print(format_line(str(result['level']), result), file=sys.stderr)
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != 'output'}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'started': started, 'config': config, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
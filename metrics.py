@@ -0,0 +1,261 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms for the backend's /metrics endpoint and for
+predict.py --profile. No dependencies, and cheap enough for the hot path:
+an observation is one bisect and two additions under a lock.
+
+Each process keeps its own metrics. Behind serve.py every worker reports
+only the requests it served itself.
+"""
+
+import bisect
+import contextlib
+import math
+import threading
+import time
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, from 0.1 ms to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Images per forward pass
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class: name, help text, label names and Prometheus rendering."""
+
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {labelvalues}")
+        return tuple(str(value) for value in labelvalues)
+
+    def samples(self):
+        """Return the exposition lines for this metric's current values."""
+        raise NotImplementedError
+
+    def render(self):
+        """Return the metric in Prometheus text format, including HELP and TYPE."""
+        return '\n'.join([
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ] + self.samples())
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        """Add ``amount`` to the count for these label values."""
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labelvalues):
+        """Return the current count for these label values."""
+        return self._values.get(self._key(labelvalues), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in values]
+
+
+class Gauge(_Metric):
+    """Value read from a callback each time the metrics are rendered."""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, fn, type='gauge'):
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): Help text
+            fn: Callable returning the current value, or None to omit it
+            type (str): Exposed metric type; 'counter' for totals kept elsewhere
+        """
+        super().__init__(name, documentation)
+        self.fn = fn
+        self.type = type
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return []
+        return [f'{self.name} {_format_value(value)}']
+
+
+class _Timer:
+    """Context manager observing its elapsed time into a histogram."""
+
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets, optionally split by labels."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, min, max]
+        self._data = {}
+
+    def observe(self, value, *labelvalues):
+        """Record one observation for these label values."""
+        key = self._key(labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                data = self._data[key] = [[0] * (len(self.buckets) + 1), 0.0, value, value]
+            data[0][index] += 1
+            data[1] += value
+            if value < data[2]:
+                data[2] = value
+            elif value > data[3]:
+                data[3] = value
+
+    def time(self, *labelvalues):
+        """Return a context manager that observes the seconds spent inside it."""
+        return _Timer(self, labelvalues)
+
+    def _quantile(self, counts, q, low, high):
+        """
+        Estimate a quantile by interpolating within buckets, like PromQL's
+        histogram_quantile, narrowed to the observed [low, high] range.
+        """
+        rank = q * sum(counts)
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                lower = max(self.buckets[index - 1] if index else 0.0, low)
+                upper = min(self.buckets[index] if index < len(self.buckets) else high, high)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return 0.0
+
+    def summary(self):
+        """
+        Summarize each label combination.
+
+        Returns:
+            dict: label values tuple -> dict with count, sum, mean and
+            estimated p50, p95 and p99 (within the observed min and max)
+        """
+        with self._lock:
+            data = {key: (list(counts), total, low, high)
+                    for key, (counts, total, low, high) in self._data.items()}
+        summary = {}
+        for key, (counts, total, low, high) in data.items():
+            count = sum(counts)
+            summary[key] = {
+                'count': count,
+                'sum': total,
+                'mean': total / count if count else 0.0,
+                'p50': self._quantile(counts, 0.50, low, high),
+                'p95': self._quantile(counts, 0.95, low, high),
+                'p99': self._quantile(counts, 0.99, low, high),
+            }
+        return summary
+
+    def samples(self):
+        with self._lock:
+            data = sorted((key, list(counts), total) for key, (counts, total, _, _) in self._data.items())
+        lines = []
+        for key, counts, total in data:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def timed(histogram, *labelvalues):
+    """Time a block into ``histogram`` (labelled with ``labelvalues``); a no-op when it is None."""
+    if histogram is None:
+        return contextlib.nullcontext()
+    return histogram.time(*labelvalues)
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """Add a metric and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Create and register a Counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, fn, type='gauge'):
+        """Create and register a callback Gauge."""
+        return self.register(Gauge(name, documentation, fn, type))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """Create and register a Histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Return all metrics in Prometheus text format."""
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
@@ -0,0 +1,250 @@
+"""
+Near-duplicate lookup by perceptual hash.
+
+The same photo often arrives re-compressed, resized or with its metadata
+stripped. Its bytes differ, so the exact-bytes prediction cache misses it,
+but a difference hash (dHash) of the decoded image barely changes: each of
+its 64 bits records whether brightness rises or falls between neighbouring
+cells of a 9x8 grayscale thumbnail. Copies of one photo differ in a few
+bits, unrelated photos in about half of them.
+
+NearDuplicateIndex keeps the (hash, score, stage) of classified images and
+finds a stored image within a Hamming distance of a query by multi-index
+hashing. The hash is split into four 16-bit chunks. With r = 4s + a, a hash
+within distance r of the query is within s bits of it in one of the first
+a + 1 chunks or within s - 1 bits in one of the others, so only those
+buckets are probed. Entries live in flat arrays, about 30 bytes each, up
+to a memory cap; once full, the oldest entry is replaced.
+"""
+
+import itertools
+import os
+import threading
+from array import array
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Probing cost grows combinatorially with distance // CHUNKS
+MAX_DISTANCE = 15
+
+# Bytes per stored entry: hash, score, stage and one bucket link per chunk
+ENTRY_BYTES = 8 + 4 + 1 + 4 * CHUNKS
+# Fixed cost: one bucket head per possible chunk value, per chunk
+TABLE_BYTES = 4 * CHUNKS * (1 << CHUNK_BITS)
+
+# Thumbnails whose brightness range is below this share of their brightest
+# cell are not hashed: their bits are noise, and near-flat images of
+# different things would match each other
+MIN_CONTRAST = 0.05
+
+# ITU-R 601 luma weights, as used by PIL's 'L' conversion
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# A stored prediction: sigmoid score, cascade stage index (None for a
+# single model) and the Hamming distance to the query
+NearDuplicate = namedtuple('NearDuplicate', ['score', 'stage', 'distance'])
+
+
+def dhash(image):
+    """
+    Return the 64-bit difference hash of an image, or None if it is too flat to hash.
+
+    Args:
+        image (numpy.ndarray): HxWx3 RGB image, raw uint8 pixels or
+            normalized floats; only relative brightness counts, so both
+            give the same hash
+
+    Returns:
+        int: Hash with one bit per horizontally adjacent pair of cells
+    """
+    gray = np.asarray(image, dtype=np.float32) @ _LUMA
+    thumb = np.asarray(Image.fromarray(gray).resize((9, 8), Image.BOX))
+    if thumb.max() - thumb.min() <= MIN_CONTRAST * thumb.max():
+        return None
+    bits = np.packbits(thumb[:, 1:] > thumb[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def hamming_distance(first, second):
+    """Number of differing bits between two hashes."""
+    return bin(first ^ second).count('1')
+
+
+def _chunks(image_hash):
+    return [(image_hash >> (CHUNK_BITS * c)) & CHUNK_MASK for c in range(CHUNKS)]
+
+
+class NearDuplicateIndex:
+    """Bounded Hamming-distance index of predictions by perceptual hash."""
+
+    def __init__(self, max_distance=4, max_memory_mb=64):
+        """
+        Args:
+            max_distance (int): Largest Hamming distance (out of 64 bits)
+                at which a stored image counts as a copy of the query
+            max_memory_mb (float): Memory cap for the index; sets how many
+                entries it holds before replacing the oldest
+        """
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+        self.max_distance = max_distance
+        self.max_entries = int(max_memory_mb * (1 << 20) - TABLE_BYTES) // ENTRY_BYTES
+        if self.max_entries < 1:
+            raise ValueError(f"max_memory_mb must be above {TABLE_BYTES / (1 << 20):.0f}")
+        # Per chunk, the bit flips to probe around the query's chunk value
+        radius, extra = divmod(max_distance, CHUNKS)
+        self._probes = [[sum(1 << bit for bit in bits)
+                         for r in range(radius + (c <= extra))
+                         for bits in itertools.combinations(range(CHUNK_BITS), r)]
+                        for c in range(CHUNKS)]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._hashes = array('Q')
+        self._scores = array('f')
+        self._stages = array('b')
+        # Per chunk, a linked list of entries per chunk value: the bucket
+        # head, then each entry's link to the next entry (-1 ends a bucket)
+        self._heads = [array('i', [-1]) * (1 << CHUNK_BITS) for _ in range(CHUNKS)]
+        self._links = [array('i') for _ in range(CHUNKS)]
+        self._oldest = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _unlink(self, slot):
+        for key, heads, links in zip(_chunks(self._hashes[slot]), self._heads, self._links):
+            if heads[key] == slot:
+                heads[key] = links[slot]
+                continue
+            entry = heads[key]
+            while links[entry] != slot:
+                entry = links[entry]
+            links[entry] = links[slot]
+
+    def add(self, image_hash, score, stage=None):
+        """Store the prediction for an image hash, replacing the oldest entry when full."""
+        stage = -1 if stage is None else stage
+        with self._lock:
+            if len(self._hashes) < self.max_entries:
+                slot = len(self._hashes)
+                self._hashes.append(image_hash)
+                self._scores.append(score)
+                self._stages.append(stage)
+                for links in self._links:
+                    links.append(-1)
+            else:
+                slot = self._oldest
+                self._oldest = (slot + 1) % self.max_entries
+                self._unlink(slot)
+                self._hashes[slot] = image_hash
+                self._scores[slot] = score
+                self._stages[slot] = stage
+                self.evictions += 1
+            for key, heads, links in zip(_chunks(image_hash), self._heads, self._links):
+                links[slot] = heads[key]
+                heads[key] = slot
+
+    def find(self, image_hash):
+        """
+        Return the closest stored prediction within ``max_distance``, or None.
+
+        Returns:
+            NearDuplicate: Stored score and stage, and the distance to the query
+        """
+        best, best_distance = None, self.max_distance + 1
+        with self._lock:
+            hashes = self._hashes
+            for key, probes, heads, links in zip(_chunks(image_hash), self._probes,
+                                                 self._heads, self._links):
+                for probe in probes:
+                    slot = heads[key ^ probe]
+                    while slot != -1:
+                        distance = hamming_distance(hashes[slot], image_hash)
+                        if distance < best_distance:
+                            best, best_distance = slot, distance
+                        slot = links[slot]
+                if best_distance == 0:
+                    break
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            stage = self._stages[best]
+            return NearDuplicate(self._scores[best], None if stage < 0 else stage, best_distance)
+
+    def count_pending_hit(self):
+        """
+        Count a lookup that missed the index as a hit on an image not yet added.
+
+        For callers that hold back their latest images until a batch is
+        classified: a copy of a held-back image reuses its prediction too.
+        """
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+
+    def memory_bytes(self):
+        """Memory held by the index's arrays."""
+        return TABLE_BYTES + ENTRY_BYTES * len(self._hashes)
+
+    def stats(self):
+        """Counters reported by the /health endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._hashes),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+                "max_distance": self.max_distance,
+                "memory_mb": round(self.memory_bytes() / (1 << 20), 1),
+            }
+
+    def save(self, path, tag=''):
+        """
+        Write the entries to an .npz file, oldest first.
+
+        Args:
+            path (str): Output file; written atomically
+            tag (str): Identifies the model that produced the scores; load()
+                ignores files saved with a different tag
+        """
+        with self._lock:
+            order = np.roll(np.arange(len(self._hashes)), -self._oldest)
+            tmp_path = path + '.partial'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f,
+                         hashes=np.frombuffer(self._hashes, dtype=np.uint64)[order],
+                         scores=np.frombuffer(self._scores, dtype=np.float32)[order],
+                         stages=np.frombuffer(self._stages, dtype=np.int8)[order],
+                         tag=np.array(tag))
+        os.replace(tmp_path, path)
+
+    def load(self, path, tag=''):
+        """
+        Add the entries of a file written by save().
+
+        Returns:
+            int: Entries added, or None when the file was saved with a different tag
+        """
+        with np.load(path) as data:
+            if str(data['tag']) != tag:
+                return None
+            entries = zip(data['hashes'].tolist(), data['scores'].tolist(),
+                          data['stages'].tolist())
+            count = 0
+            for image_hash, score, stage in entries:
+                self.add(image_hash, score, None if stage < 0 else stage)
+                count += 1
+        return count
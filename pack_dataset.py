@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Packed Dataset
+
+Decoding a JPEG folder tree costs far more than training the Dense head or
+evaluating the model, and tf.keras.utils.image_dataset_from_directory pays
+it again on every epoch. This script decodes and resizes every image once,
+with the same preprocessing the server uses, and writes the pixels as
+memory-mapped uint8 shards:
+
+    packed/
+        meta.json               image size, class names, shard sizes
+        train/shard-00000.npy   (N, 128, 128, 3) uint8
+        train/labels.npy        (N,) int64 class index
+        train/sources.txt       original file of every row
+        test/...
+
+Images are shuffled before they are sharded, so every shard mixes the
+classes. PackedSplit.iter_batches() then shuffles by shard: it visits the
+shards in random order and permutes rows inside each one. Reads stay local
+to one file at a time, and memory stays flat however large the dataset is.
+
+Usage: python pack_dataset.py <data_dir> <output_dir> [--shard-size 2048]
+"""
+
+import sys
+import os
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from predict import list_labeled_images
+from preprocessing import IMAGE_SIZE, load_image, to_model_input
+
+FORMAT_VERSION = 1
+
+# Split folders picked up under the data directory, in packing order
+SPLIT_NAMES = ('train', 'validation', 'test')
+
+
+def _decode_into(buffer, index, image_path, target_size):
+    try:
+        load_image(image_path, target_size, out=buffer[index])
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def _save_atomic(path, array):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def pack_split(image_paths, labels, output_dir, target_size=IMAGE_SIZE, shard_size=2048,
+               workers=None, seed=42):
+    """
+    Decode a list of labelled images into uint8 shards.
+
+    Args:
+        image_paths (list): Paths to the image files
+        labels (numpy.ndarray): Class index of each image
+        output_dir (str): Directory for this split's shards (created if missing)
+        target_size (tuple): Image size (width, height)
+        shard_size (int): Images per shard
+        workers (int): Decoder threads (default: number of CPUs)
+        seed (int): Seed of the shuffle applied before sharding
+
+    Returns:
+        dict: Split metadata - row count, shard file names and row counts,
+        and the paths of images that could not be decoded
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    order = np.random.default_rng(seed).permutation(len(image_paths))
+    width, height = target_size
+    buffer = np.empty((shard_size, height, width, 3), dtype=np.uint8)
+    shards, kept_labels, sources, failed = [], [], [], []
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for start in range(0, len(order), shard_size):
+            chunk = order[start:start + shard_size]
+            errors = list(pool.map(_decode_into, [buffer] * len(chunk), range(len(chunk)),
+                                   [image_paths[i] for i in chunk], [target_size] * len(chunk)))
+            valid = [j for j, error in enumerate(errors) if error is None]
+            for j, error in enumerate(errors):
+                if error is not None:
+                    print(f"\nSkipping {image_paths[chunk[j]]}: {error}")
+                    failed.append(image_paths[chunk[j]])
+
+            name = f'shard-{len(shards):05d}.npy'
+            # Rows of failed images are dropped, keeping every shard dense
+            _save_atomic(os.path.join(output_dir, name), buffer[valid])
+            shards.append({'file': name, 'count': len(valid)})
+            kept_labels.extend(int(labels[chunk[j]]) for j in valid)
+            sources.extend(image_paths[chunk[j]] for j in valid)
+            print(f"\rPacked {start + len(chunk)}/{len(order)} images", end='', flush=True)
+    print()
+
+    _save_atomic(os.path.join(output_dir, 'labels.npy'), np.array(kept_labels, dtype=np.int64))
+    with open(os.path.join(output_dir, 'sources.txt'), 'w', encoding='utf-8') as f:
+        f.writelines(f'{source}\n' for source in sources)
+    return {'count': len(kept_labels), 'shards': shards, 'failed': failed}
+
+
+def find_splits(data_dir):
+    """
+    Find the class-folder trees to pack under ``data_dir``.
+
+    Returns:
+        dict: split name -> directory; train/validation/test sub-directories
+        when present, otherwise ``data_dir`` itself as the 'train' split
+    """
+    splits = {name: os.path.join(data_dir, name) for name in SPLIT_NAMES
+              if os.path.isdir(os.path.join(data_dir, name))}
+    return splits or {'train': data_dir}
+
+
+class PackedSplit:
+    """One split of a packed dataset: memory-mapped image shards and their labels."""
+
+    def __init__(self, directory, meta, class_names, image_size):
+        self.directory = directory
+        self.class_names = class_names
+        self.image_size = image_size
+        self.labels = np.load(os.path.join(directory, 'labels.npy'))
+        # Mapping a shard reads nothing; pages are loaded when rows are accessed
+        self.shards = [np.load(os.path.join(directory, shard['file']), mmap_mode='r')
+                       for shard in meta['shards']]
+        self.offsets = np.cumsum([0] + [shard['count'] for shard in meta['shards']])
+
+    def __len__(self):
+        return len(self.labels)
+
+    def sources(self):
+        """Return the original image file of every row."""
+        with open(os.path.join(self.directory, 'sources.txt'), encoding='utf-8') as f:
+            return [line.rstrip('\n') for line in f]
+
+    def images(self, rows):
+        """Gather the uint8 images of sorted global ``rows`` into a new array."""
+        rows = np.asarray(rows)
+        shard_ids = np.searchsorted(self.offsets, rows, side='right') - 1
+        width, height = self.image_size
+        out = np.empty((len(rows), height, width, 3), dtype=np.uint8)
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            out[mask] = self.shards[shard_id][rows[mask] - self.offsets[shard_id]]
+        return out
+
+    def _row_order(self, start, stop, shuffle, rng):
+        """Yield arrays of global rows in [start, stop), shard by shard."""
+        shard_ids = range(np.searchsorted(self.offsets, start, side='right') - 1,
+                          np.searchsorted(self.offsets, stop, side='left'))
+        if shuffle:
+            shard_ids = rng.permutation(shard_ids)
+        for shard_id in shard_ids:
+            rows = np.arange(max(start, self.offsets[shard_id]),
+                             min(stop, self.offsets[shard_id + 1]))
+            yield rng.permutation(rows) if shuffle else rows
+
+    def iter_batches(self, batch_size=32, shuffle=False, seed=None, start=0, stop=None,
+                     dtype=np.uint8, prefetch=2, drop_remainder=False):
+        """
+        Stream (images, labels) batches, reading ahead on a background thread.
+
+        Args:
+            batch_size (int): Images per batch
+            shuffle (bool): Visit shards in random order and permute rows inside each
+            seed: Seed or numpy Generator for the shuffle
+            start (int): First row to read; with ``stop``, selects a contiguous
+                range, e.g. to hold out a validation set
+            stop (int): Row after the last one to read (default: end of split)
+            dtype: float32 to normalize to [0, 1], uint8 for raw pixels
+            prefetch (int): Batches read ahead of the consumer
+            drop_remainder (bool): Skip a final batch smaller than ``batch_size``
+
+        Yields:
+            tuple: (images of shape (N, height, width, 3), int64 labels of shape (N,))
+        """
+        stop = len(self) if stop is None else stop
+        rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+        batches = queue.Queue(maxsize=max(prefetch, 1))
+        done = object()
+        cancelled = threading.Event()
+
+        def offer(item):
+            # Give up once the consumer has stopped iterating
+            while not cancelled.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def load(rows):
+            # Sorted rows read each shard front to back; order within a batch does not matter
+            rows = np.sort(rows)
+            return to_model_input(self.images(rows), dtype), self.labels[rows]
+
+        def produce():
+            try:
+                pending = np.empty(0, dtype=np.int64)
+                for rows in self._row_order(start, stop, shuffle, rng):
+                    pending = np.concatenate([pending, rows])
+                    while len(pending) >= batch_size:
+                        batch, pending = pending[:batch_size], pending[batch_size:]
+                        if not offer(load(batch)):
+                            return
+                if len(pending) and not drop_remainder:
+                    if not offer(load(pending)):
+                        return
+                offer(done)
+            except Exception as e:
+                offer(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+            thread.join()
+
+    def as_tf_dataset(self, batch_size=32, shuffle=False, seed=None, start=0, stop=None,
+                      dtype=np.float32, prefetch=2):
+        """
+        Wrap iter_batches() in a tf.data.Dataset for Keras fit/evaluate.
+
+        Each pass over the dataset (each epoch) is shuffled differently.
+        Labels are float32, as binary_crossentropy expects.
+        """
+        import tensorflow as tf
+
+        rng = np.random.default_rng(seed)
+        width, height = self.image_size
+
+        def generate():
+            for images, labels in self.iter_batches(batch_size, shuffle, rng, start, stop,
+                                                    dtype, prefetch):
+                yield images, labels.astype(np.float32)
+
+        return tf.data.Dataset.from_generator(
+            generate,
+            output_signature=(
+                tf.TensorSpec((None, height, width, 3), tf.as_dtype(np.dtype(dtype))),
+                tf.TensorSpec((None,), tf.float32),
+            )
+        )
+
+
+class PackedDataset:
+    """A directory written by pack_dataset.py."""
+
+    def __init__(self, directory):
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            raise ValueError(f"{directory} is not a packed dataset (no meta.json)")
+        with open(meta_path, encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"{directory} has packed format {self.meta.get('format_version')}, "
+                             f"expected {FORMAT_VERSION}; re-pack it")
+        self.directory = directory
+        self.class_names = self.meta['class_names']
+        self.image_size = tuple(self.meta['image_size'])
+
+    @staticmethod
+    def is_packed(directory):
+        """Whether ``directory`` holds a packed dataset."""
+        return os.path.exists(os.path.join(directory, 'meta.json'))
+
+    @property
+    def splits(self):
+        """Names of the packed splits."""
+        return list(self.meta['splits'])
+
+    def split(self, name):
+        """Open one split, e.g. 'train' or 'test'."""
+        if name not in self.meta['splits']:
+            raise KeyError(f"No split '{name}' in {self.directory} (have {', '.join(self.splits)})")
+        return PackedSplit(os.path.join(self.directory, name), self.meta['splits'][name],
+                           self.class_names, self.image_size)
+
+
+def main():
+    """Main function to handle command line arguments and pack the dataset."""
+    parser = argparse.ArgumentParser(
+        description='Decode class-folder image trees once into memory-mapped uint8 shards.'
+    )
+    parser.add_argument(
+        'data_dir',
+        help='Directory with train/ (and test/, validation/) class folders, or a single class-folder tree'
+    )
+    parser.add_argument('output_dir', help='Directory to write the packed dataset to')
+    parser.add_argument('--shard-size', type=int, default=2048,
+                        help='Images per shard (default: 2048, about 100 MB at 128x128)')
+    parser.add_argument('--image-size', type=int, nargs=2, default=list(IMAGE_SIZE),
+                        metavar=('WIDTH', 'HEIGHT'), help='Stored image size (default: 128 128)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Image decoding threads (default: number of CPUs)')
+    parser.add_argument('--seed', type=int, default=42, help='Shuffle seed (default: 42)')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        print(f"Error: Data directory '{args.data_dir}' not found.")
+        sys.exit(1)
+
+    target_size = tuple(args.image_size)
+    meta = {'format_version': FORMAT_VERSION, 'image_size': list(target_size),
+            'class_names': None, 'splits': {}}
+    start_time = time.time()
+    for name, directory in find_splits(args.data_dir).items():
+        image_paths, labels, class_names = list_labeled_images(directory)
+        if meta['class_names'] is None:
+            meta['class_names'] = class_names
+        elif class_names != meta['class_names']:
+            print(f"Error: {directory} has classes {class_names}, expected {meta['class_names']}")
+            sys.exit(1)
+        print(f"Packing {len(image_paths)} images from {directory} as '{name}'")
+        meta['splits'][name] = pack_split(image_paths, labels, os.path.join(args.output_dir, name),
+                                          target_size, args.shard_size, args.workers, args.seed)
+
+    if not any(split['count'] for split in meta['splits'].values()):
+        print("Error: No images were packed.")
+        sys.exit(1)
+
+    # Written last, so a half-packed directory is never mistaken for a dataset
+    with open(os.path.join(args.output_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    size = sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(args.output_dir) for name in files)
+    counts = ', '.join(f"{name}: {split['count']}" for name, split in meta['splits'].items())
+    print(f"Packed {counts} images "
+          f"({size / 1e6:.0f} MB) in {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
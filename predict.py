@@ -3,109 +3,541 @@
 Cats and Dogs Image Classifier - Prediction Script
 
 This script loads the trained model and makes predictions on new images.
-Usage: python predict.py <image_path> [image_path2] [image_path3] ...
+Usage: python predict.py <image_path|directory|glob> [more inputs] ...
 """
 
 import sys
 import os
+import glob
+import csv
+import json
+import contextlib
+import itertools
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import tensorflow as tf
-from PIL import Image
 import argparse
+import time
 
+from artifacts import ModelArtifact, file_sha256, resolve_model_path
+from cascade import CASCADE_STAGES, DEFAULT_BAND, CascadeModel, stage_name
+from metrics import Histogram, timed
+from near_duplicates import NearDuplicateIndex, dhash, hamming_distance
+from preprocessing import IMAGE_SIZE, allocate_batch, load_image, preprocess, to_model_input
+from progress import ProgressIndex
 
-def load_model(model_path='my_model.keras'):
-    """Load the trained model from file."""
+# File extensions picked up when a directory is given as input
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+
+
+def load_model(model_path='my_model.keras', use_cache=True):
+    """
+    Load the trained model from file and return its compiled inference function.
+    
+    Both Keras models (.keras) and TensorFlow Lite models (.tflite, e.g. from
+    quantize_model.py) are supported. The file is checked against its
+    checksum when one is configured, and with MODEL_CACHE_DIR set a Keras
+    model is run from its cached TensorFlow Lite copy (see artifacts.py)
+    unless ``use_cache`` is False.
+    """
     try:
-        model = tf.keras.models.load_model(model_path)
-        print(f"Model loaded successfully from {model_path}")
+        artifact = ModelArtifact(model_path, cache_dir=None if use_cache else '')
+        model = artifact.load()
+        print(f"Model loaded successfully from {artifact.loaded_from}")
         return model
     except Exception as e:
         print(f"Error loading model: {e}")
         sys.exit(1)
 
 
-def preprocess_image(image_path, target_size=(128, 128)):
+def preprocess_image(image_path, target_size=IMAGE_SIZE, dtype=np.float32):
     """
     Preprocess an image for prediction.
     
     Args:
         image_path (str): Path to the image file
         target_size (tuple): Target size for resizing (width, height)
+        dtype: Model input dtype; float32 is normalized to [0, 1], uint8
+            (exported models with in-graph rescaling) is left as raw pixels
     
     Returns:
         numpy.ndarray: Preprocessed image ready for prediction
     """
     try:
-        # Load image using PIL
-        image = Image.open(image_path)
-        
-        # Convert to RGB if needed (handles RGBA, grayscale, etc.)
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Resize to target size
-        image = image.resize(target_size)
-        
-        # Convert to numpy array
-        image_array = np.array(image)
-        
-        # Normalize pixel values to [0, 1]
-        image_array = image_array / 255.0
-        
-        # Add batch dimension
-        image_array = np.expand_dims(image_array, axis=0)
-        
-        return image_array
+        # Same decode/resize/normalize path as the backend and batch mode
+        return preprocess(image_path, target_size, dtype)
         
     except Exception as e:
         print(f"Error processing image {image_path}: {e}")
         return None
 
 
+def model_input_spec(model):
+    """Return the (width, height) and dtype a model expects its images in."""
+    return (getattr(model, 'image_size', IMAGE_SIZE),
+            getattr(model, 'input_dtype', np.dtype(np.float32)))
+
+
+def make_result(image_path, raw_prediction, stage=None):
+    """Convert a raw sigmoid output into a prediction result dict (with the cascade stage, if any)."""
+    confidence = float(raw_prediction)
+    
+    # Convert prediction to class (0 = cat, 1 = dog)
+    if confidence > 0.5:
+        predicted_class = "dog"
+        class_confidence = confidence
+    else:
+        predicted_class = "cat"
+        class_confidence = 1 - confidence
+    
+    result = {
+        'image_path': image_path,
+        'predicted_class': predicted_class,
+        'confidence': class_confidence,
+        'raw_prediction': confidence
+    }
+    if stage is not None:
+        result['stage'] = stage
+    return result
+
+
 def predict_image(model, image_path):
     """
     Make prediction on a single image.
     
     Args:
-        model: Loaded Keras model
+        model: Compiled inference function returned by load_model()
         image_path (str): Path to the image file
     
     Returns:
         dict: Prediction results with class name and confidence
     """
     # Preprocess the image
-    processed_image = preprocess_image(image_path)
+    processed_image = preprocess_image(image_path, *model_input_spec(model))
     
     if processed_image is None:
         return None
     
     # Make prediction
     try:
-        prediction = model.predict(processed_image, verbose=0)
-        
-        # Convert prediction to class (0 = cat, 1 = dog)
-        confidence = float(prediction[0][0])
-        
-        if confidence > 0.5:
-            predicted_class = "dog"
-            class_confidence = confidence
-        else:
-            predicted_class = "cat"
-            class_confidence = 1 - confidence
-        
-        return {
-            'image_path': image_path,
-            'predicted_class': predicted_class,
-            'confidence': class_confidence,
-            'raw_prediction': confidence
-        }
+        prediction = model(processed_image)
+        return make_result(image_path, prediction[0][0], stage_name(prediction[0]))
         
     except Exception as e:
         print(f"Error making prediction for {image_path}: {e}")
         return None
 
 
+def iter_image_paths(inputs):
+    """
+    Expand CLI inputs into image paths, preserving the order they were given.
+    
+    Each input may be an image file, a directory (searched recursively for
+    image files, in sorted order) or a glob pattern.
+    
+    Args:
+        inputs (list): File paths, directories and/or glob patterns
+    
+    Yields:
+        str: Path to an image file
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif os.path.exists(item):
+            yield item
+        elif glob.has_magic(item):
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                print(f"❌ No images match: {item}", file=sys.stderr)
+            for path in matches:
+                if os.path.isfile(path):
+                    yield path
+        else:
+            print(f"❌ Image not found: {item}", file=sys.stderr)
+
+
+def list_labeled_images(data_dir):
+    """
+    List images in a class-folder tree (one sub-directory per class).
+
+    Classes are numbered in alphabetical order of their folder names, the
+    same way tf.keras.utils.image_dataset_from_directory does.
+
+    Args:
+        data_dir (str): Directory containing one folder per class
+
+    Returns:
+        tuple: (image_paths, labels, class_names)
+    """
+    class_names = sorted(
+        name for name in os.listdir(data_dir)
+        if os.path.isdir(os.path.join(data_dir, name))
+    )
+    image_paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        for root, dirs, files in os.walk(os.path.join(data_dir, class_name)):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    image_paths.append(os.path.join(root, name))
+                    labels.append(label)
+    return image_paths, np.array(labels, dtype=np.float32), class_names
+
+
+# Stages reported by --profile, in pipeline order
+PROFILE_STAGES = ('extract', 'decode', 'decode_wait', 'dedup', 'preprocess', 'inference', 'write')
+
+
+def _decode_or_error(image_path, target_size, out=None, stages=None):
+    try:
+        with timed(stages, 'decode'):
+            return load_image(image_path, target_size, out), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _decode_ahead(image_paths, target_size, workers, depth, stages=None):
+    """
+    Decode images on a thread pool, yielding them in input order with bounded read-ahead.
+    
+    Images are decoded straight into slots of a preallocated uint8 ring
+    buffer. A slot is only reused once the image in it has been yielded and
+    the consumer has moved on, so each yielded array must be copied out
+    before asking for the next one.
+    
+    With ``stages`` given, decoding time is recorded as 'decode' and the time
+    spent waiting for the decoders as 'decode_wait'.
+    """
+    ring = allocate_batch(depth + 1, target_size, dtype=np.uint8)
+    
+    def next_decoded():
+        image_path, future = pending.popleft()
+        with timed(stages, 'decode_wait'):
+            return (image_path,) + future.result()
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for index, image_path in enumerate(image_paths):
+            slot = ring[index % len(ring)]
+            pending.append((image_path, pool.submit(_decode_or_error, image_path, target_size,
+                                                    slot, stages)))
+            if len(pending) >= depth:
+                yield next_decoded()
+        while pending:
+            yield next_decoded()
+
+
+def iter_result_batches(model, image_paths, batch_size=32, workers=None, target_size=None,
+                        stages=None, near_duplicates=None):
+    """
+    Classify many images, decoding in parallel and predicting a batch at a time.
+    
+    Images are decoded and resized on a thread pool, copied into a
+    preallocated batch buffer and run through the model in one forward pass
+    per batch. Each finished batch is yielded as a list of results in input
+    order, so memory stays flat no matter how many images are processed.
+    
+    Args:
+        model: Compiled inference function returned by load_model()
+        image_paths (iterable): Paths to the image files
+        batch_size (int): Number of images per forward pass
+        workers (int): Decoder threads (default: number of CPUs)
+        target_size (tuple): Target size for resizing (width, height);
+            defaults to the model's input size
+        stages (Histogram): Optional histogram labelled by stage that records
+            decode, decode_wait, dedup (near-duplicate lookup), preprocess and
+            inference times
+        near_duplicates (NearDuplicateIndex): Optional index of earlier
+            predictions by perceptual hash. Near-identical copies of an
+            indexed image, or of an image waiting in the current batch,
+            reuse its prediction (with 'near_duplicate_distance' in the
+            result), and new predictions are added to it
+    
+    Yields:
+        list: Result dicts for the images completed by one batch. Images
+        that could not be processed get a dict with 'image_path' and 'error'.
+    """
+    workers = workers or os.cpu_count() or 1
+    model_size, input_dtype = model_input_spec(model)
+    target_size = target_size or model_size
+    # Keep at most two batches decoded ahead of the model
+    decoded = _decode_ahead(image_paths, target_size, workers, depth=2 * batch_size,
+                            stages=stages)
+    
+    buffer = allocate_batch(batch_size, target_size, dtype=input_dtype)
+    batch_paths = []
+    batch_hashes = []
+    
+    def run_batch():
+        count = len(batch_paths)
+        try:
+            with timed(stages, 'inference'):
+                predictions = model(buffer[:count])
+        except Exception as e:
+            return [{'image_path': path, 'error': str(e)} for path in batch_paths]
+        if near_duplicates is not None:
+            for image_hash, prediction in zip(batch_hashes, predictions):
+                if image_hash is not None:
+                    stage = int(prediction[1]) if stage_name(prediction) is not None else None
+                    near_duplicates.add(image_hash, float(prediction[0]), stage)
+        return [make_result(path, prediction[0], stage_name(prediction))
+                for path, prediction in zip(batch_paths, predictions)]
+    
+    def in_order(items):
+        # Items are finished results, batch slots, or (slot, path, distance)
+        # for copies of the image in that slot
+        results = run_batch() if batch_paths else []
+        ordered_results = []
+        for item in items:
+            if isinstance(item, dict):
+                ordered_results.append(item)
+            elif isinstance(item, int):
+                ordered_results.append(results[item])
+            else:
+                slot, image_path, distance = item
+                original = results[slot]
+                if 'error' in original:
+                    ordered_results.append({'image_path': image_path, 'error': original['error']})
+                    continue
+                result = make_result(image_path, original['raw_prediction'], original.get('stage'))
+                result['near_duplicate_distance'] = distance
+                ordered_results.append(result)
+        return ordered_results
+    
+    def closest_pending(image_hash):
+        # Images in the batch are only indexed once it has run
+        best, best_distance = None, near_duplicates.max_distance + 1
+        for slot, pending_hash in enumerate(batch_hashes):
+            if pending_hash is not None:
+                distance = hamming_distance(pending_hash, image_hash)
+                if distance < best_distance:
+                    best, best_distance = slot, distance
+        return best, best_distance
+    
+    # Results are emitted in input order, so errors wait behind the batch in progress
+    ordered = []
+    for image_path, image_array, error in decoded:
+        if error is not None:
+            ordered.append({'image_path': image_path, 'error': error})
+            if not batch_paths:
+                yield ordered
+                ordered = []
+            continue
+        
+        if near_duplicates is not None:
+            with timed(stages, 'dedup'):
+                image_hash = dhash(image_array)
+                match = near_duplicates.find(image_hash) if image_hash is not None else None
+                slot = None
+                if match is None and image_hash is not None:
+                    slot, distance = closest_pending(image_hash)
+            if match is not None:
+                stage = CASCADE_STAGES[match.stage] if match.stage is not None else None
+                result = make_result(image_path, match.score, stage)
+                result['near_duplicate_distance'] = match.distance
+                ordered.append(result)
+                if not batch_paths:
+                    yield ordered
+                    ordered = []
+                continue
+            if slot is not None:
+                # A copy of an image in this batch: classify the original only
+                near_duplicates.count_pending_hit()
+                ordered.append((slot, image_path, distance))
+                continue
+            batch_hashes.append(image_hash)
+        
+        # Normalize pixel values to [0, 1] straight into the batch buffer
+        # (or copy raw pixels for models that rescale in-graph)
+        with timed(stages, 'preprocess'):
+            to_model_input(image_array, input_dtype, out=buffer[len(batch_paths)])
+        ordered.append(len(batch_paths))
+        batch_paths.append(image_path)
+        
+        if len(batch_paths) == batch_size:
+            yield in_order(ordered)
+            ordered = []
+            batch_paths = []
+            batch_hashes = []
+    
+    if ordered:
+        yield in_order(ordered)
+
+
+def iter_embedding_result_batches(classifier, image_paths, batch_size=32, workers=None,
+                                  target_size=None, stages=None):
+    """
+    Classify many images, reusing backbone embeddings from a feature store.
+    
+    Images whose embedding is already stored are not decoded at all; only
+    the Dense head runs for them. New images go through the backbone once
+    and their embeddings are added to the store.
+    
+    Args:
+        classifier (EmbeddingClassifier): Split model with its feature store
+        image_paths (iterable): Paths to the image files
+        batch_size (int): Number of images per forward pass
+        workers (int): Hashing and decoder threads (default: number of CPUs)
+        target_size (tuple): Target size for resizing (width, height)
+        stages (Histogram): Optional histogram labelled by stage; records
+            'extract' (feature lookup, plus decoding and the backbone for
+            new images) and
+            'inference' (the Dense head)
+    
+    Yields:
+        list: Result dicts for one batch of images, in input order
+    """
+    workers = workers or os.cpu_count() or 1
+    image_paths = iter(image_paths)
+    decode = functools.partial(load_image, target_size=target_size or classifier.image_size)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = list(itertools.islice(image_paths, batch_size))
+            if not chunk:
+                return
+            
+            with timed(stages, 'extract'):
+                features, errors, _ = classifier.extract(chunk, decode, pool)
+            results = [{'image_path': chunk[i], 'error': errors[i]} if i in errors else None
+                       for i in range(len(chunk))]
+            
+            scored = [i for i in range(len(chunk)) if i not in errors]
+            if scored:
+                try:
+                    with timed(stages, 'inference'):
+                        predictions = classifier.score(features[scored])
+                    for i, prediction in zip(scored, predictions):
+                        results[i] = make_result(chunk[i], prediction[0])
+                except Exception as e:
+                    for i in scored:
+                        results[i] = {'image_path': chunk[i], 'error': str(e)}
+            
+            yield results
+
+
+def predict_batches(model, image_paths, batch_size=32, workers=None, target_size=None,
+                    stages=None):
+    """
+    Classify many images, yielding one result dict per image in input order.
+    
+    See iter_result_batches() for the arguments; this flattens its batches.
+    
+    Yields:
+        dict: Prediction result per image, or a dict with 'image_path' and
+        'error' for images that could not be processed
+    """
+    for results in iter_result_batches(model, image_paths, batch_size, workers, target_size,
+                                       stages):
+        yield from results
+
+
+class TextWriter:
+    """Human-readable output, one block per image."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+    
+    def write_batch(self, results):
+        for result in results:
+            image_path = result['image_path']
+            if 'error' in result:
+                print(f"❌ Failed to process: {image_path} ({result['error']})", file=self.stream)
+                continue
+            
+            # Display results
+            class_emoji = "🐱" if result['predicted_class'] == 'cat' else "🐶"
+            confidence_percent = result['confidence'] * 100
+            
+            print(f"{class_emoji} {os.path.basename(image_path)}", file=self.stream)
+            print(f"   Prediction: {result['predicted_class'].upper()}", file=self.stream)
+            print(f"   Confidence: {confidence_percent:.1f}%", file=self.stream)
+            if 'stage' in result:
+                print(f"   Stage: {result['stage']}", file=self.stream)
+            if 'near_duplicate_distance' in result:
+                print(f"   Reused: near-duplicate of an earlier image "
+                      f"(distance {result['near_duplicate_distance']})", file=self.stream)
+            print(file=self.stream)
+        self.stream.flush()
+
+
+class JsonlWriter:
+    """One JSON object per line per image."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+    
+    def write_batch(self, results):
+        for result in results:
+            self.stream.write(json.dumps(result) + '\n')
+        self.stream.flush()
+
+
+class CsvWriter:
+    """One CSV row per image, with a header row."""
+    
+    FIELDS = ['image_path', 'predicted_class', 'confidence', 'raw_prediction', 'stage',
+              'near_duplicate_distance', 'error']
+    
+    def __init__(self, stream, header=True):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=self.FIELDS, extrasaction='ignore')
+        if header:
+            self.writer.writeheader()
+    
+    def write_batch(self, results):
+        self.writer.writerows(results)
+        self.stream.flush()
+
+
+RESULT_WRITERS = {
+    'text': TextWriter,
+    'jsonl': JsonlWriter,
+    'csv': CsvWriter,
+}
+
+
+def print_profile(stages, elapsed, image_count, stream=sys.stderr):
+    """
+    Print a per-stage latency breakdown of a prediction run.
+    
+    Args:
+        stages (Histogram): Stage timings labelled by stage name
+        elapsed (float): Wall-clock seconds of the whole run
+        image_count (int): Number of images processed
+        stream: Where to print the table
+    """
+    rate = image_count / elapsed if elapsed > 0 else 0.0
+    print(f"\nProfile: {image_count} image(s) in {elapsed:.2f}s ({rate:.1f} images/s)", file=stream)
+    print(f"{'stage':<12} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8}", file=stream)
+    summary = stages.summary()
+    for stage in PROFILE_STAGES:
+        stats = summary.get((stage,))
+        if stats is None:
+            continue
+        print(f"{stage:<12} {stats['count']:>7} {stats['sum']:>9.3f} {stats['mean'] * 1000:>9.2f} "
+              f"{stats['p50'] * 1000:>8.2f} {stats['p95'] * 1000:>8.2f} {stats['p99'] * 1000:>8.2f}",
+              file=stream)
+    # Decoding runs on several threads at once, so its total can exceed the wall time
+    print("(decode runs in parallel threads; decode_wait is time the model "
+          "loop spent waiting for it)", file=stream)
+
+
+def near_duplicate_tag(args):
+    """Identify the model(s) behind saved near-duplicate predictions, so another model never reuses them."""
+    parts = [file_sha256(args.model)]
+    if args.cascade:
+        parts += [file_sha256(args.cascade)] + [str(bound) for bound in args.cascade_band]
+    return ' '.join(parts)
+
+
 def main():
     """Main function to handle command line arguments and make predictions."""
     parser = argparse.ArgumentParser(
@@ -114,16 +546,109 @@ def main():
     parser.add_argument(
         'images', 
         nargs='+', 
-        help='Path(s) to image file(s) to classify'
+        help='Image file(s), directories or glob patterns to classify'
     )
     parser.add_argument(
         '--model', 
-        default='my_model.keras',
-        help='Path to the trained model file (default: my_model.keras)'
+        default=None,
+        help='Path to the trained model file (default: $MODEL_PATH, else my_model.keras)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=32,
+        help='Number of images per forward pass (default: 32)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of image decoding threads (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=sorted(RESULT_WRITERS),
+        default='text',
+        help='Output format: human-readable text, or one JSONL/CSV record per image (default: text)'
+    )
+    parser.add_argument(
+        '--output',
+        default='-',
+        help='File to write results to (default: standard output)'
+    )
+    parser.add_argument(
+        '--job',
+        default=None,
+        help='SQLite progress file for a resumable run; images already recorded '
+             'in it are skipped and --output is appended to'
+    )
+    parser.add_argument(
+        '--feature-store',
+        default=None,
+        help='Directory of cached backbone embeddings; images already in it only '
+             'run through the Dense head, new ones are added'
+    )
+    parser.add_argument(
+        '--cascade',
+        default=None,
+        metavar='FAST_MODEL',
+        help='First-stage model from train_cascade.py; only images it is unsure '
+             'about run through --model'
+    )
+    parser.add_argument(
+        '--cascade-band',
+        type=float,
+        nargs=2,
+        default=list(DEFAULT_BAND),
+        metavar=('LOW', 'HIGH'),
+        help='First-stage scores strictly between LOW and HIGH go on to the full model '
+             f'(default: {DEFAULT_BAND[0]} {DEFAULT_BAND[1]})'
+    )
+    parser.add_argument(
+        '--near-duplicates',
+        type=int,
+        default=None,
+        metavar='DISTANCE',
+        help='Reuse the prediction of an earlier image whose perceptual hash differs '
+             'in at most DISTANCE of 64 bits (e.g. 4), so resized or re-encoded '
+             'copies skip inference'
+    )
+    parser.add_argument(
+        '--near-duplicates-memory',
+        type=float,
+        default=256,
+        metavar='MB',
+        help='Memory cap of the near-duplicate index; the oldest entries are '
+             'replaced beyond it (default: 256)'
+    )
+    parser.add_argument(
+        '--near-duplicates-index',
+        default=None,
+        metavar='FILE',
+        help='Load the near-duplicate index from FILE (if present) and save it '
+             'there afterwards, so later runs reuse these predictions'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print a per-stage latency breakdown (decode, preprocess, inference, write) '
+             'to standard error when done'
     )
     
     args = parser.parse_args()
     
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    args.model = resolve_model_path(args.model, default='my_model.keras')
+    if args.feature_store and args.model.endswith('.tflite'):
+        parser.error("--feature-store needs the Keras model, not a TensorFlow Lite export")
+    if args.feature_store and args.cascade:
+        parser.error("--feature-store and --cascade cannot be combined")
+    if args.near_duplicates_index and args.near_duplicates is None:
+        parser.error("--near-duplicates-index needs --near-duplicates")
+    if args.feature_store and args.near_duplicates is not None:
+        parser.error("--feature-store and --near-duplicates cannot be combined")
+    
     # Check if model file exists
     if not os.path.exists(args.model):
         print(f"Error: Model file '{args.model}' not found.")
@@ -131,32 +656,102 @@ def main():
         print("or specify the correct path using --model argument.")
         sys.exit(1)
     
+    # Keep status messages out of machine-readable output on stdout
+    machine_output = args.format != 'text'
+    status = sys.stderr if machine_output else sys.stdout
+    
+    # Per-stage timings for --profile
+    stages = Histogram('predict_stage_seconds', 'Time per pipeline stage', ('stage',)) \
+        if args.profile else None
+    started = time.perf_counter()
+    
     # Load the model
-    model = load_model(args.model)
+    with contextlib.redirect_stdout(status):
+        # The feature store splits the Keras model, so it cannot use the cached copy
+        model = load_model(args.model, use_cache=not args.feature_store)
+        if args.cascade:
+            try:
+                model = CascadeModel(load_model(args.cascade), model, *args.cascade_band)
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+        near_duplicates = None
+        if args.near_duplicates is not None:
+            try:
+                near_duplicates = NearDuplicateIndex(args.near_duplicates,
+                                                     args.near_duplicates_memory)
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            if args.near_duplicates_index:
+                index_tag = near_duplicate_tag(args)
+                if os.path.exists(args.near_duplicates_index):
+                    loaded = near_duplicates.load(args.near_duplicates_index, index_tag)
+                    if loaded is None:
+                        print(f"Near-duplicate index: {args.near_duplicates_index} holds "
+                              f"predictions of a different model; starting empty")
+                    else:
+                        print(f"Near-duplicate index: {loaded} prediction(s) loaded from "
+                              f"{args.near_duplicates_index}")
+    load_seconds = time.perf_counter() - started
     
-    print(f"\nMaking predictions on {len(args.images)} image(s)...")
-    print("-" * 60)
+    print(f"\nMaking predictions (batch size {args.batch_size})...", file=status)
+    print("-" * 60, file=status)
     
-    # Process each image
-    for image_path in args.images:
-        if not os.path.exists(image_path):
-            print(f"❌ Image not found: {image_path}")
-            continue
-        
-        result = predict_image(model, image_path)
-        
-        if result is None:
-            print(f"❌ Failed to process: {image_path}")
-            continue
-        
-        # Display results
-        class_emoji = "🐱" if result['predicted_class'] == 'cat' else "🐶"
-        confidence_percent = result['confidence'] * 100
-        
-        print(f"{class_emoji} {os.path.basename(image_path)}")
-        print(f"   Prediction: {result['predicted_class'].upper()}")
-        print(f"   Confidence: {confidence_percent:.1f}%")
-        print()
+    # Resumable job: skip images already recorded in the progress index
+    progress = ProgressIndex(args.job) if args.job else None
+    if progress is not None:
+        print(f"Job {args.job}: {len(progress)} image(s) already classified", file=status)
+    
+    appending = False
+    if args.output == '-':
+        output = contextlib.nullcontext(sys.stdout)
+    else:
+        mode = 'a' if progress is not None else 'w'
+        appending = mode == 'a' and os.path.exists(args.output) and os.path.getsize(args.output) > 0
+        output = open(args.output, mode, newline='', encoding='utf-8')
+    
+    # Decode in parallel and predict a batch at a time, writing each batch
+    # as soon as it finishes so memory stays flat on very large runs
+    with output as stream, (progress or contextlib.nullcontext()):
+        # Resumed CSV output already has its header row
+        writer_options = {'header': not appending} if args.format == 'csv' else {}
+        writer = RESULT_WRITERS[args.format](stream, **writer_options)
+        image_paths = iter_image_paths(args.images)
+        if progress is not None:
+            image_paths = progress.pending(image_paths)
+        if args.feature_store:
+            # Imported here: the feature store needs full TensorFlow
+            from features import EmbeddingClassifier
+            classifier = EmbeddingClassifier(model.model, args.feature_store)
+            batches = iter_embedding_result_batches(classifier, image_paths, args.batch_size,
+                                                    args.workers, stages=stages)
+        else:
+            batches = iter_result_batches(model, image_paths, args.batch_size, args.workers,
+                                          stages=stages, near_duplicates=near_duplicates)
+        image_count = 0
+        run_started = time.perf_counter()
+        for results in batches:
+            image_count += len(results)
+            with timed(stages, 'write'):
+                writer.write_batch(results)
+            # Record only after the batch is written, so a crash can repeat
+            # a batch in the output but never lose one
+            if progress is not None:
+                progress.record_batch(results)
+    
+    if near_duplicates is not None:
+        stats = near_duplicates.stats()
+        print(f"Near-duplicates: {stats['hits']} of {stats['hits'] + stats['misses']} image(s) "
+              f"reused an earlier prediction", file=status)
+        if args.near_duplicates_index:
+            near_duplicates.save(args.near_duplicates_index, index_tag)
+            print(f"Near-duplicate index: {stats['entries']} prediction(s) saved to "
+                  f"{args.near_duplicates_index}", file=status)
+    
+    if stages is not None:
+        print(f"\nModel load: {load_seconds:.2f}s", file=sys.stderr)
+        print_profile(stages, time.perf_counter() - run_started, image_count)
 
 
 if __name__ == "__main__":
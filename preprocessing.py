@@ -0,0 +1,134 @@
+"""
+Image preprocessing shared by the prediction CLI, the Flask backend and the
+training/feature tools, so every path feeds the model identical tensors.
+
+JPEGs are decoded in draft mode: libjpeg scales the image down by 1/2, 1/4
+or 1/8 while decoding, so a 12-megapixel phone photo never gets fully
+decoded just to end up as 128x128. Other formats are shrunk with
+``reduce()`` before the final resize. Pixels are normalized to [0, 1] in
+float32, in place where a buffer is supplied, unless the model was exported
+with the scaling folded into its graph and takes raw uint8 pixels.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+# Model input size (width, height)
+IMAGE_SIZE = (128, 128)
+
+# resize() first shrinks by an integer factor with reduce() until the image
+# is within this factor of the target, then resamples
+REDUCING_GAP = 2.0
+
+
+def open_image(source):
+    """
+    Open an image from a path, raw bytes, a file-like object or a PIL image.
+
+    Returns:
+        PIL.Image.Image: Lazily decoded image
+    """
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # BytesIO shares the bytes object's buffer instead of copying it
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def load_image(source, target_size=IMAGE_SIZE, out=None):
+    """
+    Decode an image and resize it to the model input size, without normalizing.
+
+    Args:
+        source: Path, raw bytes, file-like object or PIL image
+        target_size (tuple): Target size (width, height)
+        out (numpy.ndarray): Optional uint8 (height, width, 3) slot of a batch
+            buffer to decode into
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (height, width, 3)
+    """
+    opened = open_image(source)
+    try:
+        image = opened
+        # Let libjpeg decode at a reduced scale that is still >= target_size
+        if image.format == 'JPEG':
+            image.draft('RGB', target_size)
+
+        # Convert to RGB if needed (handles RGBA, grayscale, palette, etc.)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        image = image.resize(target_size, reducing_gap=REDUCING_GAP)
+
+        if out is None:
+            return np.asarray(image, dtype=np.uint8)
+        out[...] = np.asarray(image, dtype=np.uint8)
+        return out
+    finally:
+        # Only close files opened here, not images handed in by the caller
+        if opened is not source:
+            opened.close()
+
+
+def normalize(images, out=None):
+    """
+    Scale uint8 pixels to float32 values in [0, 1].
+
+    Args:
+        images (numpy.ndarray): uint8 image or batch of images
+        out (numpy.ndarray): Optional float32 buffer of the same shape to
+            write into, avoiding a new allocation
+
+    Returns:
+        numpy.ndarray: float32 array
+    """
+    # Divide in float32, exactly like the notebook's x / 255 on float tensors
+    return np.divide(images, np.float32(255.0), out=out, dtype=np.float32)
+
+
+def to_model_input(images, dtype=np.float32, out=None):
+    """
+    Turn uint8 pixels into what the model takes.
+
+    Models exported with in-graph rescaling (see export_model.py) take raw
+    uint8 pixels, so no host-side conversion is needed; other models take
+    float32 values normalized to [0, 1].
+
+    Args:
+        images (numpy.ndarray): uint8 image or batch of images
+        dtype: Input dtype of the model (uint8 or float32)
+        out (numpy.ndarray): Optional buffer of that dtype to write into
+
+    Returns:
+        numpy.ndarray: Array of the requested dtype
+    """
+    if np.dtype(dtype) == np.uint8:
+        if out is None:
+            return images
+        out[...] = images
+        return out
+    return normalize(images, out=out)
+
+
+def preprocess(source, target_size=IMAGE_SIZE, dtype=np.float32):
+    """
+    Decode, resize and normalize one image into a model input batch.
+
+    Args:
+        source: Path, raw bytes, file-like object or PIL image
+        target_size (tuple): Target size (width, height)
+        dtype: Input dtype of the model; uint8 skips normalization
+
+    Returns:
+        numpy.ndarray: Array of shape (1, height, width, 3)
+    """
+    return to_model_input(load_image(source, target_size)[np.newaxis], dtype)
+
+
+def allocate_batch(batch_size, target_size=IMAGE_SIZE, dtype=np.float32):
+    """Allocate a (batch_size, height, width, 3) buffer for a batch of images."""
+    return np.empty((batch_size, target_size[1], target_size[0], 3), dtype=dtype)
@@ -0,0 +1,98 @@
+"""
+On-disk progress index for resumable bulk classification jobs.
+
+Completed predictions are recorded in a small SQLite file, one row per image
+holding its whole result record as JSON, committed after every batch. When a
+job is restarted with the same index, images that already have a result are
+skipped before they are decoded.
+"""
+
+import json
+import sqlite3
+
+# SQLite caps the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+class ProgressIndex:
+    """SQLite record of the images a bulk job has already classified."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): SQLite file to create or reopen
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # WAL keeps per-batch commits cheap and safe against crashes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " image_path TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL)"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _completed(self, image_paths):
+        """Return the subset of ``image_paths`` that already has a result."""
+        placeholders = ','.join('?' * len(image_paths))
+        rows = self.conn.execute(
+            f"SELECT image_path FROM results WHERE image_path IN ({placeholders})",
+            image_paths,
+        )
+        return {row[0] for row in rows}
+
+    def pending(self, image_paths):
+        """
+        Filter out images that were already classified, preserving order.
+
+        Args:
+            image_paths (iterable): Candidate image paths
+
+        Yields:
+            str: Paths that still need a prediction
+        """
+        chunk = []
+        for image_path in image_paths:
+            chunk.append(image_path)
+            if len(chunk) == _QUERY_CHUNK:
+                done = self._completed(chunk)
+                yield from (path for path in chunk if path not in done)
+                chunk = []
+        if chunk:
+            done = self._completed(chunk)
+            yield from (path for path in chunk if path not in done)
+
+    def record_batch(self, results):
+        """
+        Store the successful results of one batch and commit.
+
+        Results carrying an 'error' key are not recorded, so those images
+        are retried when the job is resumed.
+        """
+        rows = [(result['image_path'], json.dumps(result))
+                for result in results if 'error' not in result]
+        if rows:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?)", rows
+                )
+
+    def iter_results(self):
+        """Yield every recorded result as a dict, in the order they were stored."""
+        rows = self.conn.execute("SELECT result FROM results ORDER BY rowid")
+        for (result,) in rows:
+            yield json.loads(result)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Quantized Export
+
+Converts the trained Keras model to a post-training quantized TensorFlow
+Lite model. predict.py and the backend load .tflite files transparently
+(--model my_model.tflite / MODEL_PATH=../my_model.tflite).
+
+Modes:
+    dynamic  int8 weights, float activations; no calibration data (~4x smaller)
+    float16  float16 weights; no calibration data (~2x smaller)
+    int8     int8 weights and activations, calibrated on sample images;
+             input and output stay float32 (or uint8 for models exported
+             with export_model.py), so callers do not change
+
+With --eval-dir, the float and quantized models are run over a held-out
+class-folder set and the accuracy delta is reported.
+
+Usage: python quantize_model.py [--mode dynamic|float16|int8] [--calibration-dir DIR] [--eval-dir DIR]
+"""
+
+import sys
+import os
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from inference import CompiledModel, TFLiteModel
+from predict import iter_image_paths, list_labeled_images, predict_batches
+from preprocessing import preprocess
+
+QUANTIZATION_MODES = ('dynamic', 'float16', 'int8')
+
+
+def representative_dataset(model, image_paths, samples=200, seed=0):
+    """
+    Build the calibration generator for full-integer quantization.
+
+    Args:
+        model (CompiledModel): Model being converted, for its input size and dtype
+        image_paths (list): Candidate calibration images
+        samples (int): Number of images to calibrate on
+        seed (int): Seed for picking the sample
+
+    Returns:
+        callable: Generator function yielding one-image input lists
+    """
+    rng = np.random.default_rng(seed)
+    if len(image_paths) > samples:
+        image_paths = [image_paths[i] for i in sorted(rng.choice(len(image_paths), samples, replace=False))]
+
+    def generate():
+        for image_path in image_paths:
+            try:
+                yield [preprocess(image_path, model.image_size, model.input_dtype)]
+            except Exception as e:
+                print(f"Skipping calibration image {image_path}: {e}")
+
+    return generate
+
+
+def quantize(model, mode='dynamic', calibration_data=None):
+    """
+    Convert a Keras model to a post-training quantized TensorFlow Lite model.
+
+    Args:
+        model (CompiledModel): Model to convert
+        mode (str): One of QUANTIZATION_MODES
+        calibration_data (callable): Representative dataset, required for int8
+
+    Returns:
+        bytes: The serialized .tflite model
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}'")
+
+    # The Keras input keeps its dynamic batch dimension, so the interpreter
+    # can be resized to whatever batch size the caller sends
+    converter = tf.lite.TFLiteConverter.from_keras_model(model.model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        if calibration_data is None:
+            raise ValueError("int8 quantization needs calibration images")
+        converter.representative_dataset = calibration_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def compare_accuracy(reference, quantized, image_paths, labels, batch_size=32):
+    """
+    Run both models over a labeled set and compare their accuracy.
+
+    Args:
+        reference: Float model (CompiledModel)
+        quantized: Quantized model (TFLiteModel)
+        image_paths (list): Held-out images
+        labels (numpy.ndarray): 0/1 labels for ``image_paths``
+        batch_size (int): Images per forward pass
+
+    Returns:
+        dict: Accuracy of each model, their delta, agreement rate and
+        per-image latency
+
+    Raises:
+        ValueError: If no image could be scored by both models
+    """
+    report = {}
+    outputs = {}
+    for name, model in (('float', reference), ('quantized', quantized)):
+        start = time.perf_counter()
+        results = list(predict_batches(model, image_paths, batch_size))
+        elapsed = time.perf_counter() - start
+        ok = np.array(['error' not in result for result in results])
+        raw = np.array([result.get('raw_prediction', np.nan) for result in results],
+                       dtype=np.float32)
+        outputs[name] = (ok, raw)
+        report[f'{name}_ms_per_image'] = 1000 * elapsed / max(len(image_paths), 1)
+
+    ok = outputs['float'][0] & outputs['quantized'][0]
+    if not ok.any():
+        raise ValueError(f"None of the {len(image_paths)} evaluation images could be scored "
+                         f"by both models")
+    float_raw, quant_raw = outputs['float'][1][ok], outputs['quantized'][1][ok]
+    y = labels[ok]
+    float_pred, quant_pred = float_raw > 0.5, quant_raw > 0.5
+    report.update({
+        'images': int(ok.sum()),
+        'float_accuracy': float(np.mean(float_pred == y)),
+        'quantized_accuracy': float(np.mean(quant_pred == y)),
+        'agreement': float(np.mean(float_pred == quant_pred)),
+        'max_abs_difference': float(np.max(np.abs(float_raw - quant_raw))),
+    })
+    report['accuracy_delta'] = report['quantized_accuracy'] - report['float_accuracy']
+    return report
+
+
+def main():
+    """Main function to handle command line arguments and quantize the model."""
+    parser = argparse.ArgumentParser(
+        description='Export a post-training quantized TensorFlow Lite model.'
+    )
+    parser.add_argument(
+        '--model',
+        default='my_model.keras',
+        help='Trained Keras model to quantize (default: my_model.keras)'
+    )
+    parser.add_argument(
+        '--output',
+        default='my_model.tflite',
+        help='Where to save the quantized model (default: my_model.tflite)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=QUANTIZATION_MODES,
+        default='dynamic',
+        help='Quantization scheme (default: dynamic)'
+    )
+    parser.add_argument(
+        '--calibration-dir',
+        nargs='+',
+        default=None,
+        help='Image files, directories or glob patterns to calibrate int8 activations on'
+    )
+    parser.add_argument(
+        '--calibration-samples',
+        type=int,
+        default=200,
+        help='Number of calibration images to use (default: 200)'
+    )
+    parser.add_argument(
+        '--eval-dir',
+        default=None,
+        help='Held-out directory with one folder per class (e.g. cats/, dogs/) '
+             'to compare float and quantized accuracy on'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=32,
+        help='Images per forward pass during evaluation (default: 32)'
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Error: Model file '{args.model}' not found.")
+        sys.exit(1)
+    if args.mode == 'int8' and not args.calibration_dir:
+        parser.error("--mode int8 needs --calibration-dir")
+
+    reference = CompiledModel(tf.keras.models.load_model(args.model))
+
+    calibration_data = None
+    if args.mode == 'int8':
+        calibration_paths = list(iter_image_paths(args.calibration_dir))
+        if not calibration_paths:
+            print("Error: No calibration images found.")
+            sys.exit(1)
+        print(f"Calibrating on up to {args.calibration_samples} of {len(calibration_paths)} images")
+        calibration_data = representative_dataset(reference, calibration_paths,
+                                                  args.calibration_samples)
+
+    tflite_model = quantize(reference, args.mode, calibration_data)
+    with open(args.output, 'wb') as f:
+        f.write(tflite_model)
+    original_size = os.path.getsize(args.model)
+    print(f"Saved {args.mode} quantized model to {args.output} "
+          f"({len(tflite_model) / 1e6:.1f} MB, was {original_size / 1e6:.1f} MB)")
+
+    if args.eval_dir:
+        image_paths, labels, class_names = list_labeled_images(args.eval_dir)
+        if not image_paths:
+            print(f"Error: No images found in {args.eval_dir}")
+            sys.exit(1)
+        print(f"\nEvaluating on {len(image_paths)} images ({', '.join(class_names)})...")
+        try:
+            report = compare_accuracy(reference, TFLiteModel(args.output), image_paths, labels,
+                                      args.batch_size)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print("-" * 60)
+        print(f"Float accuracy:      {report['float_accuracy']:.2%}")
+        print(f"Quantized accuracy:  {report['quantized_accuracy']:.2%}")
+        print(f"Accuracy delta:      {report['accuracy_delta']:+.2%}")
+        print(f"Prediction agreement: {report['agreement']:.2%}")
+        print(f"Max output difference: {report['max_abs_difference']:.4f}")
+        print(f"Latency: {report['float_ms_per_image']:.1f} ms/image float, "
+              f"{report['quantized_ms_per_image']:.1f} ms/image quantized")
+
+
+if __name__ == "__main__":
+    main()
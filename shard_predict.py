@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Sharded Bulk Classification
+
+Spreads a bulk classification run over every core of one or more machines
+with no coordinating service. The input (files, directories, globs and/or
+a manifest listing one path per line) is split into N shards by a hash of
+each image path. The split is deterministic, so every node computes the same
+shards from the same input and can take its own part of them:
+
+    node 0:  python shard_predict.py run /archive --shard 0-7/16 --output-dir results
+    node 1:  python shard_predict.py run /archive --shard 8-15/16 --output-dir results
+    then:    python shard_predict.py merge results --output all.jsonl
+
+On each node, a pool of worker processes each loads the model once and works
+through the node's shards with the batched, parallel-decode pipeline from
+predict.py. A shard is written to results/shard-00003-of-00016.jsonl, and the
+file only appears once the shard is complete: every image classified, unless
+--allow-failures accepts images that could not be read. Re-running the same
+command skips finished shards, so a crashed or pre-empted node, or one that
+hit a transient read error, just runs it again.
+
+Every node must see the images under the same paths (e.g. a shared mount),
+since the paths decide the shards.
+
+Usage: python shard_predict.py run <inputs> [--manifest FILE] [--shard I/N] [--processes P] [--allow-failures] --output-dir DIR
+       python shard_predict.py merge <output_dir> --output FILE
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+import multiprocessing
+import re
+import shutil
+import time
+
+from artifacts import ModelArtifact, ModelArtifactError, resolve_model_path
+from predict import RESULT_WRITERS, iter_image_paths, iter_result_batches
+
+# Output formats that can be merged by concatenation
+SHARD_FORMATS = ('jsonl', 'csv')
+
+SHARD_FILE = re.compile(r'^shard-(\d{5})-of-(\d{5})\.(jsonl|csv)$')
+
+
+def shard_of(image_path, num_shards):
+    """Return the shard an image belongs to; the same on every machine and every run."""
+    digest = hashlib.blake2b(image_path.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % num_shards
+
+
+def parse_shard_spec(spec):
+    """
+    Parse a shard selection such as '3/16', '0-7/16', '0,4,8/16' or '*/16'.
+
+    Returns:
+        tuple: (sorted shard indices, total number of shards)
+    """
+    selection, _, total = spec.partition('/')
+    try:
+        num_shards = int(total)
+        if selection == '*':
+            indices = set(range(num_shards))
+        else:
+            indices = set()
+            for part in selection.split(','):
+                first, _, last = part.partition('-')
+                indices.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Bad shard spec '{spec}' (expected e.g. 3/16, 0-7/16 or */16)")
+    if num_shards < 1 or not indices or min(indices) < 0 or max(indices) >= num_shards:
+        raise argparse.ArgumentTypeError(f"Shard spec '{spec}' selects shards outside 0-{num_shards - 1}")
+    return sorted(indices), num_shards
+
+
+def shard_file(output_dir, index, num_shards, fmt):
+    """Path of the result file for one shard."""
+    return os.path.join(output_dir, f'shard-{index:05d}-of-{num_shards:05d}.{fmt}')
+
+
+def read_manifest(path):
+    """Read image paths from a manifest file, one per line; blank lines and '#' comments are skipped."""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def partition(image_paths, indices, num_shards):
+    """Group the image paths of the selected shards, keeping input order within each shard."""
+    shards = {index: [] for index in indices}
+    for image_path in image_paths:
+        shard = shard_of(image_path, num_shards)
+        if shard in shards:
+            shards[shard].append(image_path)
+    return shards
+
+
+# State of a worker process: its model, loaded once by _init_worker()
+_worker = {}
+
+
+def _init_worker(model_path, num_threads):
+    artifact = ModelArtifact(model_path)
+    if num_threads and not artifact.serves_tflite:
+        # Split the cores between processes before TensorFlow starts its thread pools
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    _worker['model'] = artifact.load(num_threads=num_threads)
+
+
+def run_shard(task):
+    """
+    Classify one shard in a worker process and write its result file.
+
+    The results go to a '.partial' file that is renamed when the shard is
+    complete, so a result file is never half-written. If images failed and
+    failures are not allowed, the '.partial' file (with their errors) is
+    left behind instead and the shard runs again next time.
+
+    Args:
+        task (tuple): (shard index, number of shards, image paths, output
+            directory, format, batch size, decoder threads, allow failures)
+
+    Returns:
+        tuple: (shard index, images classified, images that failed, seconds)
+    """
+    index, num_shards, image_paths, output_dir, fmt, batch_size, workers, allow_failures = task
+    path = shard_file(output_dir, index, num_shards, fmt)
+    partial_path = path + '.partial'
+    start = time.perf_counter()
+    classified = failed = 0
+    with open(partial_path, 'w', newline='', encoding='utf-8') as stream:
+        writer = RESULT_WRITERS[fmt](stream)
+        for results in iter_result_batches(_worker['model'], image_paths, batch_size, workers):
+            writer.write_batch(results)
+            errors = sum('error' in result for result in results)
+            failed += errors
+            classified += len(results) - errors
+    if allow_failures or not failed:
+        os.replace(partial_path, path)
+    return index, classified, failed, time.perf_counter() - start
+
+
+def run(args):
+    """Classify the selected shards on this machine."""
+    indices, num_shards = args.shard
+    try:
+        # Verify the model (and build its cached copy) once, before any worker starts
+        ModelArtifact(args.model).prepare()
+    except ModelArtifactError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    inputs = list(args.inputs)
+    for manifest in args.manifest or ():
+        inputs.extend(read_manifest(manifest))
+    if not inputs:
+        print("Error: No inputs given (pass files, directories, globs or --manifest).")
+        sys.exit(1)
+    shards = partition(iter_image_paths(inputs), indices, num_shards)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    tasks, done = [], 0
+    for index, image_paths in shards.items():
+        if os.path.exists(shard_file(args.output_dir, index, num_shards, args.format)):
+            done += 1
+        else:
+            tasks.append((index, num_shards, image_paths, args.output_dir, args.format,
+                          args.batch_size, args.workers, args.allow_failures))
+    total_images = sum(len(task[2]) for task in tasks)
+    print(f"Shards {len(indices)}/{num_shards} selected: {done} already done, "
+          f"{len(tasks)} to run ({total_images} images) on {args.processes} process(es)")
+    if not tasks:
+        return
+
+    # The biggest shards start first, so no process is left with a long one at the end
+    tasks.sort(key=lambda task: len(task[2]), reverse=True)
+    num_threads = max(1, (os.cpu_count() or 1) // args.processes)
+    # Spawned workers start clean; forking after TensorFlow has started is unsafe
+    context = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    classified = failed = 0
+    incomplete = []
+    with context.Pool(args.processes, initializer=_init_worker,
+                      initargs=(args.model, num_threads)) as pool:
+        for finished, (index, ok, errors, seconds) in enumerate(
+                pool.imap_unordered(run_shard, tasks), 1):
+            classified += ok
+            failed += errors
+            rate = (ok + errors) / seconds if seconds > 0 else 0.0
+            status = 'done'
+            if errors and not args.allow_failures:
+                status = 'incomplete'
+                incomplete.append(index)
+            print(f"Shard {index}/{num_shards} {status}: {ok} classified, {errors} failed, "
+                  f"{rate:.1f} images/s ({finished}/{len(tasks)})")
+    elapsed = time.perf_counter() - start
+    print(f"Classified {classified} images ({failed} failed) in {elapsed:.1f}s "
+          f"({(classified + failed) / elapsed:.1f} images/s)")
+    if incomplete:
+        print(f"Error: {len(incomplete)} shard(s) had images that failed and were not marked "
+              f"done; their errors are in the .partial files in {args.output_dir}. Run again "
+              f"to retry them, or add --allow-failures to accept the failures.")
+        sys.exit(1)
+
+
+def merge(args):
+    """Concatenate the shard result files of a run into one output file."""
+    found = {}
+    for name in os.listdir(args.output_dir):
+        match = SHARD_FILE.match(name)
+        if match:
+            found.setdefault((int(match.group(2)), match.group(3)), {})[int(match.group(1))] = name
+    if not found:
+        print(f"Error: No shard result files in {args.output_dir}")
+        sys.exit(1)
+    if len(found) > 1:
+        runs = ', '.join(f'{count} shards as {fmt}' for count, fmt in sorted(found))
+        print(f"Error: {args.output_dir} mixes results of different runs ({runs})")
+        sys.exit(1)
+
+    (num_shards, fmt), files = next(iter(found.items()))
+    missing = sorted(set(range(num_shards)) - set(files))
+    if missing:
+        print(f"{'Warning' if args.allow_partial else 'Error'}: {len(missing)} of {num_shards} "
+              f"shard(s) not finished: {', '.join(map(str, missing[:20]))}"
+              f"{' ...' if len(missing) > 20 else ''}")
+        if not args.allow_partial:
+            sys.exit(1)
+
+    tmp_path = args.output + '.partial'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as out:
+        for position, index in enumerate(sorted(files)):
+            with open(os.path.join(args.output_dir, files[index]), newline='', encoding='utf-8') as f:
+                # Every CSV shard starts with the header; keep only the first
+                if fmt == 'csv' and position:
+                    f.readline()
+                shutil.copyfileobj(f, out)
+    os.replace(tmp_path, args.output)
+    print(f"Merged {len(files)} shard(s) into {args.output}")
+
+
+def main():
+    """Main function to handle command line arguments and run or merge a sharded job."""
+    parser = argparse.ArgumentParser(
+        description='Classify many images across processes and machines, one shard at a time.'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Classify some or all shards on this machine')
+    run_parser.add_argument('inputs', nargs='*',
+                            help='Image file(s), directories or glob patterns to classify')
+    run_parser.add_argument('--manifest', action='append',
+                            help='File listing image paths, one per line (may be repeated)')
+    run_parser.add_argument('--shard', type=parse_shard_spec, default=parse_shard_spec('*/16'),
+                            help="Shards to run out of the total, e.g. 3/16, 0-7/16 or */16 (default: */16)")
+    run_parser.add_argument('--output-dir', required=True,
+                            help='Directory for the per-shard result files')
+    run_parser.add_argument('--model', default=None,
+                            help='Path to the trained model file (default: $MODEL_PATH, else my_model.keras)')
+    run_parser.add_argument('--format', choices=SHARD_FORMATS, default='jsonl',
+                            help='Result format (default: jsonl)')
+    run_parser.add_argument('--processes', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                            help='Worker processes, each with its own model (default: half the CPUs)')
+    run_parser.add_argument('--batch-size', type=int, default=32,
+                            help='Number of images per forward pass (default: 32)')
+    run_parser.add_argument('--workers', type=int, default=2,
+                            help='Image decoding threads per process (default: 2)')
+    run_parser.add_argument('--allow-failures', action='store_true',
+                            help='Mark a shard done even if some of its images could not be '
+                                 'classified (they get an error entry in the results)')
+
+    merge_parser = commands.add_parser('merge', help='Combine the shard result files into one')
+    merge_parser.add_argument('output_dir', help='Directory holding the per-shard result files')
+    merge_parser.add_argument('--output', required=True, help='Combined result file to write')
+    merge_parser.add_argument('--allow-partial', action='store_true',
+                              help='Merge even if some shards are not finished')
+
+    args = parser.parse_args()
+
+    if args.command == 'merge':
+        merge(args)
+        return
+    if args.processes < 1 or args.batch_size < 1:
+        parser.error("--processes and --batch-size must be at least 1")
+    args.model = resolve_model_path(args.model, default='my_model.keras')
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Shared fixtures: the project root and backend/ are importable, as the scripts expect."""
+
+import io
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+from batching import BatchScheduler  # noqa: E402
+
+
+def photo(seed, size=(320, 240)):
+    """A photo-like RGB image: smooth random colour fields, different for every seed."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize(size, Image.BICUBIC)
+
+
+def encode(image, fmt='JPEG', **options):
+    """Encode a PIL image to bytes."""
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def jpeg_bytes():
+    return encode(photo(0))
+
+
+class FakeModel:
+    """Predictor stand-in scoring each image by its mean brightness and counting the images it saw."""
+
+    image_size = (128, 128)
+    input_dtype = np.dtype(np.float32)
+
+    def __init__(self):
+        self.images = 0
+        # Clear to hold every forward pass until it is set again
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, images):
+        self.release.wait(10)
+        self.images += len(images)
+        return images.mean(axis=(1, 2, 3)).reshape(-1, 1)
+
+
+@pytest.fixture
+def fake_app(monkeypatch):
+    """The backend app serving a FakeModel through a running batch scheduler, with no caches."""
+    import app
+    model = FakeModel()
+    batcher = BatchScheduler(model, max_wait_ms=1, on_batch=app.record_batch)
+    batcher.start()
+    monkeypatch.setattr(app, 'infer', model)
+    monkeypatch.setattr(app, 'batcher', batcher)
+    monkeypatch.setattr(app, 'prediction_cache', None)
+    monkeypatch.setattr(app, 'near_duplicates', None)
+    yield app
+    model.release.set()
+    batcher.stop(timeout=5)
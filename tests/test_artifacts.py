@@ -0,0 +1,59 @@
+"""Model checksums: MODEL_SHA256 covers the MODEL_PATH model only; other files use their own."""
+
+import hashlib
+
+import pytest
+
+from artifacts import DEFAULT_MODEL_PATH, ModelArtifact, ModelArtifactError, configured_sha256
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    main = tmp_path / 'main.tflite'
+    other = tmp_path / 'fast.tflite'
+    main.write_bytes(b'main model')
+    other.write_bytes(b'fast model')
+    monkeypatch.setenv('MODEL_PATH', str(main))
+    monkeypatch.setenv('MODEL_SHA256', hashlib.sha256(b'main model').hexdigest())
+    monkeypatch.delenv('MODEL_CACHE_DIR', raising=False)
+    return main, other
+
+
+def test_model_sha256_verifies_the_model_path_model(models):
+    main, _ = models
+    assert ModelArtifact().verify() == hashlib.sha256(b'main model').hexdigest()
+    assert ModelArtifact(str(main)).verify() == hashlib.sha256(b'main model').hexdigest()
+
+
+def test_model_sha256_mismatch_is_refused(models, monkeypatch):
+    monkeypatch.setenv('MODEL_SHA256', '0' * 64)
+    with pytest.raises(ModelArtifactError) as error:
+        ModelArtifact().verify()
+    assert error.value.status == 'checksum_mismatch'
+
+
+def test_model_sha256_does_not_apply_to_other_files(models):
+    _, other = models
+    # No checksum of its own: not hashed, not refused
+    assert ModelArtifact(str(other)).verify() is None
+
+
+def test_other_files_use_their_sidecar_or_explicit_checksum(models):
+    _, other = models
+    other_digest = hashlib.sha256(b'fast model').hexdigest()
+    (other.parent / 'fast.tflite.sha256').write_text(f'{"f" * 64}  fast.tflite\n')
+    with pytest.raises(ModelArtifactError):
+        ModelArtifact(str(other)).verify()
+    assert ModelArtifact(str(other), sha256=other_digest).verify() == other_digest
+
+
+def test_model_sha256_governs_the_default_model_without_model_path(models, monkeypatch):
+    _, other = models
+    monkeypatch.delenv('MODEL_PATH')
+    digest = hashlib.sha256(b'main model').hexdigest()
+    assert configured_sha256(DEFAULT_MODEL_PATH) == digest
+    # The command line tools resolve the default relative to the working directory
+    monkeypatch.chdir(other.parent)
+    assert configured_sha256('my_model.keras') == digest
+    assert configured_sha256(str(other)) is None
+    assert ModelArtifact(str(other)).verify() is None
@@ -0,0 +1,54 @@
+"""Load shedding: a full batch queue or a worker at MAX_IN_FLIGHT answers 503."""
+
+import io
+import threading
+
+import numpy as np
+import pytest
+
+from batching import BatchScheduler, QueueFull
+
+
+def test_submit_raises_queue_full_at_max_queue_size():
+    scheduler = BatchScheduler(lambda images: images, max_queue_size=2)
+    image = np.zeros((4, 4, 3), dtype=np.float32)
+    scheduler.submit(image)
+    scheduler.submit(image)
+    with pytest.raises(QueueFull):
+        scheduler.submit(image)
+
+
+def test_requests_beyond_max_in_flight_get_503(fake_app, monkeypatch, jpeg_bytes):
+    monkeypatch.setattr(fake_app, 'MAX_IN_FLIGHT', 2)
+    # Hold every forward pass until released
+    fake_app.infer.release.clear()
+    statuses = []
+
+    def post():
+        response = fake_app.app.test_client().post(
+            '/predict', data={'image': (io.BytesIO(jpeg_bytes), 'a.jpg')})
+        statuses.append(response.status_code)
+
+    # Two requests take both slots and wait on the blocked model
+    admitted = [threading.Thread(target=post) for _ in range(2)]
+    for thread in admitted:
+        thread.start()
+    for _ in range(200):
+        if fake_app.in_flight == 2:
+            break
+        threading.Event().wait(0.01)
+    assert fake_app.in_flight == 2
+
+    # Everything else is turned away at once, while /health still answers
+    overloaded = fake_app.ERRORS.value('overloaded')
+    for _ in range(3):
+        post()
+    assert statuses == [503, 503, 503]
+    assert fake_app.ERRORS.value('overloaded') == overloaded + 3
+    assert fake_app.app.test_client().get('/health').status_code == 200
+
+    fake_app.infer.release.set()
+    for thread in admitted:
+        thread.join(10)
+    assert sorted(statuses) == [200, 200, 503, 503, 503]
+    assert fake_app.in_flight == 0
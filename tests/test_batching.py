@@ -0,0 +1,67 @@
+"""Micro-batching: queued requests share forward passes, each caller gets its own answer."""
+
+import numpy as np
+import pytest
+
+from batching import BatchScheduler
+
+
+def image(value):
+    return np.full((4, 4, 3), value, dtype=np.float32)
+
+
+def test_queued_requests_run_in_batches_of_at_most_max_batch_size():
+    batch_sizes = []
+
+    def model(images):
+        batch_sizes.append(len(images))
+        return images.mean(axis=(1, 2, 3))
+
+    scheduler = BatchScheduler(model, max_batch_size=4, max_wait_ms=50)
+    # Queued before the worker starts, so batches fill deterministically
+    futures = [scheduler.submit(image(i)) for i in range(10)]
+    scheduler.start()
+    try:
+        assert [future.result(5) for future in futures] == [float(i) for i in range(10)]
+    finally:
+        scheduler.stop(timeout=5)
+    assert batch_sizes == [4, 4, 2]
+
+
+def test_multi_output_rows_are_returned_whole():
+    scheduler = BatchScheduler(lambda images: np.stack([images[:, 0, 0, 0], np.ones(len(images))], 1))
+    scheduler.start()
+    try:
+        np.testing.assert_array_equal(scheduler.predict(image(0.25)[np.newaxis], timeout=5), [0.25, 1.0])
+    finally:
+        scheduler.stop(timeout=5)
+
+
+def test_model_error_reaches_every_caller_and_on_batch():
+    reports = []
+
+    def model(images):
+        raise RuntimeError('model failed')
+
+    scheduler = BatchScheduler(model, max_batch_size=8,
+                               on_batch=lambda size, waits, seconds, error: reports.append((size, error)))
+    futures = [scheduler.submit(image(i)) for i in range(3)]
+    scheduler.start()
+    try:
+        for future in futures:
+            with pytest.raises(RuntimeError, match='model failed'):
+                future.result(5)
+    finally:
+        scheduler.stop(timeout=5)
+    assert [size for size, _ in reports] == [3]
+    assert isinstance(reports[0][1], RuntimeError)
+
+
+def test_submit_rejects_multi_image_batches_and_stopped_schedulers():
+    scheduler = BatchScheduler(lambda images: images)
+    with pytest.raises(ValueError):
+        scheduler.submit(np.zeros((2, 4, 4, 3), dtype=np.float32))
+    scheduler.start()
+    scheduler.stop(timeout=5)
+    with pytest.raises(RuntimeError):
+        scheduler.submit(image(0))
@@ -0,0 +1,88 @@
+"""Prediction cache: LRU eviction, TTL, the shared SQLite store and model tags."""
+
+import cache
+from cache import PredictionCache, content_key
+
+
+def test_least_recently_used_entry_is_evicted():
+    predictions = PredictionCache(max_entries=2)
+    predictions.put('a', {'score': 1})
+    predictions.put('b', {'score': 2})
+    assert predictions.get('a') == {'score': 1}
+    predictions.put('c', {'score': 3})
+
+    assert predictions.get('b') is None
+    assert predictions.get('a') == {'score': 1}
+    assert predictions.get('c') == {'score': 3}
+    assert predictions.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    predictions = PredictionCache(ttl_seconds=60)
+    predictions.put('a', {'score': 1})
+    now[0] += 59
+    assert predictions.get('a') == {'score': 1}
+    now[0] += 2
+    assert predictions.get('a') is None
+
+
+def test_workers_share_entries_through_the_sqlite_file(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    first = PredictionCache(shared_path=path)
+    second = PredictionCache(shared_path=path)
+    first.put('a', {'score': 1})
+    assert second.get('a') == {'score': 1}
+
+
+def test_keys_differ_per_model_tag():
+    data = b'same upload'
+    assert content_key(data) != content_key(data, 'model-a')
+    assert content_key(data, 'model-a') != content_key(data, 'model-b')
+
+
+def test_shared_store_deletes_expired_and_surplus_rows(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    monkeypatch.setattr(cache, 'PRUNE_EVERY', 4)
+    path = str(tmp_path / 'cache.sqlite')
+    predictions = PredictionCache(ttl_seconds=100, shared_path=path, max_shared_entries=3)
+
+    def rows():
+        return [key for (key,) in predictions._shared.execute(
+            "SELECT key FROM predictions ORDER BY stored_at")]
+
+    for i in range(4):
+        predictions.put(f'old{i}', {'score': i})
+        now[0] += 1
+    # The fourth write pruned down to the newest three
+    assert rows() == ['old1', 'old2', 'old3']
+
+    now[0] += 200
+    for i in range(4):
+        predictions.put(f'new{i}', {'score': i})
+    # The expired rows went with the next prune, the cap still holds
+    assert rows() == ['new1', 'new2', 'new3']
+    assert predictions.stats()['shared_evictions'] == 5
+
+    # Opening the file prunes rows left by an earlier run
+    now[0] += 200
+    assert PredictionCache(ttl_seconds=100, shared_path=path)._shared.execute(
+        "SELECT COUNT(*) FROM predictions").fetchone() == (0,)
+
+
+def test_backend_cache_tag_follows_the_model_file(tmp_path, monkeypatch):
+    import app
+    from artifacts import ModelArtifact
+    tags = []
+    for content in (b'model v1', b'model v2', b'model v1'):
+        path = tmp_path / 'model.tflite'
+        path.write_bytes(content)
+        monkeypatch.setattr(app, 'model_artifact', ModelArtifact(str(path), cache_dir=''))
+        tags.append(app.model_cache_tag(None))
+    assert tags[0] != tags[1]
+    assert tags[0] == tags[2]
+    # A dummy model's predictions are never shared
+    app.model_artifact.status = 'dummy'
+    assert app.model_cache_tag(None) != app.model_cache_tag(None)
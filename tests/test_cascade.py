@@ -0,0 +1,154 @@
+"""Confidence cascade: band routing, per-stage input, trade-off table and loading in the backend."""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+import artifacts
+from artifacts import ModelArtifact
+from cascade import CascadeModel, cascade_tradeoff
+
+
+class FakePredictor:
+    """Predictor stand-in returning fixed scores and remembering what it was called on."""
+
+    def __init__(self, scores, input_dtype=np.float32, image_size=(128, 128)):
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.input_dtype = np.dtype(input_dtype)
+        self.image_size = image_size
+        self.calls = []
+
+    def __call__(self, images):
+        self.calls.append(images)
+        # Each image carries its row index in its first pixel
+        rows = np.asarray(images[:, 0, 0, 0], dtype=np.float32)
+        if self.input_dtype != np.uint8:
+            rows = np.rint(rows * 255)
+        return self.scores[rows.astype(int)].reshape(-1, 1)
+
+    def warmup(self, batch_sizes=(1,)):
+        return self
+
+
+def indexed_batch(count, dtype=np.uint8):
+    images = np.zeros((count, 128, 128, 3), dtype=np.uint8)
+    images[:, 0, 0, 0] = np.arange(count)
+    if dtype == np.uint8:
+        return images
+    return images.astype(np.float32) / 255
+
+
+def test_only_scores_strictly_inside_the_band_reach_the_full_model():
+    fast = FakePredictor([0.05, 0.5, 0.95, 0.1, 0.9])
+    full = FakePredictor([0.0, 0.7, 1.0, 0.0, 1.0])
+    cascade = CascadeModel(fast, full, low=0.1, high=0.9)
+
+    out = cascade(indexed_batch(5, np.float32))
+
+    assert len(full.calls) == 1 and len(full.calls[0]) == 1
+    np.testing.assert_allclose(out[:, 0], [0.05, 0.7, 0.95, 0.1, 0.9])
+    np.testing.assert_array_equal(out[:, 1], [0, 1, 0, 0, 0])
+
+
+def test_confident_batch_never_runs_the_full_model():
+    fast = FakePredictor([0.01, 0.99])
+    full = FakePredictor([0.5, 0.5])
+    out = CascadeModel(fast, full)(indexed_batch(2, np.float32))
+    assert full.calls == []
+    np.testing.assert_array_equal(out[:, 1], [0, 0])
+
+
+def test_stages_with_different_input_dtypes_share_a_uint8_batch():
+    fast = FakePredictor([0.5, 0.02], input_dtype=np.float32)
+    full = FakePredictor([0.8, 0.0], input_dtype=np.uint8)
+    cascade = CascadeModel(fast, full)
+    assert cascade.input_dtype == np.uint8
+
+    out = cascade(indexed_batch(2, np.uint8))
+
+    assert fast.calls[0].dtype == np.float32 and fast.calls[0].max() <= 1.0
+    assert full.calls[0].dtype == np.uint8
+    np.testing.assert_allclose(out[:, 0], [0.8, 0.02])
+
+
+def test_stages_must_take_the_same_image_size():
+    with pytest.raises(ValueError):
+        CascadeModel(FakePredictor([0.5], image_size=(64, 64)), FakePredictor([0.5]))
+    with pytest.raises(ValueError):
+        CascadeModel(FakePredictor([0.5]), FakePredictor([0.5]), low=0.8, high=0.2)
+
+
+def test_tradeoff_counts_fast_share_accuracy_and_compute():
+    labels = np.array([0, 1, 1, 0])
+    fast = np.array([0.02, 0.6, 0.97, 0.7])
+    full = np.array([0.1, 0.9, 0.9, 0.2])
+    loose, strict = cascade_tradeoff(labels, fast, full, fast_seconds=0.001,
+                                     full_seconds=0.01, thresholds=[0.5, 0.95])
+    # Threshold 0.5: the fast model answers everything, and gets image 3 wrong
+    assert loose['fast_share'] == 1.0
+    assert loose['accuracy'] == 0.75
+    assert loose['relative_compute'] == pytest.approx(0.1)
+    # Threshold 0.95: images 1 and 3 go to the full model, which gets them right
+    assert strict['band'] == pytest.approx([0.05, 0.95])
+    assert strict['fast_share'] == 0.5
+    assert strict['accuracy'] == 1.0
+    assert strict['ms_per_image'] == pytest.approx(1 + 0.5 * 10)
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    import app
+    main = tmp_path / 'main.tflite'
+    fast = tmp_path / 'fast.tflite'
+    main.write_bytes(b'main model')
+    fast.write_bytes(b'fast model')
+    monkeypatch.setenv('MODEL_PATH', str(main))
+    monkeypatch.setenv('MODEL_SHA256', hashlib.sha256(b'main model').hexdigest())
+    monkeypatch.delenv('MODEL_CACHE_DIR', raising=False)
+    monkeypatch.setattr(artifacts, 'load_predictor',
+                        lambda path, *args, **kwargs: FakePredictor([0.5]))
+    full = FakePredictor([0.5])
+    monkeypatch.setattr(app, 'infer', full)
+    return app, full, str(fast)
+
+
+def test_cascade_loads_when_model_sha256_is_set_for_the_main_model(backend, monkeypatch):
+    app, full, fast_path = backend
+    monkeypatch.setattr(app, 'cascade_artifact', ModelArtifact(fast_path, cache_dir=''))
+
+    served = app.load_cascade(full)
+
+    assert isinstance(served, CascadeModel)
+    assert app.cascade_error is None
+
+
+def test_cascade_checksum_failure_is_reported_on_health(backend, monkeypatch):
+    app, full, fast_path = backend
+    monkeypatch.setattr(app, 'cascade_artifact',
+                        ModelArtifact(fast_path, cache_dir='', sha256='0' * 64))
+
+    served = app.load_cascade(full)
+    response = app.app.test_client().get('/health')
+
+    assert served is full
+    body = response.get_json()
+    assert body['status'] == 'degraded'
+    assert body['cascade']['enabled'] is False
+    assert 'Checksum mismatch' in body['cascade']['error']
+    assert body['cascade']['model']['status'] == 'checksum_mismatch'
+    monkeypatch.setattr(app, 'cascade_error', None)
+
+
+def test_cache_tag_covers_the_fast_model_and_the_band(backend, monkeypatch):
+    app, full, fast_path = backend
+    monkeypatch.setattr(app, 'model_artifact', ModelArtifact(cache_dir=''))
+    monkeypatch.setattr(app, 'cascade_artifact', ModelArtifact(fast_path, cache_dir=''))
+    fast = FakePredictor([0.5])
+
+    tags = {app.model_cache_tag(full),
+            app.model_cache_tag(CascadeModel(fast, full, 0.1, 0.9)),
+            app.model_cache_tag(CascadeModel(fast, full, 0.2, 0.8))}
+
+    assert len(tags) == 3
+    assert app.model_cache_tag(CascadeModel(fast, full, 0.1, 0.9)) in tags
@@ -0,0 +1,66 @@
+"""evaluate.py metrics against a direct per-threshold and pairwise computation."""
+
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from evaluate import evaluate_scores, roc_auc
+
+# Ties between classes and scores exactly on sweep thresholds included
+LABELS = np.array([0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 0])
+SCORES = np.array([0.05, 0.3, 0.5, 0.5, 0.72, 0.5, 0.61, 0.8, 0.9, 0.99, 0.3, 0.2])
+
+
+def direct_metrics(labels, scores, threshold):
+    predicted = scores > threshold
+    tp = int(np.sum(predicted & (labels == 1)))
+    fp = int(np.sum(predicted & (labels == 0)))
+    fn = int(np.sum(~predicted & (labels == 1)))
+    tn = int(np.sum(~predicted & (labels == 0)))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'accuracy': (tp + tn) / len(labels),
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'confusion_matrix': [[tn, fp], [fn, tp]],
+    }
+
+
+def direct_roc_auc(labels, scores):
+    pairs = list(itertools.product(scores[labels == 1], scores[labels == 0]))
+    return sum(1.0 if p > n else 0.5 if p == n else 0.0 for p, n in pairs) / len(pairs)
+
+
+@pytest.mark.parametrize('threshold', [0.0, 0.3, 0.5, 0.6, 0.75, 1.0])
+def test_headline_metrics_and_confusion_matrix_at_threshold(threshold):
+    report = evaluate_scores(LABELS, SCORES, threshold=threshold)
+    expected = direct_metrics(LABELS, SCORES, threshold)
+
+    assert report['images'] == len(LABELS)
+    assert report['confusion_matrix'] == expected.pop('confusion_matrix')
+    for name, value in expected.items():
+        assert report[name] == pytest.approx(value), name
+
+
+def test_sweep_covers_every_threshold_and_finds_the_best():
+    report = evaluate_scores(LABELS, SCORES, sweep_steps=21)
+
+    assert [row['threshold'] for row in report['sweep']] == pytest.approx(np.linspace(0, 1, 21))
+    for row in report['sweep']:
+        expected = direct_metrics(LABELS, SCORES, row['threshold'])
+        for name in ('accuracy', 'precision', 'recall', 'f1'):
+            assert row[name] == pytest.approx(expected[name]), (row['threshold'], name)
+    for name in ('accuracy', 'f1'):
+        assert report[f'best_{name}']['value'] == max(row[name] for row in report['sweep'])
+
+
+def test_roc_auc_counts_ties_as_half():
+    assert roc_auc(LABELS, SCORES) == pytest.approx(direct_roc_auc(LABELS, SCORES))
+    assert roc_auc(np.array([0, 1]), np.array([0.2, 0.8])) == 1.0
+    assert roc_auc(np.array([0, 1]), np.array([0.8, 0.2])) == 0.0
+    assert roc_auc(np.array([0, 1, 0, 1]), np.full(4, 0.5)) == 0.5
+    assert math.isnan(roc_auc(np.array([1, 1]), np.array([0.2, 0.8])))
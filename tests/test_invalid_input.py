@@ -0,0 +1,52 @@
+"""Undecodable uploads are client errors: HTTP 400 with a JSON error, not a server failure."""
+
+import base64
+import io
+
+import pytest
+
+
+@pytest.mark.parametrize('body', [b'not an image at all', 'truncated'])
+def test_v2_predict_rejects_undecodable_bodies_with_400(fake_app, jpeg_bytes, body):
+    if body == 'truncated':
+        body = jpeg_bytes[:len(jpeg_bytes) // 3]
+    decode_errors = fake_app.ERRORS.value('decode')
+
+    response = fake_app.app.test_client().post('/v2/predict', data=body, content_type='image/jpeg')
+
+    assert response.status_code == 400
+    assert 'Could not decode image' in response.get_json()['error']
+    # Counted as a 400 request, not as a server-side decode failure
+    assert fake_app.ERRORS.value('decode') == decode_errors
+
+
+def test_multipart_upload_gets_400(fake_app):
+    response = fake_app.app.test_client().post(
+        '/predict', data={'image': (io.BytesIO(b'garbage'), 'a.jpg')})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('prefix', ['data:image/jpeg;base64,', ''])
+def test_base64_image_with_or_without_data_prefix(fake_app, jpeg_bytes, prefix):
+    image = prefix + base64.b64encode(jpeg_bytes).decode()
+    response = fake_app.app.test_client().post('/predict_base64', json={'image': image})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('image', [
+    'data:image/jpeg;base64,' + base64.b64encode(b'garbage').decode(),
+    'abc',  # incorrect padding
+])
+def test_bad_base64_images_get_400(fake_app, image):
+    response = fake_app.app.test_client().post('/predict_base64', json={'image': image})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_valid_upload_still_succeeds(fake_app, jpeg_bytes):
+    response = fake_app.app.test_client().post('/v2/predict', data=jpeg_bytes,
+                                               content_type='image/jpeg')
+    assert response.status_code == 200
+    assert response.get_json()['predicted_class'] in ('cat', 'dog')
+    assert fake_app.infer.images == 1
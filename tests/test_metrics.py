@@ -0,0 +1,69 @@
+"""Prometheus text exposition: the metrics module's format and the backend's /metrics endpoint."""
+
+import io
+
+from metrics import CONTENT_TYPE, Registry
+
+
+def test_counter_gauge_and_histogram_render_in_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ('route', 'status'))
+    registry.gauge('queue_depth', 'Queued images', lambda: 3)
+    registry.gauge('cache_entries', 'Omitted without a cache', lambda: None)
+    latency = registry.histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1.0))
+    requests.inc('/predict', 200)
+    requests.inc('/predict', 200)
+    requests.inc('/say "hi"', 500)
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, 'decode')
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{route="/predict",status="200"} 2',
+        'requests_total{route="/say \\"hi\\"",status="500"} 1',
+        '# HELP queue_depth Queued images',
+        '# TYPE queue_depth gauge',
+        'queue_depth 3',
+        '# HELP cache_entries Omitted without a cache',
+        '# TYPE cache_entries gauge',
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{stage="decode",le="0.1"} 1',
+        'latency_seconds_bucket{stage="decode",le="1"} 2',
+        'latency_seconds_bucket{stage="decode",le="+Inf"} 3',
+        'latency_seconds_sum{stage="decode"} 5.55',
+        'latency_seconds_count{stage="decode"} 3',
+    ]
+
+
+def sample(text, name):
+    """Value of the exposition line starting with ``name`` (a metric name plus its labels)."""
+    for line in text.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_metrics_endpoint_reports_requests_stages_and_batches(fake_app, jpeg_bytes):
+    http = fake_app.app.test_client()
+    before = http.get('/metrics').get_data(as_text=True)
+
+    response = http.post('/predict', data={'image': (io.BytesIO(jpeg_bytes), 'cat.jpg')},
+                         content_type='multipart/form-data')
+    assert response.status_code == 200
+    response = http.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert '# TYPE classifier_stage_duration_seconds histogram' in text
+    requests = 'classifier_http_requests_total{route="/predict",method="POST",status="200"}'
+    assert sample(text, requests) == sample(before, requests) + 1
+    for stage in ('decode', 'preprocess', 'queue_wait', 'inference', 'serialize'):
+        count = f'classifier_stage_duration_seconds_count{{stage="{stage}"}}'
+        assert sample(text, count) > sample(before, count)
+    assert sample(text, 'classifier_batch_size_count') == sample(before, 'classifier_batch_size_count') + 1
+    assert sample(text, 'classifier_model_loaded') == 1
@@ -0,0 +1,128 @@
+"""Near-duplicate reuse: dHash, the multi-index search, eviction, saving, and copies within a batch."""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from cache import PredictionCache
+from conftest import FakeModel, encode, photo
+from near_duplicates import ENTRY_BYTES, TABLE_BYTES, NearDuplicateIndex, dhash, hamming_distance
+from predict import iter_result_batches
+
+
+def decoded(image):
+    return np.asarray(image.convert('RGB').resize((128, 128)))
+
+
+def test_dhash_survives_resizing_and_reencoding():
+    original = photo(1)
+    copy = Image.open(io.BytesIO(encode(original.resize((200, 150)), 'JPEG', quality=60)))
+    assert hamming_distance(dhash(decoded(original)), dhash(decoded(copy))) <= 4
+    assert hamming_distance(dhash(decoded(original)), dhash(decoded(photo(2)))) > 8
+    assert dhash(np.full((128, 128, 3), 120, dtype=np.uint8)) is None
+
+
+@pytest.mark.parametrize('max_distance', [0, 3, 4, 7, 10])
+def test_find_matches_brute_force_search(max_distance):
+    rng = np.random.default_rng(max_distance)
+    stored = rng.integers(0, 1 << 63, size=2000, dtype=np.int64).astype(np.uint64).tolist()
+    index = NearDuplicateIndex(max_distance=max_distance, max_memory_mb=4)
+    for position, image_hash in enumerate(stored):
+        index.add(image_hash, position / len(stored))
+
+    queries = rng.integers(0, 1 << 63, size=50, dtype=np.int64).astype(np.uint64).tolist()
+    for image_hash in stored[:200]:
+        flips = rng.choice(64, size=rng.integers(0, max_distance + 3), replace=False)
+        queries.append(image_hash ^ sum(1 << int(bit) for bit in flips))
+
+    for query in queries:
+        closest = min(hamming_distance(image_hash, query) for image_hash in stored)
+        match = index.find(query)
+        if closest > max_distance:
+            assert match is None
+        else:
+            assert match is not None and match.distance == closest
+
+
+def test_oldest_entries_are_replaced_beyond_the_memory_cap():
+    index = NearDuplicateIndex(max_memory_mb=(TABLE_BYTES + 3 * ENTRY_BYTES) / (1 << 20))
+    assert index.max_entries == 3
+    hashes = [0x0F0F_0F0F_0F0F_0F0F, 0xFFFF_0000_FFFF_0000, 0x1234_5678_9ABC_DEF0,
+              0xAAAA_AAAA_AAAA_AAAA]
+    for score, image_hash in enumerate(hashes):
+        index.add(image_hash, score, stage=score % 2)
+
+    assert len(index) == 3
+    assert index.find(hashes[0]) is None
+    assert index.find(hashes[3]) == (3.0, 1, 0)
+    assert index.stats()['evictions'] == 1
+
+
+def test_saved_index_only_loads_for_the_same_tag(tmp_path):
+    path = str(tmp_path / 'index.npz')
+    index = NearDuplicateIndex()
+    index.add(0x0F0F_0F0F_0F0F_0F0F, 0.25)
+    index.add(0xFFFF_0000_FFFF_0000, 0.75, stage=1)
+    index.save(path, tag='model-a')
+
+    restored = NearDuplicateIndex()
+    assert restored.load(path, tag='model-b') is None
+    assert restored.load(path, tag='model-a') == 2
+    assert restored.find(0xFFFF_0000_FFFF_0000) == (0.75, 1, 0)
+    assert restored.find(0x0F0F_0F0F_0F0F_0F0F).stage is None
+
+
+def test_copies_within_one_batch_are_classified_once(tmp_path):
+    paths = []
+    for name, image in [('a.jpg', photo(1)), ('b.jpg', photo(2)),
+                        ('a_small.png', photo(1).resize((160, 120))),
+                        ('a_again.jpg', photo(1))]:
+        path = tmp_path / name
+        path.write_bytes(encode(image, 'PNG' if name.endswith('.png') else 'JPEG'))
+        paths.append(str(path))
+    model = FakeModel()
+    index = NearDuplicateIndex(max_distance=4)
+
+    batches = list(iter_result_batches(model, paths, batch_size=8, workers=1,
+                                       near_duplicates=index))
+
+    results = [result for batch in batches for result in batch]
+    assert [result['image_path'] for result in results] == paths
+    assert model.images == 2
+    original = results[0]
+    for copy in results[2:]:
+        assert copy['raw_prediction'] == original['raw_prediction']
+        assert copy['near_duplicate_distance'] <= 4
+    assert 'near_duplicate_distance' not in results[1]
+    assert index.stats()['hits'] == 2
+    assert len(index) == 2
+
+
+def test_copies_within_one_batch_request_are_classified_once(fake_app, monkeypatch):
+    monkeypatch.setattr(fake_app, 'near_duplicates', NearDuplicateIndex(max_distance=4))
+    images = [encode(photo(1)), encode(photo(1).resize((160, 120)), 'PNG'), encode(photo(2))]
+
+    results = fake_app.classify_many(images)
+
+    assert fake_app.infer.images == 2
+    assert results[1]['raw_prediction'] == results[0]['raw_prediction']
+    assert results[1]['cached'] is False and results[1]['near_duplicate_distance'] <= 4
+    assert results[0]['cached'] is False and results[2]['cached'] is False
+
+
+def test_near_duplicate_answers_stay_out_of_the_exact_cache(fake_app, monkeypatch):
+    monkeypatch.setattr(fake_app, 'near_duplicates', NearDuplicateIndex(max_distance=4))
+    monkeypatch.setattr(fake_app, 'prediction_cache', PredictionCache(max_entries=10))
+    original, copy = encode(photo(1)), encode(photo(1).resize((160, 120)), 'PNG')
+
+    first = fake_app.classify_image_bytes(original)
+    reused = [fake_app.classify_image_bytes(copy), fake_app.classify_many([copy])[0]]
+    repeat = fake_app.classify_image_bytes(original)
+
+    assert fake_app.infer.images == 1
+    assert first['cached'] is False and repeat['cached'] is True
+    for result in reused:
+        assert result['cached'] is False and result['near_duplicate_distance'] <= 4
+    assert fake_app.prediction_cache.stats()['entries'] == 1
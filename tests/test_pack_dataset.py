@@ -0,0 +1,76 @@
+"""Packed datasets: what pack_dataset.py writes is what PackedSplit.iter_batches() reads back."""
+
+import json
+import sys
+
+import numpy as np
+import pytest
+
+import pack_dataset
+from conftest import encode, photo
+from pack_dataset import PackedDataset
+from preprocessing import load_image, to_model_input
+
+SIZE = (32, 24)
+
+
+@pytest.fixture
+def packed(tmp_path, monkeypatch):
+    """A train split of 6 cats and 5 dogs (plus one broken file) packed into shards of 4."""
+    data = tmp_path / 'data'
+    for class_name, count, first_seed in (('cats', 6, 0), ('dogs', 5, 100)):
+        (data / 'train' / class_name).mkdir(parents=True)
+        for i in range(count):
+            path = data / 'train' / class_name / f'{i}.jpg'
+            path.write_bytes(encode(photo(first_seed + i)))
+    (data / 'train' / 'dogs' / 'broken.jpg').write_bytes(b'not an image')
+    output = tmp_path / 'packed'
+    monkeypatch.setattr(sys, 'argv', ['pack_dataset.py', str(data), str(output), '--shard-size', '4',
+                                      '--image-size', str(SIZE[0]), str(SIZE[1]), '--workers', '2'])
+    pack_dataset.main()
+    return output
+
+
+def test_pack_then_iter_batches_round_trips_pixels_and_labels(packed):
+    meta = json.loads((packed / 'meta.json').read_text())
+    assert meta['class_names'] == ['cats', 'dogs']
+    assert meta['splits']['train']['failed'][0].endswith('broken.jpg')
+    split = PackedDataset(str(packed)).split('train')
+    assert len(split) == 11
+    # The broken image's row is dropped from whichever shard it was shuffled into
+    assert sorted(shard['count'] for shard in meta['splits']['train']['shards']) == [3, 4, 4]
+
+    batches = list(split.iter_batches(batch_size=3))
+
+    assert [len(labels) for _, labels in batches] == [3, 3, 3, 2]
+    images = np.concatenate([images for images, _ in batches])
+    labels = np.concatenate([labels for _, labels in batches])
+    sources = split.sources()
+    expected = np.stack([load_image(source, SIZE) for source in sources])
+    np.testing.assert_array_equal(images, expected)
+    np.testing.assert_array_equal(labels, [int('/dogs/' in source) for source in sources])
+
+
+def test_shuffled_batches_cover_every_row_once_and_repeat_with_the_seed(packed):
+    split = PackedDataset(str(packed)).split('train')
+
+    def rows(**options):
+        return [image.tobytes() + bytes([label])
+                for images, labels in split.iter_batches(batch_size=4, **options)
+                for image, label in zip(images, labels)]
+
+    in_order = rows()
+    shuffled = rows(shuffle=True, seed=7)
+    assert shuffled != in_order
+    assert sorted(shuffled) == sorted(in_order)
+    assert rows(shuffle=True, seed=7) == shuffled
+
+
+def test_row_range_and_float_output(packed):
+    split = PackedDataset(str(packed)).split('train')
+
+    images, labels = next(split.iter_batches(batch_size=16, start=2, stop=9, dtype=np.float32))
+
+    assert images.dtype == np.float32 and images.shape == (7, SIZE[1], SIZE[0], 3)
+    np.testing.assert_array_equal(images, to_model_input(split.images(np.arange(2, 9))))
+    np.testing.assert_array_equal(labels, split.labels[2:9])
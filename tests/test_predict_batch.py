@@ -0,0 +1,45 @@
+"""Multi-image requests: one result per image in input order, per-image errors, and the size limit."""
+
+import io
+import struct
+
+from conftest import encode, photo
+
+
+def test_results_keep_input_order_with_per_image_errors(fake_app):
+    images = [encode(photo(1)), b'not an image', encode(photo(2), 'PNG')]
+    response = fake_app.app.test_client().post('/predict_batch', data={
+        'images': [(io.BytesIO(data), f'{i}.img') for i, data in enumerate(images)]})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == 3 and body['errors'] == 1
+    assert [result['index'] for result in body['results']] == [0, 1, 2]
+    assert [result['filename'] for result in body['results']] == ['0.img', '1.img', '2.img']
+    assert 'error' in body['results'][1]
+    # Each valid image got its own score (the fake model scores brightness)
+    single = [fake_app.app.test_client().post('/v2/predict', data=data, content_type='image/jpeg')
+              .get_json()['raw_prediction'] for data in (images[0], images[2])]
+    assert [body['results'][0]['raw_prediction'], body['results'][2]['raw_prediction']] == single
+    assert fake_app.infer.images == 4
+
+
+def test_framed_binary_body(fake_app):
+    images = [encode(photo(3)), encode(photo(4))]
+    body = b''.join(struct.pack('>I', len(data)) + data for data in images)
+    response = fake_app.app.test_client().post('/predict_batch', data=body,
+                                               content_type='application/x-image-batch')
+    assert response.status_code == 200
+    assert [result['index'] for result in response.get_json()['results']] == [0, 1]
+
+    response = fake_app.app.test_client().post('/predict_batch', data=body[:-10],
+                                               content_type='application/x-image-batch')
+    assert response.status_code == 400
+
+
+def test_too_many_images_get_413(fake_app, monkeypatch, jpeg_bytes):
+    monkeypatch.setattr(fake_app, 'PREDICT_BATCH_MAX_IMAGES', 2)
+    response = fake_app.app.test_client().post('/predict_batch', data={
+        'images': [(io.BytesIO(jpeg_bytes), f'{i}.jpg') for i in range(3)]})
+    assert response.status_code == 413
+    assert fake_app.infer.images == 0
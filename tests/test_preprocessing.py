@@ -0,0 +1,40 @@
+"""Server and CLI feed the model identical tensors for the same file."""
+
+import numpy as np
+import pytest
+
+from conftest import encode, photo
+from predict import iter_result_batches, preprocess_image
+
+
+class RecordingModel:
+    """Keeps every batch it is given, scoring each image 0.5."""
+
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, images):
+        self.inputs.append(images.copy())
+        return np.full((len(images), 1), 0.5, dtype=np.float32)
+
+
+@pytest.mark.parametrize('name, image, fmt', [
+    # Large enough for JPEG draft-mode decoding to kick in
+    ('large.jpg', photo(1, size=(1600, 1200)), 'JPEG'),
+    ('odd.jpg', photo(2, size=(333, 127)), 'JPEG'),
+    ('alpha.png', photo(3).convert('RGBA'), 'PNG'),
+    ('gray.png', photo(4).convert('L'), 'PNG'),
+])
+def test_server_single_and_batch_paths_agree(fake_app, tmp_path, name, image, fmt):
+    path = tmp_path / name
+    path.write_bytes(encode(image, fmt))
+
+    served = fake_app.decode_image_bytes(path.read_bytes())
+    single = preprocess_image(str(path))
+    model = RecordingModel()
+    list(iter_result_batches(model, [str(path)], batch_size=4, workers=1))
+
+    assert served.shape == (1, 128, 128, 3) and served.dtype == np.float32
+    np.testing.assert_array_equal(served, single)
+    np.testing.assert_array_equal(served, model.inputs[0])
+    assert 0.0 <= served.min() and served.max() <= 1.0
@@ -0,0 +1,62 @@
+"""Resumable bulk jobs: the SQLite progress index skips finished images and retries failed ones."""
+
+import csv
+import io
+
+from predict import CsvWriter
+from progress import ProgressIndex
+
+
+def result(path, score=0.9):
+    return {'image_path': path, 'predicted_class': 'dog' if score > 0.5 else 'cat',
+            'confidence': max(score, 1 - score), 'raw_prediction': score}
+
+
+def test_resumed_job_only_runs_unfinished_images_in_order(tmp_path):
+    path = str(tmp_path / 'progress.sqlite')
+    # More paths than one lookup query holds
+    paths = [f'img{i:04d}.jpg' for i in range(1200)]
+    with ProgressIndex(path) as index:
+        index.record_batch([result(p) for p in paths[:700]])
+        index.record_batch([result(paths[700]),
+                            {'image_path': paths[701], 'error': 'cannot identify image'}])
+
+    # A new process reopens the file, as after a crash
+    with ProgressIndex(path) as index:
+        assert len(index) == 701
+        assert list(index.pending(paths)) == paths[701:]
+        assert [row['image_path'] for row in index.iter_results()] == paths[:701]
+
+
+def test_rerecorded_image_keeps_its_latest_result(tmp_path):
+    with ProgressIndex(str(tmp_path / 'progress.sqlite')) as index:
+        index.record_batch([result('a.jpg', 0.2), result('b.jpg', 0.75)])
+        index.record_batch([result('a.jpg', 0.3)])
+        # A replaced row is stored again, so it moves to the end
+        assert list(index.iter_results()) == [result('b.jpg', 0.75), result('a.jpg', 0.3)]
+
+
+def test_csv_appended_on_resume_has_no_second_header():
+    stream = io.StringIO()
+    CsvWriter(stream).write_batch([result('a.jpg')])
+    CsvWriter(stream, header=False).write_batch([result('b.jpg')])
+    lines = stream.getvalue().splitlines()
+    assert lines[0].startswith('image_path,')
+    assert [line.split(',')[0] for line in lines[1:]] == ['a.jpg', 'b.jpg']
+
+
+def test_whole_result_record_is_kept(tmp_path):
+    # Extra keys, such as which model stage answered, survive a resume
+    record = dict(result('a.jpg'), stage='fast', near_duplicate_distance=2)
+    with ProgressIndex(str(tmp_path / 'progress.sqlite')) as index:
+        index.record_batch([record])
+    with ProgressIndex(str(tmp_path / 'progress.sqlite')) as index:
+        assert list(index.iter_results()) == [record]
+
+
+def test_csv_keeps_stage_and_near_duplicate_distance():
+    stream = io.StringIO()
+    CsvWriter(stream).write_batch([dict(result('a.jpg'), stage='fast'),
+                                   dict(result('b.jpg'), stage='full', near_duplicate_distance=2)])
+    rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert [(row['stage'], row['near_duplicate_distance']) for row in rows] == [('fast', ''), ('full', '2')]
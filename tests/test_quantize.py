@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from conftest import FakeModel, encode, photo
+from quantize_model import compare_accuracy
+
+
+def test_compare_accuracy_scores_images_both_models_read(tmp_path):
+    paths = []
+    for seed in range(3):
+        path = tmp_path / f'{seed}.jpg'
+        path.write_bytes(encode(photo(seed), 'JPEG'))
+        paths.append(str(path))
+    (tmp_path / 'broken.jpg').write_bytes(b'not an image')
+    paths.append(str(tmp_path / 'broken.jpg'))
+
+    report = compare_accuracy(FakeModel(), FakeModel(), paths, np.array([0, 1, 0, 1]))
+
+    assert report['images'] == 3
+    assert report['agreement'] == 1.0
+    assert report['max_abs_difference'] == 0.0
+
+
+def test_compare_accuracy_rejects_an_unreadable_eval_set(tmp_path):
+    paths = [str(tmp_path / 'missing.jpg'), str(tmp_path / 'gone.jpg')]
+    with pytest.raises(ValueError, match='None of the 2 evaluation images'):
+        compare_accuracy(FakeModel(), FakeModel(), paths, np.array([0, 1]))
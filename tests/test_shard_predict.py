@@ -0,0 +1,94 @@
+"""Sharded runs: deterministic shard hashing, shard specs, partitioning, merging and failed images."""
+
+import argparse
+import os
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import shard_predict
+from conftest import FakeModel, encode, photo
+from shard_predict import merge, parse_shard_spec, partition, run_shard, shard_file, shard_of
+
+
+def test_shard_of_is_stable_and_spreads_paths():
+    paths = [f'/archive/{i:05d}.jpg' for i in range(4000)]
+    shards = [shard_of(path, 16) for path in paths]
+    # Nodes and reruns must agree, so the split never depends on the process
+    assert [shard_of(path, 16) for path in paths[:2]] == [4, 11]
+    assert shard_of('cats/tom.png', 16) == 9
+    counts = Counter(shards)
+    assert set(counts) == set(range(16))
+    assert max(counts.values()) < 1.3 * len(paths) / 16
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('3/16', ([3], 16)),
+    ('0-3/8', ([0, 1, 2, 3], 8)),
+    ('0,4,6-7/8', ([0, 4, 6, 7], 8)),
+    ('*/4', ([0, 1, 2, 3], 4)),
+])
+def test_parse_shard_spec(spec, expected):
+    assert parse_shard_spec(spec) == expected
+
+
+@pytest.mark.parametrize('spec', ['16/16', 'x/4', '3', '-1/4', '2-1/4'])
+def test_parse_shard_spec_rejects_bad_specs(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard_spec(spec)
+
+
+def test_partition_keeps_input_order_within_the_selected_shards():
+    paths = [f'img{i}.jpg' for i in range(200)]
+    shards = partition(paths, [1, 3], 4)
+    assert set(shards) == {1, 3}
+    for index, members in shards.items():
+        assert members == [path for path in paths if shard_of(path, 4) == index]
+
+
+def write_shard(output_dir, index, num_shards, fmt, lines):
+    with open(shard_file(output_dir, index, num_shards, fmt), 'w', encoding='utf-8') as f:
+        f.writelines(line + '\n' for line in lines)
+
+
+def test_merge_keeps_one_csv_header_in_shard_order(tmp_path):
+    header = 'image_path,predicted_class,confidence,raw_prediction'
+    write_shard(tmp_path, 1, 2, 'csv', [header, 'b.jpg,dog,0.9,0.9'])
+    write_shard(tmp_path, 0, 2, 'csv', [header, 'a.jpg,cat,0.8,0.2'])
+    output = tmp_path / 'all.csv'
+
+    merge(SimpleNamespace(output_dir=str(tmp_path), output=str(output), allow_partial=False))
+
+    assert output.read_text().splitlines() == [header, 'a.jpg,cat,0.8,0.2', 'b.jpg,dog,0.9,0.9']
+
+
+def test_merge_refuses_missing_shards_unless_allowed(tmp_path):
+    write_shard(tmp_path, 0, 3, 'jsonl', ['{"image_path": "a.jpg"}'])
+    write_shard(tmp_path, 2, 3, 'jsonl', ['{"image_path": "c.jpg"}'])
+    output = tmp_path / 'all.jsonl'
+    with pytest.raises(SystemExit):
+        merge(SimpleNamespace(output_dir=str(tmp_path), output=str(output), allow_partial=False))
+    assert not output.exists()
+
+    merge(SimpleNamespace(output_dir=str(tmp_path), output=str(output), allow_partial=True))
+    assert len(output.read_text().splitlines()) == 2
+
+
+@pytest.mark.parametrize('allow_failures', [False, True])
+def test_shard_with_failed_images_is_only_done_when_failures_are_allowed(
+        tmp_path, monkeypatch, allow_failures):
+    monkeypatch.setitem(shard_predict._worker, 'model', FakeModel())
+    good = tmp_path / 'good.jpg'
+    good.write_bytes(encode(photo(0)))
+    paths = [str(good), str(tmp_path / 'missing.jpg')]
+    output_dir = tmp_path / 'results'
+    output_dir.mkdir()
+
+    index, classified, failed, _ = run_shard(
+        (0, 1, paths, str(output_dir), 'jsonl', 8, 1, allow_failures))
+
+    assert (classified, failed) == (1, 1)
+    path = shard_file(str(output_dir), 0, 1, 'jsonl')
+    assert os.path.exists(path) == allow_failures
+    assert os.path.exists(path + '.partial') != allow_failures
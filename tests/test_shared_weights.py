@@ -0,0 +1,52 @@
+"""With SHARED_WEIGHTS=1 a worker keeps the model's weights memory-mapped instead of copying them."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+BACKEND = os.path.join(ROOT, 'backend')
+
+# Loads the model the way a serve.py worker does and reports its private memory before and after
+WORKER = """
+import json
+import app
+from procinfo import process_memory
+before = process_memory()
+app.load_model()
+after = process_memory()
+print(json.dumps({'model_status': app.model_artifact.status,
+                  'rss_anon_growth_mb': after['rss_anon_mb'] - before['rss_anon_mb']}))
+"""
+
+
+@pytest.fixture(scope='module')
+def float_model(tmp_path_factory):
+    """A float32 TensorFlow Lite model holding about 30 MB of weights."""
+    tf = pytest.importorskip('tensorflow')
+    inputs = tf.keras.Input((128, 128, 3))
+    x = tf.keras.layers.Conv2D(8, 3, strides=4)(inputs)
+    x = tf.keras.layers.Flatten()(x)
+    x = tf.keras.layers.Dense(1024)(x)
+    outputs = tf.keras.layers.Dense(1, activation='sigmoid')(x)
+    path = tmp_path_factory.mktemp('models') / 'float.tflite'
+    path.write_bytes(tf.lite.TFLiteConverter.from_keras_model(tf.keras.Model(inputs, outputs)).convert())
+    return path
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='needs Linux /proc')
+def test_shared_weights_worker_does_not_copy_the_weights(float_model):
+    env = dict(os.environ, MODEL_PATH=str(float_model), SHARED_WEIGHTS='1',
+               CACHE_MAX_ENTRIES='0', BATCH_MAX_SIZE='1', TF_NUM_THREADS='1')
+    env.pop('MODEL_SHA256', None)
+    env.pop('MODEL_CACHE_DIR', None)
+    output = subprocess.run([sys.executable, '-c', WORKER], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=120, check=True).stdout
+    report = json.loads(output.strip().splitlines()[-1])
+    assert report['model_status'] == 'loaded'
+    model_mb = float_model.stat().st_size / 2**20
+    assert report['rss_anon_growth_mb'] < model_mb / 4
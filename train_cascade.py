@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Cascade First Stage Training
+
+Trains the small, fast first-stage model of the confidence cascade (see
+cascade.py). It takes the same 128x128 float input as the full model, so
+both stages share one preprocessed batch. It first averages the image down
+to 64x64, then runs a few depthwise-separable convolutions, costing a tiny
+fraction of the Xception backbone's compute.
+
+Training data is a class-folder tree like the notebook's (train/cats,
+train/dogs) or a dataset packed by pack_dataset.py. A folder tree is
+packed into a temporary directory first, so every epoch reads decoded pixels.
+
+Afterwards, choose the cascade band with:
+    python evaluate.py <test_dir> --model my_model.keras --cascade fast_model.keras
+
+Usage: python train_cascade.py <train_dir|packed_dir> [--output fast_model.keras] [--epochs 15]
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from cascade import DEFAULT_BAND
+from pack_dataset import PackedDataset, PackedSplit, pack_split
+from predict import list_labeled_images
+from preprocessing import IMAGE_SIZE
+
+
+def build_fast_model(image_size=IMAGE_SIZE):
+    """
+    Build the first-stage classifier.
+
+    Args:
+        image_size (tuple): Input size (width, height), the full model's
+
+    Returns:
+        Keras model: float32 [0, 1] images in, dog probability out
+    """
+    width, height = image_size
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=(height, width, 3)),
+        tf.keras.layers.RandomFlip('horizontal'),
+        tf.keras.layers.AveragePooling2D(2),
+        tf.keras.layers.Conv2D(16, 3, strides=2, padding='same', activation='relu'),
+        tf.keras.layers.SeparableConv2D(32, 3, padding='same', activation='relu'),
+        tf.keras.layers.MaxPooling2D(2),
+        tf.keras.layers.SeparableConv2D(64, 3, padding='same', activation='relu'),
+        tf.keras.layers.MaxPooling2D(2),
+        tf.keras.layers.SeparableConv2D(128, 3, padding='same', activation='relu'),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(1, activation='sigmoid'),
+    ], name='cascade_fast')
+
+
+def open_training_split(train_dir, scratch_dir, workers=None):
+    """
+    Open the training images as a PackedSplit, packing a folder tree into ``scratch_dir`` first.
+
+    Returns:
+        PackedSplit: Training images and labels
+    """
+    if PackedDataset.is_packed(train_dir):
+        return PackedDataset(train_dir).split('train')
+    image_paths, labels, class_names = list_labeled_images(train_dir)
+    print(f"Found {len(image_paths)} images in classes {class_names}; decoding them once")
+    meta = pack_split(image_paths, labels, scratch_dir, IMAGE_SIZE, workers=workers)
+    return PackedSplit(scratch_dir, meta, class_names, IMAGE_SIZE)
+
+
+def main():
+    """Main function to handle command line arguments and train the first-stage model."""
+    parser = argparse.ArgumentParser(
+        description='Train the small first-stage model of the confidence cascade.'
+    )
+    parser.add_argument(
+        'train_dir',
+        help='Training images, one sub-directory per class (e.g. train/cats, train/dogs), '
+             'or a dataset packed by pack_dataset.py'
+    )
+    parser.add_argument('--output', default='fast_model.keras',
+                        help='Where to save the trained model (default: fast_model.keras)')
+    parser.add_argument('--epochs', type=int, default=15, help='Training epochs (default: 15)')
+    parser.add_argument('--batch-size', type=int, default=32, help='Training batch size (default: 32)')
+    parser.add_argument('--learning-rate', type=float, default=1e-3,
+                        help='Adam learning rate (default: 0.001)')
+    parser.add_argument('--validation-split', type=float, default=0.1,
+                        help='Fraction of images held out for validation (default: 0.1)')
+    parser.add_argument('--seed', type=int, default=42, help='Shuffle seed (default: 42)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Image decoding threads when packing a folder tree (default: number of CPUs)')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.train_dir):
+        print(f"Error: Training directory '{args.train_dir}' not found.")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix='cascade-pack-') as scratch_dir:
+        split = open_training_split(args.train_dir, scratch_dir, args.workers)
+        if len(split.class_names) != 2:
+            print(f"Error: Expected 2 classes, found {len(split.class_names)}: {split.class_names}")
+            sys.exit(1)
+
+        # Packed rows are already shuffled, so the first rows make a random validation set
+        n_val = int(len(split) * args.validation_split)
+        train_data = split.as_tf_dataset(args.batch_size, shuffle=True, seed=args.seed, start=n_val)
+        validation_data = split.as_tf_dataset(args.batch_size, stop=n_val) if n_val else None
+
+        model = build_fast_model(split.image_size)
+        model.compile(optimizer=tf.keras.optimizers.Adam(args.learning_rate),
+                      loss='binary_crossentropy',
+                      metrics=['accuracy'])
+        print(f"First-stage model: {model.count_params():,} parameters")
+
+        start_time = time.time()
+        model.fit(train_data, epochs=args.epochs, validation_data=validation_data)
+        print(f'Total time for training {(time.time() - start_time):.3f} seconds')
+
+        if validation_data is not None:
+            scores = model.predict(validation_data, verbose=0).reshape(-1)
+            labels = split.labels[:n_val] == 1
+            low, high = DEFAULT_BAND
+            confident = (scores <= low) | (scores >= high)
+            print(f"Validation accuracy: {np.mean((scores > 0.5) == labels):.4f}")
+            if confident.any():
+                print(f"{confident.mean():.0%} of validation images score outside ({low}, {high}), "
+                      f"with accuracy {np.mean((scores[confident] > 0.5) == labels[confident]):.4f}")
+
+    model.save(args.output)
+    print(f"Model saved to {args.output}")
+    print(f"Choose the band with: python evaluate.py <test_dir> --cascade {args.output}")
+
+
+if __name__ == "__main__":
+    main()
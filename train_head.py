@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Cats and Dogs Image Classifier - Fast Head Training
+
+The Xception backbone is frozen, so its output for a training image never
+changes between epochs. This script pushes every image through the backbone
+once, keeps the 2048-d embeddings in a memory-mapped feature store, and then
+trains only the Dense head over the stored features. The trained head is
+reattached to the backbone and saved as a full model, usable anywhere
+my_model.keras is.
+
+The training images can be a class-folder tree or a dataset packed by
+pack_dataset.py, which skips JPEG decoding entirely.
+
+Usage: python train_head.py <train_dir> [--output my_model.keras] [--epochs 10]
+"""
+
+import sys
+import os
+import functools
+import hashlib
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+from features import EmbeddingClassifier, split_model
+from pack_dataset import PackedDataset
+from predict import list_labeled_images
+from preprocessing import load_image, to_model_input
+
+
+def build_model(base_model=None):
+    """
+    Build the notebook's architecture with a freshly initialised Dense head.
+
+    Args:
+        base_model (str): Optional saved model whose backbone is reused;
+            otherwise an ImageNet-pretrained Xception is used
+
+    Returns:
+        Keras model: Frozen backbone followed by the Dense head
+    """
+    if base_model:
+        pretrained_model, _ = split_model(tf.keras.models.load_model(base_model))
+    else:
+        pretrained_model = tf.keras.applications.xception.Xception(
+            include_top=False,
+            input_shape=(128, 128, 3),
+            weights="imagenet",
+            pooling='max'
+        )
+
+    for layer in pretrained_model.layers:
+        layer.trainable = False
+
+    return tf.keras.models.Sequential([
+        pretrained_model,
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(units=128, activation='relu'),
+        tf.keras.layers.Dense(units=128, activation='relu'),
+        tf.keras.layers.Dense(units=32, activation='relu'),
+        tf.keras.layers.Dense(units=1, activation='sigmoid')
+    ])
+
+
+def extract_features(classifier, image_paths, batch_size=64, workers=None):
+    """
+    Make sure every image has an embedding in the feature store.
+
+    Images already in the store are not decoded again, so re-running
+    (e.g. for a hyperparameter sweep) only costs the hashing.
+
+    Args:
+        classifier (EmbeddingClassifier): Split model with its feature store
+        image_paths (list): Paths to the image files
+        batch_size (int): Number of images per backbone forward pass
+        workers (int): Hashing and decoder threads (default: number of CPUs)
+
+    Returns:
+        tuple: (rows, failed) - store row per usable image (in input order),
+        and the indices of images that could not be processed
+    """
+    decode = functools.partial(load_image, target_size=classifier.image_size)
+    keys, failed = [], []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for start in range(0, len(image_paths), batch_size):
+            chunk = image_paths[start:start + batch_size]
+            _, errors, chunk_keys = classifier.extract(chunk, decode, pool)
+            for i, (image_path, key) in enumerate(zip(chunk, chunk_keys)):
+                if i in errors:
+                    print(f"\nSkipping {image_path}: {errors[i]}")
+                    failed.append(start + i)
+                else:
+                    keys.append(key)
+            print(f"\rExtracted features: {start + len(chunk)}/{len(image_paths)}",
+                  end='', flush=True)
+    print()
+
+    rows = classifier.store.lookup(keys)
+    return np.array(rows, dtype=np.int64), failed
+
+
+def extract_packed_features(classifier, split, batch_size=64):
+    """
+    Make sure every image of a packed split has an embedding in the feature store.
+
+    Packed images are already decoded, so they are keyed by a hash of their
+    pixels, and only images without a stored embedding run through the backbone.
+
+    Args:
+        classifier (EmbeddingClassifier): Split model with its feature store
+        split (PackedSplit): Packed training images
+        batch_size (int): Number of images per backbone forward pass
+
+    Returns:
+        numpy.ndarray: Store row of every image, in split order
+    """
+    keys = []
+    for images, _ in split.iter_batches(batch_size):
+        batch_keys = [hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+                      for image in images]
+        _, missing = classifier.store.get(batch_keys)
+        if missing:
+            inputs = to_model_input(images[missing], classifier.backbone.input_dtype)
+            classifier.store.put([batch_keys[i] for i in missing], classifier.embed(inputs))
+        keys.extend(batch_keys)
+        print(f"\rExtracted features: {len(keys)}/{len(split)}", end='', flush=True)
+    print()
+    return np.array(classifier.store.lookup(keys), dtype=np.int64)
+
+
+def make_dataset(features, rows, labels, batch_size, shuffle, seed):
+    """
+    Stream (features, label) batches out of the memory-mapped store.
+
+    Only row indices are held in the pipeline; each batch is gathered from
+    the memory-mapped array when it is needed, so the feature set does not
+    have to fit in RAM.
+    """
+    feature_dim = features.shape[1]
+
+    def gather(batch_rows):
+        return np.asarray(features[batch_rows], dtype=np.float32)
+
+    dataset = tf.data.Dataset.from_tensor_slices((rows, labels))
+    if shuffle:
+        dataset = dataset.shuffle(len(rows), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+
+    def load(batch_rows, batch_labels):
+        batch_features = tf.numpy_function(gather, [batch_rows], tf.float32)
+        batch_features.set_shape((None, feature_dim))
+        return batch_features, batch_labels
+
+    return dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+
+def main():
+    """Main function to handle command line arguments and train the head."""
+    parser = argparse.ArgumentParser(
+        description='Train the Dense head over cached backbone features and save a full model.'
+    )
+    parser.add_argument(
+        'train_dir',
+        help='Training images, one sub-directory per class (e.g. train/cats, train/dogs), '
+             'or a dataset packed by pack_dataset.py'
+    )
+    parser.add_argument(
+        '--output',
+        default='my_model.keras',
+        help='Where to save the trained model (default: my_model.keras)'
+    )
+    parser.add_argument(
+        '--feature-store',
+        default='features',
+        help='Directory of cached backbone embeddings (default: features)'
+    )
+    parser.add_argument(
+        '--base-model',
+        default=None,
+        help='Saved model whose backbone is reused (default: ImageNet Xception)'
+    )
+    parser.add_argument('--epochs', type=int, default=10, help='Training epochs (default: 10)')
+    parser.add_argument('--batch-size', type=int, default=32, help='Training batch size (default: 32)')
+    parser.add_argument('--learning-rate', type=float, default=1e-3,
+                        help='Adam learning rate (default: 0.001)')
+    parser.add_argument('--validation-split', type=float, default=0.1,
+                        help='Fraction of images held out for validation (default: 0.1)')
+    parser.add_argument('--seed', type=int, default=42, help='Shuffle seed (default: 42)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Image decoding threads for feature extraction (default: number of CPUs)')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.train_dir):
+        print(f"Error: Training directory '{args.train_dir}' not found.")
+        sys.exit(1)
+
+    packed = None
+    if PackedDataset.is_packed(args.train_dir):
+        packed = PackedDataset(args.train_dir).split('train')
+        labels, class_names = packed.labels.astype(np.float32), packed.class_names
+        print(f"Found {len(packed)} packed images in classes {class_names}")
+    else:
+        image_paths, labels, class_names = list_labeled_images(args.train_dir)
+        print(f"Found {len(image_paths)} images in classes {class_names}")
+    if len(class_names) != 2:
+        print(f"Error: Expected 2 class folders, found {len(class_names)}: {class_names}")
+        sys.exit(1)
+
+    model = build_model(args.base_model)
+    classifier = EmbeddingClassifier(model, args.feature_store)
+
+    # Push every image through the frozen backbone once
+    start_time = time.time()
+    if packed is not None:
+        rows = extract_packed_features(classifier, packed)
+    else:
+        rows, failed = extract_features(classifier, image_paths, workers=args.workers)
+        labels = np.delete(labels, failed)
+    print(f"Feature extraction took {time.time() - start_time:.1f} seconds")
+
+    # Same split for every run with the same seed
+    rng = np.random.default_rng(args.seed)
+    permutation = rng.permutation(len(rows))
+    n_val = int(len(rows) * args.validation_split)
+    val_idx, train_idx = permutation[:n_val], permutation[n_val:]
+
+    features = classifier.store.all_features()
+    train_data = make_dataset(features, rows[train_idx], labels[train_idx],
+                              args.batch_size, shuffle=True, seed=args.seed)
+    validation_data = None
+    if n_val:
+        validation_data = make_dataset(features, rows[val_idx], labels[val_idx],
+                                       args.batch_size, shuffle=False, seed=args.seed)
+
+    # Train only the Dense head; its layers are shared with the full model
+    head = classifier.head.model
+    head.compile(optimizer=tf.keras.optimizers.Adam(args.learning_rate),
+                 loss='binary_crossentropy',
+                 metrics=['accuracy'])
+
+    start_time = time.time()
+    head.fit(train_data, epochs=args.epochs, validation_data=validation_data)
+    print(f'Total time for training {(time.time() - start_time):.3f} seconds')
+
+    classifier.close()
+
+    # Save the full model (backbone + trained head), same format as the notebook
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    model.save(args.output)
+    print(f"Model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()